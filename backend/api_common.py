@@ -0,0 +1,182 @@
+# api_common.py app.py（Flask）与 async_app.py（Quart）共用的请求解析、响应构建与提示词
+# 不依赖具体 Web 框架：响应类、请求对象由调用方传入；
+# 只依赖 potential_common 等纯函数模块，导入时不创建应用、客户端、缓存或线程池
+import json
+import time
+from config import BATCH_MAX_REPOS, OPENDIGGER_BREAKER_RESET, NEGATIVE_CACHE_TTL
+from potential_common import resolve_window, last_n_months, input_digest
+import payload
+from potential_model import get_model
+
+
+# =========================
+# 请求解析
+# =========================
+
+def endpoint_label(req):
+    """按路由模板而非实际路径统计，避免标签数量无限增长"""
+    return req.url_rule.rule if req.url_rule is not None else "unmatched"
+
+
+def parse_window_params(data):
+    """
+    读取请求中的 window / as_of 参数（均可省略）
+    :return: (window, as_of)，as_of 已规范化为 "YYYY-MM"
+    :raises ValueError: 参数不合法
+    """
+    return resolve_window(data.get("window", 6), data.get("as_of"))
+
+
+def parse_batch_request(data):
+    """
+    校验 /analyze/batch 的请求体
+    :return: (repos, window, as_of, sort, top_k, 错误)，参数不合法时只有错误（响应体 dict）不为 None
+    """
+    repos = data.get("repos")
+    if not isinstance(repos, list) or not repos:
+        return None, None, None, None, None, {"error": "repos must be a non-empty list of owner/repo"}
+    repos = [r.strip() if isinstance(r, str) else r for r in repos]
+    invalid = [r for r in repos if not isinstance(r, str) or "/" not in r]
+    if invalid:
+        return None, None, None, None, None, {"error": "Invalid repo format. Use owner/repo", "invalid": invalid}
+    if len(repos) > BATCH_MAX_REPOS:
+        return None, None, None, None, None, {"error": f"At most {BATCH_MAX_REPOS} repos per batch"}
+
+    top_k = data.get("top_k")
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k <= 0):
+        return None, None, None, None, None, {"error": "top_k must be a positive integer"}
+    sort = bool(data.get("sort")) or top_k is not None
+    try:
+        window, as_of = parse_window_params(data)
+    except ValueError as e:
+        return None, None, None, None, None, {"error": str(e)}
+    return repos, window, as_of, sort, top_k, None
+
+
+# =========================
+# 响应构建
+# =========================
+
+def fetch_error_response(response_class, e):
+    """
+    指标拉取失败的响应：404 仓库在 OpenDigger 上没有数据；503 上游超时或熔断中（带 Retry-After）；
+    502 其他上游错误
+    """
+    headers = {
+        # 404 与负缓存一样可以短时间复用，其他上游错误不缓存
+        "Cache-Control": f"public, max-age={NEGATIVE_CACHE_TTL}" if e.status_code == 404 else "no-store"
+    }
+    if e.status_code == 503:
+        headers["Retry-After"] = str(OPENDIGGER_BREAKER_RESET)
+    body = json.dumps({"error": str(e), "failed_metrics": e.failed}, ensure_ascii=False)
+    return response_class(body, status=e.status_code, headers=headers, mimetype="application/json")
+
+
+def analysis_response(response_class, req, repo, window, as_of, result):
+    """
+    /analyze 的结果响应（POST / GET、Flask / Quart 共用）：按请求头协商格式与压缩，
+    ETag 由输入序列和模型权重决定，数据没有更新时客户端和代理缓存都能得到 304
+    """
+    detailed_data, averaged_data, potential = result
+    return payload.build_response(response_class, req, {
+        "repo": repo,
+        "window": window,
+        "as_of": as_of,
+        "potential": potential,
+        "averaged_data": averaged_data,   # ✅ 前端使用这个名字
+        "detailed_data": detailed_data
+    }, last_n_months(window, as_of), digest=input_digest(repo, window, as_of, detailed_data))
+
+
+def cache_control(expires_at):
+    """
+    GET /analyze 的 Cache-Control：结果缓存到何时过期（通常为下次 OpenDigger 发布），浏览器和代理就缓存到何时
+    :param expires_at: 结果的过期时间戳（cal_potential.result_expires_at）
+    """
+    return f"public, max-age={max(0, int(expires_at - time.time()))}"
+
+
+def batch_line(repo, result, error):
+    """批量接口的一行 NDJSON：成功为分析结果，失败带 error / failed_metrics"""
+    if error is not None:
+        return {"repo": repo, "error": str(error), "status": error.status_code, "failed_metrics": error.failed}
+    detailed_data, averaged_data, potential = result
+    return {
+        "repo": repo,
+        "potential": potential,
+        "averaged_data": averaged_data,
+        "detailed_data": detailed_data
+    }
+
+
+def sorted_batch_lines(results, errors, top_k=None):
+    """
+    排序模式的全部结果行：按窗口最后一个月的潜力值降序（带 rank），失败的仓库排在最后
+    :param results: [(repo, result)]
+    :param errors: [(repo, MetricFetchError)]
+    """
+    results = sorted(results, key=lambda item: item[1][2][-1], reverse=True)
+    lines = []
+    for rank, (repo, result) in enumerate(results[:top_k], 1):
+        line = batch_line(repo, result, None)
+        line["rank"] = rank
+        lines.append(line)
+    return lines + [batch_line(repo, None, error) for repo, error in errors]
+
+
+def batch_summary(succeeded, failed, window, as_of):
+    """最后一行为汇总，客户端据此判断响应是否完整"""
+    return {"summary": {
+        "total": succeeded + failed,
+        "succeeded": succeeded,
+        "failed": failed,
+        "window": window,
+        "as_of": as_of
+    }}
+
+
+def ndjson(line):
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def sse_event(data, event=None):
+    """按 text/event-stream 格式封装一条事件"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# =========================
+# AI 建议提示词
+# =========================
+
+# 提示词模板版本，修改 build_suggest_prompt 的模板后递增，使旧的建议缓存失效
+PROMPT_VERSION = 2
+
+
+def prompt_version():
+    """建议缓存使用的提示词版本：模板版本 + 潜力模型摘要，二者任一变化旧建议都失效"""
+    return f"{PROMPT_VERSION}:{get_model().digest}"
+
+
+def build_suggest_prompt(repo, potential, detailed_data, averaged_data):
+    """拼接 /ai-suggest 的提示词，普通接口与流式接口共用；模型公式由当前加载的潜力模型生成"""
+    return f"""
+    请你作为一名资深开源仓库分析专家，基于以下提供的完整数据，对开源仓库「{repo}」进行全面评价，并给出切实可行的优化建议。
+
+    ### 基础信息
+    开源仓库名称：{repo}
+    仓库潜力评分：{potential}（评分越高代表发展潜力越强，模型公式{get_model().formula()}，这个公式经过建模认证，是核心）
+
+    ### 核心数据
+    1.  详细数据（detailed_data）：{detailed_data}
+    2.  趋势指标数据（trending_data）：{averaged_data}
+
+    ### 分析要求
+    1.  数据解读：先简要解读潜力评分的含义，结合详细数据和平均数据，指出该仓库的核心优势（如社区活跃度高、维护频率稳定等）和核心短板（如提交量偏低、参与者较少等）。
+    2.  全面评价：从3个核心维度进行评价（无需额外扩展）：
+    - 社区活跃度：基于数据判断仓库的社区参与度、用户粘性是否达标；
+    - 项目维护性：分析仓库的更新频率、bug修复效率、代码质量是否有保障；
+    - 发展潜力：结合潜力评分和数据趋势，判断仓库未来的发展前景（如高潜力/中等潜力/低潜力，说明依据）。
+    3.  优化建议：针对上述分析的短板，给出至少3条可落地、针对性强的具体建议（避免空泛表述，如“提升活跃度”需细化为具体操作）。
+    4.  输出格式：分板块清晰呈现（标题+内容），语言简洁专业，200字左右，符合技术人员阅读习惯，无需冗余客套话。
+    """
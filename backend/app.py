@@ -1,16 +1,75 @@
-from flask import Flask, request, jsonify
+import os
+import time
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from cal_potential import compute_repo_potential
+from config import WARMUP_ENABLED, SERVER_TIMING_ENABLED, METRICS_MULTIPROC_DIR
+from cal_potential import (
+    get_repo_potential, iter_repo_potentials, result_expires_at, MetricFetchError,
+    metric_cache, negative_cache, result_cache, analyze_flight, metric_flight, opendigger
+)
+from api_common import (
+    endpoint_label, parse_window_params, parse_batch_request, fetch_error_response, analysis_response,
+    cache_control, batch_line, sorted_batch_lines, batch_summary, ndjson, sse_event,
+    prompt_version, build_suggest_prompt
+)
+import metrics
+import payload
+from potential_model import get_model
 import qwen_api
+import suggestion_cache
+import warmup
 
 app = Flask(__name__)
 
 CORS(
     app,
     resources={r"/*": {"origins": "*"}},
-    supports_credentials=False
+    supports_credentials=False,
+    expose_headers=["Server-Timing", "ETag"]
 )
 
+# /metrics 抓取时才计算的指标
+metrics.REGISTRY.add_collector(metrics.cache_collector(
+    metric_cache, negative_cache, result_cache, suggestion_cache.suggestion_cache
+))
+metrics.REGISTRY.add_collector(metrics.flight_collector(analyze_flight, metric_flight))
+metrics.REGISTRY.add_collector(metrics.breaker_collector(opendigger))
+# 多 worker 部署时汇总全部 worker 的指标（gunicorn.conf.py 设置 METRICS_MULTIPROC_DIR）
+if METRICS_MULTIPROC_DIR:
+    metrics.REGISTRY.enable_multiprocess(METRICS_MULTIPROC_DIR)
+
+
+# =========================
+# 请求耗时统计
+# =========================
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+    g.timing_token = metrics.start_request_timing()
+    metrics.HTTP_IN_FLIGHT.inc(endpoint=endpoint_label(request))
+
+
+@app.after_request
+def record_timing(response):
+    # 流式响应此时只是开始推送，记录的是首字节耗时
+    elapsed = time.perf_counter() - g.start_time
+    endpoint = endpoint_label(request)
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.HTTP_SECONDS.observe(elapsed, endpoint=endpoint)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = metrics.server_timing_header(elapsed)
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+@app.teardown_request
+def stop_timer(exc):
+    if "timing_token" in g:
+        metrics.HTTP_IN_FLIGHT.dec(endpoint=endpoint_label(request))
+        metrics.stop_request_timing(g.pop("timing_token"))
+
+
 @app.route("/analyze", methods=["POST", "OPTIONS"])
 def analyze():
     # ✅ 显式处理预检请求（有些浏览器/代理很严格）
@@ -24,21 +83,102 @@ def analyze():
         if not repo or "/" not in repo:
             return jsonify({"error": "Invalid repo format. Use owner/repo"}), 400
 
-        # === 调用数据处理逻辑 ===
-        detailed_data, averaged_data, potential = compute_repo_potential(repo)
+        try:
+            window, as_of = parse_window_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # === 调用数据处理逻辑（同参数的结果会被 /ai-suggest 复用） ===
+        result = get_repo_potential(repo, window, as_of)
+
+        # 按 Accept / Accept-Encoding 返回 JSON、列式 JSON 或 msgpack，带 ETag（未变化时 304）
+        return analysis_response(Response, request, repo, window, as_of, result)
 
+    except MetricFetchError as e:
+        # 上游 OpenDigger 部分指标失败/超时，明确告知是哪些指标
+        return fetch_error_response(Response, e)
+
+    except Exception as e:
         return jsonify({
-            "repo": repo,
-            "potential": potential,
-            "averaged_data": averaged_data,   # ✅ 前端使用这个名字
-            "detailed_data": detailed_data
-        })
+            "error": str(e)
+        }), 500
+
+
+# 可被浏览器和反向代理缓存的 GET 版本：/analyze/<owner>/<repo>?window=6&as_of=YYYY-MM
+# 同一仓库的结果在下次 OpenDigger 发布前不变，部署时可在前面加一层代理缓存（见 nginx.conf）
+@app.route("/analyze/<owner>/<name>", methods=["GET"])
+def analyze_get(owner, name):
+    repo = f"{owner}/{name}"
+    try:
+        window, as_of = parse_window_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400, {"Cache-Control": "no-store"}
+
+    try:
+        result = get_repo_potential(repo, window, as_of)
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500, {"Cache-Control": "no-store"}
+
+    response = analysis_response(Response, request, repo, window, as_of, result)
+    response.headers["Cache-Control"] = cache_control(result_expires_at(repo, window, as_of))
+    return response
+
+
+# 批量分析：一次提交多个仓库，按完成先后逐行返回（NDJSON）
+# 请求体: {"repos": [...], "window": 6, "as_of": "YYYY-MM", "sort": false, "top_k": null}
+# sort=true 或指定 top_k 时等全部完成后按最新潜力值降序返回，失败的仓库排在最后
+@app.route("/analyze/batch", methods=["POST", "OPTIONS"])
+def analyze_batch():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data = request.get_json(force=True)
+        repos, window, as_of, sort, top_k, error = parse_batch_request(data)
+        if error is not None:
+            return jsonify(error), 400
 
     except Exception as e:
         return jsonify({
             "error": str(e)
         }), 500
 
+    def generate():
+        if not sort:
+            succeeded = failed = 0
+            for repo, result, error in iter_repo_potentials(repos, window, as_of):
+                if error is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield ndjson(batch_line(repo, result, error))
+        else:
+            results, errors = [], []
+            for repo, result, error in iter_repo_potentials(repos, window, as_of):
+                if error is None:
+                    results.append((repo, result))
+                else:
+                    errors.append((repo, error))
+            succeeded, failed = len(results), len(errors)
+            for line in sorted_batch_lines(results, errors, top_k):
+                yield ndjson(line)
+
+        yield ndjson(batch_summary(succeeded, failed, window, as_of))
+
+    body = stream_with_context(generate())
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding"
+    }
+    # 大批量结果体积可观，客户端支持时逐行 gzip 压缩
+    if request.accept_encodings["gzip"]:
+        body = payload.gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype="application/x-ndjson", headers=headers)
+
 
 # 【可选】新增一个调用千问模型的接口（不影响原有/analyze接口）
 @app.route("/ai-suggest", methods=["POST", "OPTIONS"])
@@ -51,44 +191,141 @@ def qwen_analyze():
         repo = data.get("repo", "").strip()
         if not repo or "/" not in repo:
             return jsonify({"error": "Invalid repo format. Use owner/repo"}), 400
-        # 同时保留原有潜力计算逻辑（可选）
-        detailed_data, averaged_data, potential = compute_repo_potential(repo)
-
-        # 调用千问模型分析仓库
-        prompt = f"""
-        请你作为一名资深开源仓库分析专家，基于以下提供的完整数据，对开源仓库「{repo}」进行全面评价，并给出切实可行的优化建议。
-
-        ### 基础信息
-        开源仓库名称：{repo}
-        仓库潜力评分：{potential}（评分越高代表发展潜力越强，模型公式PotentialScore =0.67 * activity_trend- 
-            0.23 * participants_trend+ 0.18 * bus_factor_jump+ 0.14 * issue_response_time_trend+ 0.2  * openrank_trend，这个公式经过建模认证，是核心）
-
-        ### 核心数据
-        1.  详细数据（detailed_data）：{detailed_data}
-        2.  趋势指标数据（trending_data）：{averaged_data}
-
-        ### 分析要求
-        1.  数据解读：先简要解读潜力评分的含义，结合详细数据和平均数据，指出该仓库的核心优势（如社区活跃度高、维护频率稳定等）和核心短板（如提交量偏低、参与者较少等）。
-        2.  全面评价：从3个核心维度进行评价（无需额外扩展）：
-        - 社区活跃度：基于数据判断仓库的社区参与度、用户粘性是否达标；
-        - 项目维护性：分析仓库的更新频率、bug修复效率、代码质量是否有保障；
-        - 发展潜力：结合潜力评分和数据趋势，判断仓库未来的发展前景（如高潜力/中等潜力/低潜力，说明依据）。
-        3.  优化建议：针对上述分析的短板，给出至少3条可落地、针对性强的具体建议（避免空泛表述，如“提升活跃度”需细化为具体操作）。
-        4.  输出格式：分板块清晰呈现（标题+内容），语言简洁专业，200字左右，符合技术人员阅读习惯，无需冗余客套话。
-        """
-        qwen_response = qwen_api.call_qwen_model(prompt)
-      
+        try:
+            window, as_of = parse_window_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # 复用 /analyze 的计算结果（或等待正在进行的同一计算），不重复拉取
+        detailed_data, averaged_data, potential = get_repo_potential(repo, window, as_of)
+
+        # 相同数据 + 模型参数已生成过建议则直接返回；refresh=true 强制重新生成
+        cache_key = suggestion_cache.suggestion_key(
+            prompt_version(), repo, potential, detailed_data, averaged_data
+        )
+        qwen_response = suggestion_cache.get_suggestion(cache_key, refresh=bool(data.get("refresh")))
+        cached = qwen_response is not None
+
+        if not cached:
+            # 调用千问模型分析仓库
+            prompt = build_suggest_prompt(repo, potential, detailed_data, averaged_data)
+            with metrics.stage("qwen"):
+                qwen_response = qwen_api.call_qwen_model(prompt)
+            suggestion_cache.save_suggestion(cache_key, qwen_response)
+
         return jsonify({
             "suggestion": qwen_response,
+            "cached": cached
         })
 
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+
     except Exception as e:
         return jsonify({
             "error": str(e)
         }), 500
+
+
+# 流式版本：边生成边推送（SSE），前端无需等待完整回复
+@app.route("/ai-suggest/stream", methods=["POST", "OPTIONS"])
+def qwen_analyze_stream():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data = request.get_json(force=True)
+        repo = data.get("repo", "").strip()
+        if not repo or "/" not in repo:
+            return jsonify({"error": "Invalid repo format. Use owner/repo"}), 400
+        try:
+            window, as_of = parse_window_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # 数据准备阶段的错误仍以普通 JSON 返回，开始推送后再改用 error 事件
+        detailed_data, averaged_data, potential = get_repo_potential(repo, window, as_of)
+        prompt = build_suggest_prompt(repo, potential, detailed_data, averaged_data)
+        cache_key = suggestion_cache.suggestion_key(
+            prompt_version(), repo, potential, detailed_data, averaged_data
+        )
+        cached_suggestion = suggestion_cache.get_suggestion(cache_key, refresh=bool(data.get("refresh")))
+
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+
+    except Exception as e:
+        return jsonify({
+            "error": str(e)
+        }), 500
+
+    def generate():
+        if cached_suggestion is not None:
+            # 命中缓存：一次性推送完整建议
+            yield sse_event({"delta": cached_suggestion})
+            yield sse_event({"cached": True}, event="done")
+            return
+        try:
+            parts = []
+            # 响应头已发出，整段推送耗时只计入 /metrics
+            with metrics.stage("qwen_stream"):
+                for delta in qwen_api.stream_qwen_model(prompt):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            suggestion_cache.save_suggestion(cache_key, "".join(parts))
+            yield sse_event({"cached": False}, event="done")
+        except Exception as e:
+            print(f"流式调用千问模型失败：{str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 nginx 等反向代理的缓冲
+        }
+    )
+
+
+# 热门仓库排行：只读后台预热好的结果，不触发计算
+@app.route("/trending", methods=["GET"])
+def trending():
+    top_k = request.args.get("top_k", type=int)
+    if top_k is not None and top_k <= 0:
+        return jsonify({"error": "top_k must be a positive integer"}), 400
+    return jsonify(warmup.trending(top_k))
+
+
+# 缓存命中、请求合并情况，便于观察线上效果
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "metric_cache": metric_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "analyze_flight": analyze_flight.stats(),
+        "metric_flight": metric_flight.stats(),
+        "suggestion_cache": suggestion_cache.stats(),
+        "warmup": warmup.scheduler.stats(),
+        "opendigger_breakers": opendigger.breaker_stats(),
+        "model": get_model().info()
+    })
+
+
+# Prometheus 抓取接口：请求量、各阶段耗时分布、上游耗时与响应大小、缓存命中率等
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
+    debug = os.getenv("FLASK_DEBUG", "1") == "1"
+    # 调试模式下 Flask 会另起子进程运行代码（自动重载），预热只在子进程中启动
+    if WARMUP_ENABLED and (not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+        warmup.scheduler.start()
+
+    # 本地开发用 Flask 自带服务器；生产环境请用 gunicorn（见 gunicorn.conf.py）
     app.run(
         host="0.0.0.0",
         port=5000,
-        debug=True
+        debug=debug
     )
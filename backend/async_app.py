@@ -0,0 +1,313 @@
+# async_app.py 后端的 asyncio 版本（Quart，ASGI），接口与 app.py 相同
+# 指标下载、千问调用全部为异步 I/O，单个 worker 可同时处理数百个分析请求
+#   pip install quart hypercorn
+#   cd backend && hypercorn async_app:app --bind 0.0.0.0:5000 --workers 4
+import asyncio
+import time
+from quart import Quart, Response, g, request, jsonify
+import async_potential
+import metrics
+import payload
+from potential_model import get_model
+import qwen_api
+import suggestion_cache
+import warmup
+from config import WARMUP_ENABLED, SERVER_TIMING_ENABLED, METRICS_MULTIPROC_DIR
+from api_common import (
+    endpoint_label, parse_window_params, parse_batch_request, fetch_error_response, analysis_response,
+    cache_control, batch_line, sorted_batch_lines, batch_summary, ndjson, sse_event,
+    prompt_version, build_suggest_prompt
+)
+from cal_potential import (
+    MetricFetchError, result_expires_at, metric_cache, negative_cache, result_cache, analyze_flight, metric_flight, opendigger
+)
+
+app = Quart(__name__)
+
+# /metrics 抓取时才计算的指标：请求走异步版的请求合并与客户端，后台预热仍走同步版，两边都导出
+metrics.REGISTRY.add_collector(metrics.cache_collector(
+    metric_cache, negative_cache, result_cache, suggestion_cache.suggestion_cache
+))
+metrics.REGISTRY.add_collector(metrics.flight_collector(
+    analyze_flight, metric_flight, async_potential.analyze_flight, async_potential.metric_flight
+))
+metrics.REGISTRY.add_collector(metrics.breaker_collector(opendigger))
+
+
+@app.before_request
+async def start_timer():
+    g.start_time = time.perf_counter()
+    g.timing_token = metrics.start_request_timing()
+    metrics.HTTP_IN_FLIGHT.inc(endpoint=endpoint_label(request))
+
+
+@app.after_request
+async def add_cors_headers(response):
+    # 与 app.py 中 flask_cors 的配置一致：允许任意来源
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept, If-None-Match"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Expose-Headers"] = "Server-Timing, ETag"
+
+    elapsed = time.perf_counter() - g.start_time
+    endpoint = endpoint_label(request)
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.HTTP_SECONDS.observe(elapsed, endpoint=endpoint)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = metrics.server_timing_header(elapsed)
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+@app.teardown_request
+async def stop_timer(exc):
+    if "timing_token" in g:
+        metrics.HTTP_IN_FLIGHT.dec(endpoint=endpoint_label(request))
+        metrics.stop_request_timing(g.pop("timing_token"))
+
+
+@app.before_serving
+async def startup():
+    # 异步客户端绑定在事件循环上，在这里取到本 worker 的客户端后再注册，采集时（快照线程中）不需要事件循环
+    metrics.REGISTRY.add_collector(metrics.breaker_collector(async_potential.get_opendigger(), "async"))
+    if METRICS_MULTIPROC_DIR:
+        metrics.REGISTRY.enable_multiprocess(METRICS_MULTIPROC_DIR)
+    if WARMUP_ENABLED:
+        warmup.scheduler.start()
+
+
+@app.after_serving
+async def shutdown():
+    warmup.scheduler.stop()
+    await async_potential.close_opendigger()
+
+
+async def read_repo_request():
+    """
+    解析请求体中的 repo / window / as_of
+    :return: (data, repo, window, as_of, 错误响应)，参数不合法时只有错误响应不为 None
+    """
+    data = await request.get_json(force=True)
+    repo = data.get("repo", "").strip()
+    if not repo or "/" not in repo:
+        return data, None, None, None, (jsonify({"error": "Invalid repo format. Use owner/repo"}), 400)
+    try:
+        window, as_of = parse_window_params(data)
+    except ValueError as e:
+        return data, None, None, None, (jsonify({"error": str(e)}), 400)
+    return data, repo, window, as_of, None
+
+
+@app.route("/analyze", methods=["POST", "OPTIONS"])
+async def analyze():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data, repo, window, as_of, error = await read_repo_request()
+        if error is not None:
+            return error
+
+        result = await async_potential.get_repo_potential(repo, window, as_of)
+
+        return analysis_response(Response, request, repo, window, as_of, result)
+
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+
+    except Exception as e:
+        return jsonify({
+            "error": str(e)
+        }), 500
+
+
+@app.route("/analyze/<owner>/<name>", methods=["GET"])
+async def analyze_get(owner, name):
+    repo = f"{owner}/{name}"
+    try:
+        window, as_of = parse_window_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400, {"Cache-Control": "no-store"}
+
+    try:
+        result = await async_potential.get_repo_potential(repo, window, as_of)
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500, {"Cache-Control": "no-store"}
+
+    response = analysis_response(Response, request, repo, window, as_of, result)
+    expires_at = await asyncio.to_thread(result_expires_at, repo, window, as_of)
+    response.headers["Cache-Control"] = cache_control(expires_at)
+    return response
+
+
+@app.route("/analyze/batch", methods=["POST", "OPTIONS"])
+async def analyze_batch():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data = await request.get_json(force=True)
+        repos, window, as_of, sort, top_k, error = parse_batch_request(data)
+        if error is not None:
+            return jsonify(error), 400
+
+    except Exception as e:
+        return jsonify({
+            "error": str(e)
+        }), 500
+
+    async def generate():
+        if not sort:
+            succeeded = failed = 0
+            async for repo, result, error in async_potential.iter_repo_potentials(repos, window, as_of):
+                if error is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield ndjson(batch_line(repo, result, error))
+        else:
+            results, errors = [], []
+            async for repo, result, error in async_potential.iter_repo_potentials(repos, window, as_of):
+                if error is None:
+                    results.append((repo, result))
+                else:
+                    errors.append((repo, error))
+            succeeded, failed = len(results), len(errors)
+            for line in sorted_batch_lines(results, errors, top_k):
+                yield ndjson(line)
+
+        yield ndjson(batch_summary(succeeded, failed, window, as_of))
+
+    body = generate()
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding"
+    }
+    if request.accept_encodings["gzip"]:
+        body = payload.agzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    response = Response(body, mimetype="application/x-ndjson", headers=headers)
+    response.timeout = None
+    return response
+
+
+@app.route("/ai-suggest", methods=["POST", "OPTIONS"])
+async def qwen_analyze():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data, repo, window, as_of, error = await read_repo_request()
+        if error is not None:
+            return error
+        detailed_data, averaged_data, potential = await async_potential.get_repo_potential(repo, window, as_of)
+
+        cache_key = suggestion_cache.suggestion_key(
+            prompt_version(), repo, potential, detailed_data, averaged_data
+        )
+        qwen_response = suggestion_cache.get_suggestion(cache_key, refresh=bool(data.get("refresh")))
+        cached = qwen_response is not None
+
+        if not cached:
+            prompt = build_suggest_prompt(repo, potential, detailed_data, averaged_data)
+            with metrics.stage("qwen"):
+                qwen_response = await qwen_api.acall_qwen_model(prompt)
+            suggestion_cache.save_suggestion(cache_key, qwen_response)
+
+        return jsonify({
+            "suggestion": qwen_response,
+            "cached": cached
+        })
+
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+
+    except Exception as e:
+        return jsonify({
+            "error": str(e)
+        }), 500
+
+
+@app.route("/ai-suggest/stream", methods=["POST", "OPTIONS"])
+async def qwen_analyze_stream():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    try:
+        data, repo, window, as_of, error = await read_repo_request()
+        if error is not None:
+            return error
+        # 数据准备阶段的错误仍以普通 JSON 返回，开始推送后再改用 error 事件
+        detailed_data, averaged_data, potential = await async_potential.get_repo_potential(repo, window, as_of)
+        prompt = build_suggest_prompt(repo, potential, detailed_data, averaged_data)
+        cache_key = suggestion_cache.suggestion_key(
+            prompt_version(), repo, potential, detailed_data, averaged_data
+        )
+        cached_suggestion = suggestion_cache.get_suggestion(cache_key, refresh=bool(data.get("refresh")))
+
+    except MetricFetchError as e:
+        return fetch_error_response(Response, e)
+
+    except Exception as e:
+        return jsonify({
+            "error": str(e)
+        }), 500
+
+    async def generate():
+        if cached_suggestion is not None:
+            yield sse_event({"delta": cached_suggestion})
+            yield sse_event({"cached": True}, event="done")
+            return
+        try:
+            parts = []
+            with metrics.stage("qwen_stream"):
+                async for delta in qwen_api.astream_qwen_model(prompt):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            suggestion_cache.save_suggestion(cache_key, "".join(parts))
+            yield sse_event({"cached": False}, event="done")
+        except Exception as e:
+            print(f"流式调用千问模型失败：{str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None  # 流式响应不受默认超时限制
+    return response
+
+
+@app.route("/trending", methods=["GET"])
+async def trending():
+    top_k = request.args.get("top_k", type=int)
+    if top_k is not None and top_k <= 0:
+        return jsonify({"error": "top_k must be a positive integer"}), 400
+    return jsonify(warmup.trending(top_k))
+
+
+@app.route("/stats", methods=["GET"])
+async def stats():
+    return jsonify({
+        "metric_cache": metric_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "analyze_flight": async_potential.analyze_flight.stats(),
+        "metric_flight": async_potential.metric_flight.stats(),
+        "suggestion_cache": suggestion_cache.stats(),
+        "warmup": warmup.scheduler.stats(),
+        "opendigger_breakers": async_potential.get_opendigger().breaker_stats(),
+        "model": get_model().info()
+    })
+
+
+@app.route("/metrics", methods=["GET"])
+async def prometheus_metrics():
+    # 多进程模式下要读写快照文件，放到线程中执行
+    return Response(await asyncio.to_thread(metrics.REGISTRY.render), content_type=metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,236 @@
+# async_potential.py /analyze 的 asyncio 实现（供 async_app.py 使用）
+# 与 cal_potential 共用缓存、指标仓库和潜力值计算，判断逻辑（旧数据能否退回、失败汇总、批量记账）
+# 都在 potential_common 中，这里只把 I/O 换成异步：
+# 一个 worker 等待上百个 OpenDigger 请求时不再占用上百个线程；
+# 缓存读写（配置了 *_CACHE_DIR 时有磁盘 I/O）与 SQLite 一样放到线程中执行，不阻塞事件循环
+# 同步调用方继续使用 cal_potential.compute_repo_potential / get_repo_potential，接口不变
+import asyncio
+import os
+import sys
+import time
+import weakref
+from config import (
+    METRICS, FETCH_DEADLINE, FETCH_MAX_WORKERS, NEGATIVE_CACHE_TTL, BATCH_MAX_CONCURRENCY, BATCH_DEADLINE,
+    OPENDIGGER_BREAKER_THRESHOLD, OPENDIGGER_BREAKER_RESET, OPENDIGGER_BASE_URL
+)
+from cal_potential import (
+    REQUEST_TIMEOUT, warehouse, metric_cache, negative_cache, result_cache,
+    store_result, stale_metric_series, potentials_from_detailed, batch_results
+)
+from potential_common import (
+    BatchProgress, resolve_window, last_n_months, next_publish_time, result_key,
+    stale_usable, series_values, collect_fetch_results
+)
+from potential_model import get_model
+from singleflight import AsyncSingleFlight
+import metrics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.opendigger_client import AsyncOpenDiggerClient, OpenDiggerError, MetricNotFoundError
+
+# 异步客户端的连接绑定在事件循环上，每个循环各建一个
+_clients = weakref.WeakKeyDictionary()
+
+# 同一事件循环内的请求合并（与 cal_potential 中的线程版互相独立）
+analyze_flight = AsyncSingleFlight(name="async_analyze")
+metric_flight = AsyncSingleFlight(name="async_metric")
+
+# 后台刷新任务（保留引用，避免任务未完成就被回收）
+_revalidating = {}
+
+
+def get_opendigger():
+    """获取当前事件循环的 OpenDigger 异步客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncOpenDiggerClient(
+            base_url=OPENDIGGER_BASE_URL,
+            timeout=REQUEST_TIMEOUT,
+            pool_size=FETCH_MAX_WORKERS,
+            per_host_limit=FETCH_MAX_WORKERS,
+            headers={"User-Agent": "Mozilla/5.0"},
+            breaker_threshold=OPENDIGGER_BREAKER_THRESHOLD,
+            breaker_reset=OPENDIGGER_BREAKER_RESET,
+            on_response=metrics.observe_opendigger,
+            total_timeout=FETCH_DEADLINE
+        )
+    return client
+
+
+async def close_opendigger():
+    """关闭当前事件循环的客户端（服务停止时调用）"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+# =========================
+# 指标获取
+# =========================
+
+async def download_metric_series(repo, metric):
+    """
+    与 cal_potential.download_metric_series 相同：优先读本地指标仓库，过期时才访问 OpenDigger
+    SQLite 读写放到线程中执行，不阻塞事件循环
+    """
+    if await asyncio.to_thread(warehouse.is_fresh, repo, metric):
+        return await asyncio.to_thread(warehouse.get_series, repo, metric, False)
+
+    try:
+        series = await get_opendigger().get_series(repo, metric)
+    except MetricNotFoundError:
+        await asyncio.to_thread(warehouse.mark_missing, repo, metric)
+        raise
+    await asyncio.to_thread(warehouse.store_series, repo, metric, series)
+    return await asyncio.to_thread(warehouse.read_series, repo, metric)
+
+
+async def fetch_metric_series(repo, metric, need_month=None):
+    """
+    带缓存地获取完整月度序列，与同步版共用 metric_cache / negative_cache，
+    过期与失败时的处理规则同 cal_potential.fetch_metric_series
+    """
+    key = (repo, metric)
+    reason = await asyncio.to_thread(negative_cache.get, key)
+    if reason is not None:
+        raise MetricNotFoundError(reason)
+
+    time_series = await asyncio.to_thread(metric_cache.get, key)
+    if time_series is not None:
+        return time_series
+
+    stale = await asyncio.to_thread(stale_metric_series, repo, metric)
+    if stale_usable(stale, need_month):
+        _revalidate(repo, metric)
+        return stale
+
+    try:
+        return await metric_flight.do(key, _download_and_cache, repo, metric)
+    except MetricNotFoundError:
+        raise
+    except OpenDiggerError as e:
+        if not stale_usable(stale, need_month):
+            raise
+        print(f"⚠️ {repo}/{metric} 下载失败，使用旧数据: {e}")
+        return stale
+
+
+async def _download_and_cache(repo, metric):
+    try:
+        time_series = await download_metric_series(repo, metric)
+    except MetricNotFoundError as e:
+        await asyncio.to_thread(negative_cache.set, (repo, metric), str(e), time.time() + NEGATIVE_CACHE_TTL)
+        raise
+    await asyncio.to_thread(metric_cache.set, (repo, metric), time_series, next_publish_time())
+    return time_series
+
+
+def _revalidate(repo, metric):
+    """在当前事件循环中后台刷新（同一 (repo, metric) 已在刷新时跳过）"""
+    key = (repo, metric)
+    if key in _revalidating:
+        return
+    _revalidating[key] = asyncio.ensure_future(_revalidate_task(repo, metric))
+
+
+async def _revalidate_task(repo, metric):
+    key = (repo, metric)
+    try:
+        await metric_flight.do(key, _download_and_cache, repo, metric)
+    except Exception as e:
+        print(f"⚠️ 后台刷新失败 {repo}/{metric}: {e}")
+    finally:
+        _revalidating.pop(key, None)
+
+
+async def fetch_metric(repo, metric, months):
+    return series_values(await fetch_metric_series(repo, metric, months[-1]), months)
+
+
+async def fetch_metrics_concurrently(repo, metrics, months, deadline=FETCH_DEADLINE):
+    """
+    并发拉取多个指标，整体受 deadline 秒限制
+    :return: {metric: values}，顺序与 metrics 一致
+    :raises MetricFetchError: 任一指标失败或超时，异常中包含全部失败指标
+    """
+    tasks = {metric: asyncio.ensure_future(fetch_metric(repo, metric, months)) for metric in metrics}
+    await asyncio.wait(tasks.values(), timeout=deadline)
+    return collect_fetch_results(repo, tasks, deadline)
+
+
+# =========================
+# 核心对外函数
+# =========================
+
+async def compute_repo_potential(repo: str, window: int = 6, as_of: str = None, model=None):
+    """cal_potential.compute_repo_potential 的异步版本，返回值相同"""
+    window, as_of = resolve_window(window, as_of)
+    months = last_n_months(window, as_of)
+
+    with metrics.stage("fetch"):
+        detailed_data = await fetch_metrics_concurrently(repo, METRICS, months)
+    with metrics.stage("compute"):
+        trending_data, potential_array = potentials_from_detailed([detailed_data], model)[0]
+
+    return detailed_data, trending_data, potential_array
+
+
+async def get_repo_potential(repo: str, window: int = 6, as_of: str = None):
+    """带结果缓存的 compute_repo_potential，与同步版共用 result_cache"""
+    window, as_of = resolve_window(window, as_of)
+    model = get_model()
+    key = result_key(repo, window, as_of, model)
+    with metrics.stage("cache"):
+        result = await asyncio.to_thread(result_cache.get, key)
+    if result is not None:
+        return result
+
+    return await analyze_flight.do(key, _compute_and_store, key, model)
+
+
+async def _compute_and_store(key, model):
+    repo, as_of, window, _ = key
+    result = await compute_repo_potential(repo, window, as_of, model)
+    await asyncio.to_thread(store_result, key, result)
+    return result
+
+
+async def iter_repo_potentials(repos, window: int = 6, as_of: str = None, deadline=BATCH_DEADLINE):
+    """
+    cal_potential.iter_repo_potentials 的异步版本（异步生成器），产出值相同
+    同时进行的 (repo, metric) 下载不超过 BATCH_MAX_CONCURRENCY 个；每轮下载完的仓库一起向量化计算
+    """
+    window, as_of = resolve_window(window, as_of)
+    months = last_n_months(window, as_of)
+    model = get_model()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def limited_fetch(repo, metric):
+        async with semaphore:
+            return await fetch_metric(repo, metric, months)
+
+    progress = BatchProgress(deadline)
+    try:
+        for repo in dict.fromkeys(repos):
+            result = await asyncio.to_thread(result_cache.get, result_key(repo, window, as_of, model))
+            if result is not None:
+                yield repo, result, None
+                continue
+            progress.add(repo, {metric: asyncio.ensure_future(limited_fetch(repo, metric)) for metric in METRICS})
+
+        progress.start()
+        while progress.pending:
+            done, _ = await asyncio.wait(
+                progress.pending, timeout=progress.time_left(), return_when=asyncio.FIRST_COMPLETED
+            )
+            errors, succeeded = progress.collect(done)
+            for repo, error in errors:
+                yield repo, None, error
+            if succeeded:
+                for repo, result in batch_results(succeeded, model):
+                    await asyncio.to_thread(store_result, result_key(repo, window, as_of, model), result)
+                    yield repo, result, None
+    finally:
+        # 客户端断开等提前结束迭代时，取消尚未完成的下载
+        progress.cancel()
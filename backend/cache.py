@@ -0,0 +1,257 @@
+# cache.py 进程内 TTL + LRU 缓存（可选磁盘二级缓存）
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# 过期条目在磁盘上保留的时长：覆盖一个 OpenDigger 发布周期，期间 get_stale 仍可读取旧值
+STALE_TTL = 31 * 24 * 3600
+
+# 写入时每隔多少秒检查一次磁盘目录的文件数，超出 disk_maxsize 时清理
+PRUNE_INTERVAL = 300
+
+
+class TTLCache:
+    """
+    线程安全的 TTL + LRU 缓存
+    - 每个条目带独立的过期时间（expires_at，unix 时间戳），可按自然月等规则设置
+    - 内存中最多保留 maxsize 个条目，超出时淘汰最久未使用的
+    - 指定 disk_dir 时，写入同时落盘为 JSON，进程重启后可从磁盘恢复（值必须可 JSON 序列化）
+    - 过期条目在被淘汰前仍保留，get_stale 可读取（stale-while-revalidate）
+    - 磁盘目录由多个 worker 进程共享，按自身的上限淘汰（与各进程内存中的 LRU 无关）：
+      过期超过 stale_ttl 的文件读到时删除；启动时和写入时定期检查，文件数超过 disk_maxsize 时只保留最新的
+    """
+
+    def __init__(self, maxsize=1024, disk_dir=None, name="cache", stale_ttl=STALE_TTL, disk_maxsize=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.disk_maxsize = disk_maxsize or maxsize
+        self._pruned_at = 0.0
+        self.name = name
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.prune()
+
+    # ---------- 对外接口 ----------
+
+    def get(self, key, default=None):
+        """命中且未过期返回缓存值，否则返回 default"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+        item = self._disk_load(key)
+        if item is not None and item[0] > now:
+            with self._lock:
+                self._store(key, item[0], item[1])
+                self.hits += 1
+                self.disk_hits += 1
+            return item[1]
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_stale(self, key, default=None):
+        """
+        忽略过期时间读取，用于上游故障或后台刷新期间返回旧值
+        :return: (value, fresh)，不存在时为 (default, False)
+        """
+        item = self._peek(key)
+        if item is None:
+            return default, False
+        fresh = item[0] > time.time()
+        if not fresh:
+            with self._lock:
+                self.stale_hits += 1
+        return item[1], fresh
+
+    def peek(self, key, default=None):
+        """读取未过期的值，不计入命中统计、不更新 LRU 顺序（只读展示用，如 /trending）"""
+        item = self._peek(key)
+        if item is None or item[0] <= time.time():
+            return default
+        return item[1]
+
+    def is_fresh(self, key):
+        """是否存在未过期的条目（不计入命中统计）"""
+        item = self._peek(key)
+        return item is not None and item[0] > time.time()
+
+    def expires_at(self, key):
+        """条目的过期时间戳（可能已过期），不存在时返回 None"""
+        item = self._peek(key)
+        return item[0] if item is not None else None
+
+    def set(self, key, value, expires_at):
+        """写入缓存，expires_at 为过期的 unix 时间戳"""
+        with self._lock:
+            self._store(key, expires_at, value)
+        self._disk_save(key, expires_at, value)
+        self._maybe_prune()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        path = self._disk_path(key)
+        if path:
+            self._remove_file(path)
+
+    def prune(self):
+        """
+        清理磁盘目录：删除损坏的、过期超过 stale_ttl 的文件，其余按修改时间只保留最新的 disk_maxsize 个
+        :return: 删除的文件数
+        """
+        if not self.disk_dir:
+            return 0
+        self._pruned_at = time.monotonic()
+        now = time.time()
+        removed = 0
+        kept = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                item = self._read_file(entry.path)
+                if item is not None and item[0] + self.stale_ttl > now:
+                    try:
+                        kept.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+                    continue
+            elif not self._is_abandoned_tmp(entry, now):
+                # 其他 worker 正在写入的临时文件
+                continue
+            removed += self._remove_file(entry.path)
+        kept.sort(reverse=True)
+        for _, path in kept[self.disk_maxsize:]:
+            removed += self._remove_file(path)
+        with self._lock:
+            self.disk_evictions += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """命中/未命中计数，用于监控"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+
+    # ---------- 内部实现 ----------
+
+    def _peek(self, key):
+        """读取 (expires_at, value)，不检查过期、不更新 LRU 顺序"""
+        with self._lock:
+            item = self._data.get(key)
+        return item if item is not None else self._disk_load(key)
+
+    def _store(self, key, expires_at, value):
+        # 调用方需持有 self._lock；只淘汰内存中的条目，磁盘文件可能仍被其他 worker 使用
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        if not self.disk_dir:
+            return None
+        digest = hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _disk_load(self, key):
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        item = self._read_file(path)
+        if item is not None and item[0] + self.stale_ttl <= time.time():
+            # 过期太久，连旧值也不再使用
+            if self._remove_file(path):
+                with self._lock:
+                    self.disk_evictions += 1
+            return None
+        return item
+
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            return record["expires_at"], record["value"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # 文件损坏当作未命中，下次写入时覆盖
+            return None
+
+    @staticmethod
+    def _is_abandoned_tmp(entry, now):
+        """写了一半就中断的临时文件（超过 1 分钟未完成）"""
+        try:
+            return now - entry.stat().st_mtime > 60
+        except OSError:
+            return False
+
+    @staticmethod
+    def _remove_file(path):
+        """删除文件，返回是否删除成功（多个 worker 共用目录时可能已被别的进程删除）"""
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def _maybe_prune(self):
+        """每隔 PRUNE_INTERVAL 秒数一次文件（只列目录，不读文件），超出 disk_maxsize 时完整清理一遍"""
+        if not self.disk_dir or time.monotonic() - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
+        try:
+            count = sum(1 for entry in os.scandir(self.disk_dir) if entry.name.endswith(".json"))
+        except OSError:
+            return
+        if count > self.disk_maxsize:
+            self.prune()
+    def _disk_save(self, key, expires_at, value):
+        path = self._disk_path(key)
+        if not path:
+            return
+        record = {"key": key, "expires_at": expires_at, "value": value}
+        # 先写临时文件再原子替换，避免并发读到半截文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 缓存落盘失败 {self.name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
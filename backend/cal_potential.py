@@ -1,140 +1,365 @@
-import json
-import ssl
-import urllib.request
-import gzip
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from config import POTENTIAL_WEIGHTS, METRICS
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from config import (
+    METRICS, FETCH_DEADLINE, FETCH_MAX_WORKERS,
+    METRIC_CACHE_SIZE, METRIC_CACHE_DIR, OPENDIGGER_PUBLISH_DAY, RESULT_CACHE_SIZE, RESULT_CACHE_DIR,
+    BATCH_MAX_CONCURRENCY, BATCH_DEADLINE, NEGATIVE_CACHE_TTL, OPENDIGGER_BREAKER_THRESHOLD,
+    OPENDIGGER_BREAKER_RESET, STALE_RESULT_TTL, REVALIDATE_WORKERS, OPENDIGGER_BASE_URL
+)
+from cache import TTLCache
+import metrics
+from potential_model import get_model
+from singleflight import SingleFlight
+from potential_common import (
+    MetricFetchError, BatchProgress, last_n_months, resolve_window,
+    next_publish_time, result_key, input_digest, stale_usable, series_values, collect_fetch_results
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.opendigger_client import OpenDiggerClient, OpenDiggerError, MetricNotFoundError
+from common.warehouse import MetricWarehouse
+from common.features import (
+    compute_prefix_features, features_to_dict, round_like_python
+)
 
 # =========================
 # 配置
 # =========================
 
 REQUEST_TIMEOUT = 10
-HEADERS = {
-    "User-Agent": "Mozilla/5.0"
-}
+
+# OpenDigger 共享客户端（连接池 + 重试 + 熔断），连接数与下载线程数一致
+opendigger = OpenDiggerClient(
+    base_url=OPENDIGGER_BASE_URL,
+    timeout=REQUEST_TIMEOUT,
+    pool_size=FETCH_MAX_WORKERS,
+    per_host_limit=FETCH_MAX_WORKERS,
+    headers={"User-Agent": "Mozilla/5.0"},
+    breaker_threshold=OPENDIGGER_BREAKER_THRESHOLD,
+    breaker_reset=OPENDIGGER_BREAKER_RESET,
+    on_response=metrics.observe_opendigger,
+    # 一次下载（含重试与退避）最多占用线程 FETCH_DEADLINE 秒，与请求的整体时限一致
+    total_timeout=FETCH_DEADLINE
+)
+
+# 本地指标仓库（SQLite，多个 worker 进程共享），内存缓存未命中时先读这里
+warehouse = MetricWarehouse(client=opendigger, publish_day=OPENDIGGER_PUBLISH_DAY)
+
+# OpenDigger 指标按月更新，缓存 (repo, metric) -> 完整月度序列，到下次发布时过期
+metric_cache = TTLCache(
+    maxsize=METRIC_CACHE_SIZE,
+    disk_dir=METRIC_CACHE_DIR,
+    name="metric"
+)
+
+# 404 负缓存 (repo, metric) -> 错误信息，短时间内重复请求不再访问上游
+negative_cache = TTLCache(maxsize=METRIC_CACHE_SIZE, name="negative")
+
+# 分析结果缓存 (repo, 数据截止月, window) -> compute_repo_potential 的返回值
+# /analyze 与 /ai-suggest 共用，同一参数只计算一次
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, disk_dir=RESULT_CACHE_DIR, name="result")
+
+# 并发请求合并：同一仓库的分析、同一 (repo, metric) 的下载同时只进行一次
+analyze_flight = SingleFlight(name="analyze")
+metric_flight = SingleFlight(name="metric")
+
+# 全进程共享的指标下载线程池（每个请求并发拉取 6 个指标）
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=FETCH_MAX_WORKERS,
+    thread_name_prefix="fetch_metric"
+)
+
+# 后台刷新过期序列（stale-while-revalidate），同一 (repo, metric) 同时只排队一次
+_revalidate_executor = ThreadPoolExecutor(
+    max_workers=REVALIDATE_WORKERS,
+    thread_name_prefix="revalidate"
+)
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# 批量分析专用的下载线程池：所有批量请求共用，线程数即全局并发上限，不挤占单仓库分析
+_batch_executor = ThreadPoolExecutor(
+    max_workers=BATCH_MAX_CONCURRENCY,
+    thread_name_prefix="batch_metric"
+)
+
+
+def shutdown():
+    """
+    进程退出前调用：取消排队中的下载、关闭连接池
+    正在进行的下载不等待，最多 FETCH_DEADLINE 秒后结束
+    """
+    _fetch_executor.shutdown(wait=False, cancel_futures=True)
+    _revalidate_executor.shutdown(wait=False, cancel_futures=True)
+    _batch_executor.shutdown(wait=False, cancel_futures=True)
+    opendigger.close()
 
 
 # =========================
-# 工具函数
+# 指标获取
 # =========================
 
-def last_n_months(n=6):
-    end = datetime.now().replace(day=1)
-    months = []
-    for i in range(n):
-        m = end - relativedelta(months=n - i)
-        months.append(m.strftime("%Y-%m"))
-    return months
+def download_metric_series(repo, metric):
+    """从本地指标仓库读取完整月度序列 {"YYYY-MM": value}，本月未同步过时才访问 OpenDigger"""
+    return warehouse.get_series(repo, metric)
+
+
+def fetch_metric_series(repo, metric, need_month=None):
+    """
+    带缓存地获取完整月度序列，同一 (repo, metric) 每月只下载一次
+    - 404 在 NEGATIVE_CACHE_TTL 内直接复用，不再访问上游
+    - 缓存已过期、但旧序列已包含 need_month 时，先返回旧序列，后台再刷新（stale-while-revalidate）
+    - 下载失败（超时、上游熔断等）时，旧序列包含 need_month 才退回旧序列，否则抛出（请求返回 503）
+    """
+    key = (repo, metric)
+    reason = negative_cache.get(key)
+    if reason is not None:
+        raise MetricNotFoundError(reason)
+
+    time_series = metric_cache.get(key)
+    if time_series is not None:
+        return time_series
+
+    stale = stale_metric_series(repo, metric)
+    if stale_usable(stale, need_month):
+        _revalidate(repo, metric)
+        return stale
+
+    try:
+        return metric_flight.do(key, _download_and_cache, repo, metric)
+    except MetricNotFoundError:
+        raise
+    except OpenDiggerError as e:
+        if not stale_usable(stale, need_month):
+            raise
+        print(f"⚠️ {repo}/{metric} 下载失败，使用旧数据: {e}")
+        return stale
+
+
+def stale_metric_series(repo, metric):
+    """已过期但仍可用的旧序列：先找过期的缓存条目，再找本地指标仓库中上个周期的数据"""
+    time_series, _ = metric_cache.get_stale((repo, metric))
+    if time_series is None and not warehouse.is_fresh(repo, metric):
+        time_series = warehouse.read_series(repo, metric) or None
+    return time_series
+
+
+def _download_and_cache(repo, metric):
+    try:
+        time_series = download_metric_series(repo, metric)
+    except MetricNotFoundError as e:
+        negative_cache.set((repo, metric), str(e), time.time() + NEGATIVE_CACHE_TTL)
+        raise
+    metric_cache.set((repo, metric), time_series, next_publish_time())
+    return time_series
+
+
+def _revalidate(repo, metric):
+    """提交后台刷新（同一 (repo, metric) 已在排队或刷新中时跳过）"""
+    key = (repo, metric)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    try:
+        _revalidate_executor.submit(_revalidate_task, repo, metric)
+    except RuntimeError:  # 进程退出中，线程池已关闭
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
+
+def _revalidate_task(repo, metric):
+    key = (repo, metric)
+    try:
+        metric_flight.do(key, _download_and_cache, repo, metric)
+    except Exception as e:
+        print(f"⚠️ 后台刷新失败 {repo}/{metric}: {e}")
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
 
 
 def fetch_metric(repo, metric, months):
-    owner, name = repo.split("/")
-    url = f"https://oss.open-digger.cn/github/{owner}/{name}/{metric}.json"
+    return series_values(fetch_metric_series(repo, metric, months[-1]), months)
 
-    ssl_context = ssl._create_unverified_context()
-    request = urllib.request.Request(url, headers=HEADERS)
 
-    with urllib.request.urlopen(request, context=ssl_context, timeout=REQUEST_TIMEOUT) as resp:
-        raw = resp.read()
-        if resp.headers.get("Content-Encoding") == "gzip":
-            raw = gzip.decompress(raw)
+def result_expiry(repo):
+    """
+    分析结果的过期时间：所用序列都是最新的则到下次发布为止；
+    用到了旧序列（后台还在刷新）则只缓存 STALE_RESULT_TTL 秒，之后用新数据重算
+    """
+    if all(metric_cache.is_fresh((repo, metric)) for metric in METRICS):
+        return next_publish_time()
+    return time.time() + STALE_RESULT_TTL
 
-        data = json.loads(raw.decode("utf-8"))
 
-    time_series = data.get("avg", data)
-    values = []
+def result_expires_at(repo, window, as_of):
+    """已缓存结果的过期时间（没有缓存时按 result_expiry 估计），GET /analyze 的 Cache-Control 据此设置"""
+    return result_cache.expires_at(result_key(repo, window, as_of)) or result_expiry(repo)
 
-    for m in months:
-        values.append(float(time_series.get(m, 0)))
 
-    return values
+def fetch_metrics_concurrently(repo, metrics, months, deadline=FETCH_DEADLINE):
+    """
+    并发拉取多个指标，整体受 deadline 秒限制
+    :return: {metric: values}，顺序与 metrics 一致
+    :raises MetricFetchError: 任一指标失败或超时，异常中包含全部失败指标
+    """
+    futures = {
+        metric: _fetch_executor.submit(fetch_metric, repo, metric, months)
+        for metric in metrics
+    }
+    wait(futures.values(), timeout=deadline)
+    return collect_fetch_results(repo, futures, deadline)
 
 
 # =========================
 # 指标计算
 # =========================
 
-def calc_trend(values):
-    if len(values) < 2:
-        return 0.0
-    return (values[-1] - values[0]) / (abs(values[0]) + 1e-6)
-
-
-def calc_jump(values):
-    if len(values) < 2:
-        return 0.0
-    return int(values[-1] > values[0])
-
-
-# 新增：按切片计算单轮趋势数据
-def calculate_trending_data_by_slice(detailed_data, slice_len):
-    """
-    根据切片长度计算趋势数据
-    :param detailed_data: 原始详细指标数据
-    :param slice_len: 切片长度（取前slice_len个数据）
-    :return: 该切片对应的趋势数据
-    """
-    trending_data = {
-    "activity_trend": round(calc_trend(detailed_data["activity"][:slice_len]), 2),
-    "participants_trend": round(calc_trend(detailed_data["participants"][:slice_len]), 2),
-    "contributors_jump": round(calc_jump(detailed_data["contributors"][:slice_len]), 2),
-    "bus_factor_jump": round(calc_jump(detailed_data["bus_factor"][:slice_len]), 2),
-    "issue_response_time_trend": round(-calc_trend(detailed_data["issue_response_time"][:slice_len]), 2),
-    "openrank_trend": round(calc_trend(detailed_data["openrank"][:slice_len]), 2)
-}
-    return trending_data
-
-# 新增：计算单轮潜力值
-def calculate_single_potential(trending_data):
-    """计算单个切片对应的潜力值"""
-    potential = 0.0
-    for k, w in POTENTIAL_WEIGHTS.items():
-        potential += w * trending_data.get(k, 0.0)
-    potential = (round(float(potential), 4) + 1) * 100
-    return potential
+def detailed_to_array(detailed_data):
+    """{metric: [按月的值]} -> (M, T) 数组，指标顺序与 METRICS 一致"""
+    return np.array([detailed_data[metric] for metric in METRICS], dtype=np.float64)
+
+
+def calculate_potential_series(values, model=None):
+    """
+    一次算出潜力值随时间的变化：第 L 个月的潜力值只用前 L 个月的数据
+    等价于原先对每个切片长度 2..T 分别计算趋势数据再加权，但总计算量为 O(M·T)
+    :param values: (N, M, T) 数组
+    :param model: PotentialModel，默认为当前加载的模型
+    :return: potential (N, T)（第 0 个月无趋势，为 NaN），最后一个月的趋势数据 (N, F)（保留 2 位小数）
+    """
+    model = model or get_model()
+    # 与原切片版本一致：趋势数据先保留 2 位小数再评分
+    features = round_like_python(compute_prefix_features(values, METRICS, variant=model.feature_variant), 2)
+
+    potential = (round_like_python(model.score(features), 4) + 1) * 100
+    potential[:, 0] = np.nan
+    return potential, features[:, -1]
+
+
+def potentials_from_detailed(detailed_list, model=None):
+    """
+    N 个仓库的潜力值一次向量化计算（各仓库窗口长度需相同）
+    :param detailed_list: [detailed_data]
+    :return: [(trending_data, potential_array)]，顺序与输入一致
+    """
+    values = np.stack([detailed_to_array(d) for d in detailed_list])
+    potential, last_features = calculate_potential_series(values, model)
+
+    results = []
+    for i in range(len(detailed_list)):
+        # trending_data 为整个窗口的趋势数据（保留 2 位小数，与之前逐切片计算的最后一轮一致）
+        trending_data = {k: round(v, 2) for k, v in features_to_dict(last_features[i]).items()}
+        potential_array = [None] + [float(p) for p in potential[i, 1:]]
+        results.append((trending_data, potential_array))
+    return results
+
+
+def batch_results(succeeded, model=None):
+    """
+    批量分析中一轮下载完的仓库一起向量化计算
+    :param succeeded: [(repo, detailed_data)]
+    :return: [(repo, result)]，result 与 compute_repo_potential 返回值相同
+    """
+    computed = potentials_from_detailed([detailed for _, detailed in succeeded], model)
+    return [
+        (repo, (detailed_data, trending_data, potential_array))
+        for (repo, detailed_data), (trending_data, potential_array) in zip(succeeded, computed)
+    ]
 
 # =========================
 # 核心对外函数
 # =========================
 
-def compute_repo_potential(repo: str):
-    months = last_n_months(6)
-
-    detailed_data = {}
-    for metric in METRICS:
-        detailed_data[metric] = fetch_metric(repo, metric, months)
-
-    # trending_data（与你之前实验一致）
-    trending_data = {
-        "activity_trend": calc_trend(detailed_data["activity"]),
-        "participants_trend": calc_trend(detailed_data["participants"]),
-        "contributors_jump": calc_jump(detailed_data["contributors"]),
-        "bus_factor_jump": calc_jump(detailed_data["bus_factor"]),
-        "issue_response_time_trend": -calc_trend(detailed_data["issue_response_time"]),
-        "openrank_trend": calc_trend(detailed_data["openrank"])
-    }
+def compute_repo_potential(repo: str, window: int = 6, as_of: str = None, model=None):
+    """
+    计算仓库潜力
+    :param window: 取多少个月（2 ~ MAX_WINDOW），长窗口用于历史曲线
+    :param as_of: 数据截止月 "YYYY-MM"（含），默认为 OpenDigger 已发布的最新月份；指定后结果与调用时间无关
+    :param model: PotentialModel，默认为当前加载的模型
+    :return: detailed_data, trending_data, potential_array（长度为 window，第一个元素为 None）
+    """
+    window, as_of = resolve_window(window, as_of)
+    months = last_n_months(window, as_of)
 
-    # 潜力值（线性模型）
-    # potential = 0.0
-    # for k, w in POTENTIAL_WEIGHTS.items():
-    #     potential += w * trending_data.get(k, 0.0)
-
-        # 初始化潜力值数组，第一个元素为null
-    potential_array = [None]
-    # 获取数据长度（默认6个月）
-    data_length = len(months)
-    
-    # 从第二个元素开始计算（切片长度从2到data_length）
-    for slice_len in range(2, data_length + 1):
-        # 计算当前切片的趋势数据
-        trending_data = calculate_trending_data_by_slice(detailed_data, slice_len)
-        # 计算当前切片对应的潜力值
-        single_potential = calculate_single_potential(trending_data)
-        # 加入潜力值数组
-        potential_array.append(single_potential)
-
-    # potential = (round(float(potential), 4) + 1) * 100
+    # 完整序列按 (repo, metric) 缓存，不同 window / as_of 只是在同一份序列上切片，不会重新下载
+    with metrics.stage("fetch"):
+        detailed_data = fetch_metrics_concurrently(repo, METRICS, months)
+
+    # 潜力值（线性模型），整条曲线一次向量化计算
+    with metrics.stage("compute"):
+        trending_data, potential_array = potentials_from_detailed([detailed_data], model)[0]
 
     return detailed_data, trending_data, potential_array
+
+
+def get_repo_potential(repo: str, window: int = 6, as_of: str = None):
+    """
+    带结果缓存的 compute_repo_potential，缓存键见 result_key
+    命中缓存直接返回；同一计算已在进行时等待其结果，而不是重新拉取
+    """
+    window, as_of = resolve_window(window, as_of)
+    model = get_model()
+    key = result_key(repo, window, as_of, model)
+    with metrics.stage("cache"):
+        result = result_cache.get(key)
+    if result is not None:
+        return result
+
+    return analyze_flight.do(key, _compute_and_store, key, model)
+
+
+def _compute_and_store(key, model):
+    repo, as_of, window, _ = key
+    result = compute_repo_potential(repo, window, as_of, model)
+    store_result(key, result)
+    return result
+
+
+def store_result(key, result):
+    """写入结果缓存（key 见 result_key），过期时间见 result_expiry"""
+    result_cache.set(key, result, result_expiry(key[0]))
+
+
+def iter_repo_potentials(repos, window: int = 6, as_of: str = None, deadline=BATCH_DEADLINE):
+    """
+    批量计算多个仓库的潜力，按完成先后逐个产出
+    - 已缓存的仓库立即产出；其余仓库的 (repo, metric) 下载全部提交到共享的批量线程池
+    - 每轮取出所有已下载完的仓库，一起向量化计算潜力值，结果写入 result_cache 供 /analyze 复用
+    - 调用方提前停止迭代（如客户端断开）时，取消尚未开始的下载
+    :return: 生成器，产出 (repo, result, error)，result 与 compute_repo_potential 返回值相同，
+             失败时 result 为 None、error 为 MetricFetchError
+    """
+    window, as_of = resolve_window(window, as_of)
+    months = last_n_months(window, as_of)
+    model = get_model()
+
+    progress = BatchProgress(deadline)
+    try:
+        for repo in dict.fromkeys(repos):
+            result = result_cache.get(result_key(repo, window, as_of, model))
+            if result is not None:
+                yield repo, result, None
+                continue
+            progress.add(repo, {
+                metric: _batch_executor.submit(fetch_metric, repo, metric, months)
+                for metric in METRICS
+            })
+
+        progress.start()
+        while progress.pending:
+            done, _ = wait(progress.pending, timeout=progress.time_left(), return_when=FIRST_COMPLETED)
+            errors, succeeded = progress.collect(done)
+            for repo, error in errors:
+                yield repo, None, error
+            if succeeded:
+                for repo, result in batch_results(succeeded, model):
+                    store_result(result_key(repo, window, as_of, model), result)
+                    yield repo, result, None
+    finally:
+        progress.cancel()
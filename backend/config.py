@@ -28,6 +28,61 @@ REQUEST_TIMEOUT = 20
 # 延迟时间
 REQUEST_DELAY = 1
 
+# 单次分析拉取全部指标的总时限（秒），超时的指标记为失败
+FETCH_DEADLINE = 15
+
+# 指标并发下载线程数（进程内所有请求共享）
+FETCH_MAX_WORKERS = 32
+
+# OpenDigger 每月几号发布上月数据，指标缓存在该时刻过期
+OPENDIGGER_PUBLISH_DAY = 2
+
+# OpenDigger 数据地址；压测时可指向 loadtest.py --mock-opendigger 启动的模拟服务
+OPENDIGGER_BASE_URL = os.getenv("OPENDIGGER_BASE_URL", "https://oss.open-digger.cn/github")
+
+# 指标缓存最多保留的 (repo, metric) 条目数
+METRIC_CACHE_SIZE = 4096
+
+# 分析窗口最长月数（历史曲线用长窗口）
+MAX_WINDOW = 60
+
+# 分析结果缓存最多保留的仓库数
+RESULT_CACHE_SIZE = 1024
+
+# 指标缓存的磁盘目录，设置后重启不会冷启动；为空则只用内存
+METRIC_CACHE_DIR = os.getenv("METRIC_CACHE_DIR") or None
+
+# 分析结果缓存的磁盘目录，多个 worker 进程指向同一目录即可共享结果；为空则只用内存
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR") or None
+
+# 上游故障保护：404 负缓存有效期（秒）、OpenDigger 熔断阈值（连续失败次数）与恢复时间（秒）、
+# 用过期数据算出的结果缓存时间（秒，后台刷新后重算）、后台刷新线程数
+NEGATIVE_CACHE_TTL = 600
+OPENDIGGER_BREAKER_THRESHOLD = 5
+OPENDIGGER_BREAKER_RESET = 30
+STALE_RESULT_TTL = 60
+REVALIDATE_WORKERS = 4
+
+# 批量分析：单次请求最多仓库数、全进程同时在途的指标下载上限、单次请求总时限（秒）
+BATCH_MAX_REPOS = 500
+BATCH_MAX_CONCURRENCY = 32
+BATCH_DEADLINE = 120
+
+# 响应中附带 Server-Timing 头（cache / fetch / compute / qwen 各阶段耗时），浏览器开发者工具可直接查看
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "1") == "1"
+
+# /metrics 的多进程汇总目录：多个 worker 时每个进程的指标各自独立，设置后各 worker 定期把样本写到这里，
+# 抓取任意一个 worker 都返回全部 worker 的汇总；单进程运行时留空（gunicorn.conf.py 会自动设置）
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or None
+
+# 潜力模型文件（modeling/train.py 输出），启动时加载，每 MODEL_RELOAD_INTERVAL 秒检查是否更新
+# 文件不存在时使用下面的 POTENTIAL_WEIGHTS
+MODEL_PATH = os.getenv(
+    "POTENTIAL_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "potential_model.json")
+)
+MODEL_RELOAD_INTERVAL = 30
+
 POTENTIAL_WEIGHTS = {
     "activity_trend": 0.6717,
     "participants_trend": -0.2348,
@@ -46,5 +101,34 @@ METRICS = [
     "openrank"
 ]
 
-QWEN_API_KEY = 'sk-e507bc9960a14a82a84a361961767157'
-QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
\ No newline at end of file
+# 后台预热：定期发现热门仓库并提前计算潜力值，OpenDigger 发布新月份数据后自动重算
+# 多进程部署时只有拿到 data/warmup.lock 的进程执行，其他进程通过磁盘缓存共享结果
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED") == "1"
+WARMUP_INTERVAL = 6 * 3600          # 重新发现热门仓库的间隔（秒）
+WARMUP_MAX_REPOS = 200              # 每轮最多预热的仓库数
+WARMUP_SEARCH_COUNT = 0             # 额外用 GitHub Search API 获取的仓库数（0 表示只用 Trending）
+WARMUP_SEARCH_QUERIES = ["stars:>1000"]  # 运行时自动加上“最近 30 天有推送”条件
+WARMUP_TRENDING_URLS = [
+    "https://github.com/trending",
+    "https://github.com/trending?since=weekly",
+    "https://github.com/trending?since=monthly",
+]
+
+QWEN_API_KEY = os.getenv("QWEN_API_KEY", 'sk-e507bc9960a14a82a84a361961767157')
+# 可指向本地 OpenAI 兼容服务调试，如 mock_qwen_server.py: http://127.0.0.1:8001/v1
+QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+QWEN_MODEL = "qwen-turbo"
+QWEN_TEMPERATURE = 0.7
+QWEN_MAX_TOKENS = 1024
+
+# 千问调用：超时（秒）、自动重试次数、连接池大小、同时在途的调用上限
+QWEN_TIMEOUT = 60
+QWEN_CONNECT_TIMEOUT = 5
+QWEN_MAX_RETRIES = 2
+QWEN_MAX_CONNECTIONS = 20
+QWEN_MAX_CONCURRENCY = 16
+
+# AI 建议缓存：最多条目数、有效期（秒，且不超过下次数据发布）、磁盘目录（为空则只用内存）
+SUGGESTION_CACHE_SIZE = 2048
+SUGGESTION_CACHE_TTL = 7 * 24 * 3600
+SUGGESTION_CACHE_DIR = os.getenv("SUGGESTION_CACHE_DIR") or None
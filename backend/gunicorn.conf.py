@@ -0,0 +1,79 @@
+# gunicorn.conf.py 生产环境多进程部署配置
+#   cd backend && gunicorn -c gunicorn.conf.py wsgi:app
+#
+# /analyze 的耗时主要在等待 OpenDigger / 千问的网络 I/O，
+# 因此用 gthread（每个进程多线程）而不是同步 worker；worker 数、线程数可用环境变量调整
+import multiprocessing
+import os
+
+_base_dir = os.path.dirname(os.path.abspath(__file__))
+_cache_root = os.path.join(_base_dir, "..", "data", "cache")
+
+# 多个 worker 进程共享同一份磁盘缓存 + SQLite 指标仓库：
+# 一个进程算过的结果，其他进程直接从磁盘读取，重启也不会冷启动
+# （在 master 进程中设置，fork 出的 worker 继承，需在导入 app 之前生效）
+os.environ.setdefault("METRIC_CACHE_DIR", os.path.join(_cache_root, "metric"))
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_cache_root, "result"))
+os.environ.setdefault("SUGGESTION_CACHE_DIR", os.path.join(_cache_root, "suggestion"))
+# 每个 worker 的 /metrics 只有本进程的计数，而请求会被分到任意一个 worker；
+# 各 worker 定期把样本写到这个目录，/metrics 汇总全部 worker（见 metrics.enable_multiprocess）
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(_base_dir, "..", "data", "metrics"))
+os.environ.setdefault("FLASK_DEBUG", "0")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+
+# 单个请求最长处理时间（批量分析、流式建议耗时较长）；收到 SIGTERM 后等待在途请求完成的时间
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 180))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# 每个 worker 处理一定请求数后重启，防止内存缓慢增长；加抖动避免同时重启
+max_requests = 5000
+max_requests_jitter = 500
+
+# 不预加载：线程池、SQLite 连接、HTTP 连接池都在各 worker 内创建，不跨 fork 共享
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """master 启动时清掉上次运行留下的指标快照"""
+    import metrics
+    if os.environ["METRICS_MULTIPROC_DIR"]:
+        metrics.clear_snapshots(os.environ["METRICS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    """worker 退出后（master 中）把它的计数并入汇总，避免 /metrics 的总数因 worker 重启而回退"""
+    import metrics
+    if os.environ["METRICS_MULTIPROC_DIR"]:
+        metrics.mark_process_dead(os.environ["METRICS_MULTIPROC_DIR"], worker.pid)
+
+
+def post_worker_init(worker):
+    """开启 WARMUP_ENABLED 时启动后台预热（文件锁保证只有一个 worker 真正执行）"""
+    from config import WARMUP_ENABLED
+    if WARMUP_ENABLED:
+        import warmup
+        warmup.scheduler.start()
+
+
+def worker_exit(server, worker):
+    """worker 退出时停止预热、取消排队中的下载并关闭连接池"""
+    try:
+        import cal_potential
+        import warmup
+    except ImportError:
+        return
+    warmup.scheduler.stop()
+    cal_potential.shutdown()
+    # 最后一次写入指标快照，退出前几秒内的计数也计入汇总
+    import metrics
+    metrics.REGISTRY.write_snapshot()
+    server.log.info("worker %s: 下载线程池与连接池已关闭", worker.pid)
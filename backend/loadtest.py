@@ -0,0 +1,216 @@
+# loadtest.py 简易压测脚本：并发请求 /analyze，统计吞吐量与延迟分位数
+# 对比开发服务器与 gunicorn 部署：
+#   python app.py                                  # 终端 1，开发服务器
+#   python loadtest.py --concurrency 50            # 终端 2
+#   gunicorn -c gunicorn.conf.py wsgi:app          # 换成生产部署后再压一次
+#
+# 三种模式：
+# - compute（默认）：正式计时前先按默认参数把每个仓库请求一次（指标序列进入缓存，不计入结果），
+#   之后每个请求的 (repo, window, as_of) 都不同，结果缓存全部未命中，每次都要重新计算、序列化，
+#   但不访问 OpenDigger，只测 CPU 部分。同一 --seed 下请求序列相同，
+#   每次压测前需重启后端（并清空 RESULT_CACHE_DIR），否则上一轮的结果会被缓存命中
+# - hit：同样先预热，之后反复请求同样的参数，几乎全部命中结果缓存，只反映框架本身的请求处理开销
+# - cold：每个请求都是没见过的仓库，指标缓存、指标仓库、结果缓存全部未命中，每个请求都要等 6 次上游下载，
+#   测的是等待网络 I/O 时的并发能力（线程数、连接池、下载线程池是否够用）。
+#   上游用本脚本启动的模拟 OpenDigger（固定延迟 + 抖动），不压真实服务：
+#     python loadtest.py --mock-opendigger --mock-latency 0.2        # 终端 1，模拟上游
+#     OPENDIGGER_BASE_URL=http://127.0.0.1:5100/github \
+#     OPENDIGGER_WAREHOUSE=/tmp/loadtest.sqlite3 python app.py      # 终端 2，后端指向模拟上游、用空的指标仓库
+#     python loadtest.py --mode cold --concurrency 50               # 终端 3
+#   不同的 --seed 生成不同的仓库名，同一个后端可以连续压多轮
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_REPOS = [
+    "pytorch/pytorch", "tensorflow/tensorflow", "microsoft/vscode", "facebook/react",
+    "vuejs/core", "golang/go", "rust-lang/rust", "kubernetes/kubernetes",
+    "apache/spark", "flutter/flutter", "nodejs/node", "denoland/deno",
+    "X-lab2017/open-digger", "huggingface/transformers", "langchain-ai/langchain", "vercel/next.js"
+]
+
+# compute 模式下参数的取值范围：窗口 2 ~ 12 个月，截止月为最近 24 个已发布月份之一
+BUST_WINDOWS = range(2, 13)
+BUST_MONTHS = 24
+
+# 模拟 OpenDigger：每个指标返回最近 MOCK_MONTHS 个月的数据
+MOCK_PORT = 5100
+MOCK_MONTHS = 36
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bust_params(seed=0, now=None):
+    """
+    compute 模式的 (window, as_of) 组合，按 seed 打乱
+    截止月从两个月前往回取，不依赖 OpenDigger 本月是否已发布
+    """
+    now = now or datetime.now()
+    months = []
+    for k in range(2, BUST_MONTHS + 2):
+        year, month = divmod(now.year * 12 + now.month - 1 - k, 12)
+        months.append(f"{year:04d}-{month + 1:02d}")
+    params = [{"window": w, "as_of": m} for w in BUST_WINDOWS for m in months]
+    random.Random(seed).shuffle(params)
+    return params
+
+
+def build_requests(repos, total, mode, seed=0):
+    """
+    :return: [(repo, 额外参数)]；compute 模式下前 len(repos) * 组合数 个请求互不相同，
+             cold 模式下每个请求的仓库都不同（repos 不使用）
+    """
+    if mode == "cold":
+        return [(f"loadtest-{seed}/repo-{i}", {}) for i in range(total)]
+    if mode == "hit":
+        return [(repos[i % len(repos)], {}) for i in range(total)]
+    params = bust_params(seed)
+    if total > len(repos) * len(params):
+        print(f"⚠️ 不重复的请求只有 {len(repos) * len(params)} 个，之后的请求会命中结果缓存")
+    return [(repos[i % len(repos)], params[(i // len(repos)) % len(params)]) for i in range(total)]
+
+
+def send(url, repo, timeout, params=None):
+    """发送一次 /analyze 请求，返回 (耗时秒, HTTP 状态码)"""
+    body = json.dumps({"repo": repo, **(params or {})}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0  # 连接失败 / 超时
+    return time.perf_counter() - start, status
+
+
+def warm_up(url, repos, concurrency, timeout):
+    """按默认参数把每个仓库请求一次，让后端缓存好指标序列（不计入压测结果）"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(lambda repo: send(url, repo, timeout)[1], repos))
+    failed = sum(1 for status in statuses if status != 200)
+    print(f"🔥 预热完成：{len(repos)} 个仓库，失败 {failed} 个")
+
+
+def run(url, repos, concurrency, total, timeout, mode="compute", seed=0):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    requests = build_requests(repos, total, mode, seed)
+
+    def task(item):
+        repo, params = item
+        elapsed, status = send(url, repo, timeout, params)
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    if mode != "cold":
+        warm_up(url, repos, concurrency, timeout)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, requests))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"📊 [{mode}] {total} 个请求，并发 {concurrency}，用时 {duration:.2f}s")
+    print(f"   吞吐量: {total / duration:.1f} req/s")
+    print(
+        f"   延迟: p50 {percentile(latencies, 50) * 1000:.0f} ms，"
+        f"p95 {percentile(latencies, 95) * 1000:.0f} ms，"
+        f"p99 {percentile(latencies, 99) * 1000:.0f} ms，"
+        f"max {latencies[-1] * 1000:.0f} ms"
+    )
+    print(f"   状态码: {dict(sorted(statuses.items()))}")
+
+
+# =========================
+# 模拟 OpenDigger
+# =========================
+
+def mock_series(path, months=MOCK_MONTHS, now=None):
+    """按 URL 生成固定的月度序列：同一 (repo, metric) 每次返回相同数据，不同仓库的数值不同"""
+    now = now or datetime.now()
+    rng = random.Random(hashlib.md5(path.encode("utf-8")).hexdigest())
+    base = rng.uniform(1, 100)
+    series = {}
+    for k in range(months, 0, -1):
+        year, month = divmod(now.year * 12 + now.month - 1 - k, 12)
+        series[f"{year:04d}-{month + 1:02d}"] = round(base * rng.uniform(0.5, 1.5), 2)
+    return series
+
+
+def serve_mock(port=MOCK_PORT, latency=0.2, jitter=0.05):
+    """
+    启动模拟 OpenDigger：GET /github/<owner>/<repo>/<metric>.json 等待 latency ± jitter 秒后返回 JSON
+    每个连接一个线程，延迟之间互不排队，模拟上游的网络往返
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            if not self.path.endswith(".json"):
+                self.send_error(404)
+                return
+            body = json.dumps(mock_series(self.path)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"🧪 模拟 OpenDigger: http://127.0.0.1:{port}/github ，延迟 {latency * 1000:.0f}±{jitter * 1000:.0f} ms")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/analyze 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/analyze")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--repos", help="仓库列表 JSON 文件；默认使用内置的 16 个热门仓库")
+    parser.add_argument("--shuffle", action="store_true", help="打乱请求顺序")
+    parser.add_argument("--mode", choices=["compute", "hit", "cold"], default="compute",
+                        help="compute：参数各不相同，结果缓存不命中（对比服务器用）；hit：重复参数，测缓存命中路径；"
+                             "cold：每个请求都是新仓库，全部访问上游（配合 --mock-opendigger）")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="compute 模式下参数的打乱种子，对比时两边保持一致；cold 模式下决定仓库名")
+    parser.add_argument("--mock-opendigger", action="store_true", help="不压测，启动模拟 OpenDigger 服务")
+    parser.add_argument("--mock-port", type=int, default=MOCK_PORT)
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="模拟上游每个请求的延迟（秒）")
+    parser.add_argument("--mock-jitter", type=float, default=0.05, help="延迟的随机抖动（秒）")
+    args = parser.parse_args()
+
+    if args.mock_opendigger:
+        serve_mock(args.mock_port, args.mock_latency, args.mock_jitter)
+        raise SystemExit
+
+    repos = DEFAULT_REPOS
+    if args.repos:
+        with open(args.repos, "r", encoding="utf-8") as f:
+            repos = json.load(f)
+    if args.shuffle:
+        repos = random.sample(repos, len(repos))
+    run(args.url, repos, args.concurrency, args.requests, args.timeout, args.mode, args.seed)
@@ -0,0 +1,487 @@
+# metrics.py 请求级耗时统计与 Prometheus 文本格式导出（不依赖 prometheus_client）
+# - Counter / Gauge / Histogram 三种指标，线程安全，支持标签
+# - stage("fetch") 计时一个处理阶段：计入直方图，同时记入当前请求的 Server-Timing
+# - add_collector 注册抓取时才计算的指标（缓存命中率、在途请求数等）
+# - 多 worker 部署（gunicorn）时 enable_multiprocess：各 worker 定期把样本写到共享目录，
+#   /metrics 无论被分到哪个 worker 都汇总全部 worker（counter / histogram 相加，gauge 带 pid 标签）
+import contextvars
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 响应体大小分桶（字节）
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 多进程模式下各 worker 写快照的间隔（秒）
+SNAPSHOT_INTERVAL = 5
+# 已退出 worker 的 counter / histogram 累计值
+ARCHIVE_FILE = "archive.json"
+# archive.json 中记住最近多少个已归档的快照文件名
+ARCHIVED_NAMES = 100
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}  # 标签值元组 -> 数据
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels_dict(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """只增不减的计数，导出时名称自动加 _total"""
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name if name.endswith("_total") else name + "_total", documentation, labelnames, registry)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels_dict(k), v) for k, v in self._children.items()]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值（如在途请求数）"""
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels_dict(k), v) for k, v in self._children.items()]
+
+
+class Histogram(_Metric):
+    """分桶统计（耗时、字节数等），导出 _bucket / _sum / _count"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    child[0][i] += 1
+                    break
+            child[1] += value
+            child[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._children.items():
+                labels = self._labels_dict(key)
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    result.append((self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                result.append((self.name + "_sum", labels, total))
+                result.append((self.name + "_count", labels, count))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._duplicates = set()
+        self.multiprocess_dir = None
+        self._snapshot_name = None
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, fn):
+        """
+        注册抓取时调用的采集函数
+        fn() 返回 [(name, type, documentation, [(labels, value), ...]), ...]
+        """
+        with self._lock:
+            self._collectors.append(fn)
+
+    def collect(self):
+        """
+        本进程的全部指标：[(name, type, documentation, [(sample_name, labels, value), ...]), ...]
+        多个采集函数可能产出同名指标（如同步版与异步版的请求合并、熔断器），按名称合并，每个指标只输出一次 HELP / TYPE
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        families = {}
+        for metric in metrics:
+            self._add_samples(families, metric.name, metric.type, metric.documentation, metric.samples())
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                print(f"⚠️ 指标采集失败: {e}")
+                continue
+            for name, metric_type, documentation, samples in collected:
+                self._add_samples(families, name, metric_type, documentation,
+                                  [(name, labels, value) for labels, value in samples])
+        return [(name, t, doc, list(samples.values())) for name, (t, doc, samples) in families.items()]
+
+    def _add_samples(self, families, name, metric_type, documentation, samples):
+        family = families.setdefault(name, (metric_type, documentation, {}))
+        for sample_name, labels, value in samples:
+            key = (sample_name, tuple(sorted(labels.items())))
+            if key in family[2]:
+                # 同一标签组合出现两次说明采集函数重复注册或缺少区分的标签（Prometheus 会拒绝整个响应）：
+                # 只导出第一个，并提示修正（每个样本只提示一次）
+                if key not in self._duplicates:
+                    self._duplicates.add(key)
+                    print(f"⚠️ 指标样本重复，已忽略后出现的值: {sample_name}{_format_labels(labels)}")
+                continue
+            family[2][key] = (sample_name, labels, value)
+
+    # ---------- 多进程 ----------
+
+    def enable_multiprocess(self, directory, interval=SNAPSHOT_INTERVAL):
+        """
+        多 worker 部署时在每个 worker 中调用：每 interval 秒把本进程的样本写到 directory，
+        render() 时汇总目录中全部 worker 的快照，/metrics 被分到哪个 worker 都返回全局数据
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.multiprocess_dir = directory
+        # 文件名带启动时间，pid 被复用时也不会与已退出的 worker 混淆
+        self._snapshot_name = f"{os.getpid()}-{time.time_ns()}.json"
+        self.write_snapshot()
+        threading.Thread(target=self._snapshot_loop, args=(interval,), name="metrics_snapshot", daemon=True).start()
+
+    def _snapshot_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"⚠️ 指标快照写入失败: {e}")
+
+    def write_snapshot(self):
+        """把本进程的样本写入快照文件（worker 退出前也应调用一次）"""
+        if self.multiprocess_dir is not None:
+            _write_json(self.multiprocess_dir, self._snapshot_name, {"pid": os.getpid(), "families": self.collect()})
+
+    def render(self):
+        """导出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        if self.multiprocess_dir is None:
+            families = self.collect()
+        else:
+            self.write_snapshot()
+            families = merge_snapshots(self.multiprocess_dir)
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# =========================
+# 多进程快照
+# =========================
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _merge_families(families, snapshot_families, pid=None):
+    """
+    把一个快照并入 families：counter / histogram 同标签相加；
+    gauge 加上 pid 标签分别保留，pid 为 None（已退出的 worker）时丢弃
+    """
+    for name, metric_type, documentation, samples in snapshot_families:
+        family = families.setdefault(name, (metric_type, documentation, {}))
+        for sample_name, labels, value in samples:
+            if metric_type == "gauge":
+                if pid is None:
+                    continue
+                labels = {**labels, "pid": str(pid)}
+            key = (sample_name, tuple(sorted(labels.items())))
+            previous = family[2].get(key)
+            family[2][key] = (sample_name, labels, value + (previous[2] if previous is not None else 0))
+
+
+def merge_snapshots(directory):
+    """
+    汇总目录中全部 worker 的快照，返回值格式同 Registry.collect
+    已退出 worker 的 counter / histogram 来自 archive.json，总数不会因 worker 重启而回退
+    """
+    # 先读 worker 快照、再读 archive：刚被归档的快照若已读到，会因出现在 archive 的 names 中而跳过，不会重复计数
+    snapshots = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith(".json") and entry != ARCHIVE_FILE:
+            snapshot = _read_json(os.path.join(directory, entry))
+            if snapshot is not None:
+                snapshots.append((entry, snapshot))
+    archive = _read_json(os.path.join(directory, ARCHIVE_FILE)) or {"names": [], "families": []}
+
+    families = {}
+    _merge_families(families, archive["families"])
+    archived = set(archive["names"])
+    for entry, snapshot in snapshots:
+        if entry not in archived:
+            _merge_families(families, snapshot["families"], snapshot["pid"])
+    return [(name, t, doc, list(samples.values())) for name, (t, doc, samples) in families.items()]
+
+
+def mark_process_dead(directory, pid):
+    """
+    worker 退出后由 gunicorn master 调用（child_exit）：该 worker 的 counter / histogram 并入 archive.json，
+    gauge 丢弃，然后删除它的快照文件
+    """
+    names = [entry for entry in os.listdir(directory) if entry.startswith(f"{pid}-") and entry.endswith(".json")]
+    if not names:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _read_json(archive_path) or {"names": [], "families": []}
+
+    families = {}
+    _merge_families(families, archive["families"])
+    for name in names:
+        snapshot = _read_json(os.path.join(directory, name))
+        if snapshot is not None:
+            _merge_families(families, snapshot["families"])
+    _write_json(directory, ARCHIVE_FILE, {
+        "names": (archive["names"] + names)[-ARCHIVED_NAMES:],
+        "families": [(name, t, doc, list(samples.values())) for name, (t, doc, samples) in families.items()]
+    })
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def clear_snapshots(directory):
+    """gunicorn master 启动时调用，清掉上次运行留下的快照（重启后计数从 0 开始）"""
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.listdir(directory):
+        if entry.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, entry))
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# =========================
+# 后端使用的指标
+# =========================
+
+HTTP_REQUESTS = Counter(
+    "potential_http_requests", "HTTP 请求数", ["endpoint", "method", "status"]
+)
+HTTP_SECONDS = Histogram(
+    "potential_http_request_seconds", "HTTP 请求处理耗时（流式响应为首字节耗时）", ["endpoint"]
+)
+HTTP_IN_FLIGHT = Gauge(
+    "potential_http_requests_in_flight", "正在处理的 HTTP 请求数", ["endpoint"]
+)
+STAGE_SECONDS = Histogram(
+    "potential_stage_seconds", "分析各阶段耗时（cache / fetch / compute / qwen 等）", ["stage"]
+)
+UPSTREAM_SECONDS = Histogram(
+    "potential_upstream_request_seconds", "上游请求耗时", ["upstream", "status"]
+)
+UPSTREAM_BYTES = Histogram(
+    "potential_upstream_response_bytes", "上游响应体大小（解压后）", ["upstream"], buckets=BYTES_BUCKETS
+)
+UPSTREAM_DECODE_SECONDS = Histogram(
+    "potential_upstream_decode_seconds", "上游响应 JSON 解析耗时", ["upstream"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+)
+
+
+def observe_opendigger(status_code, elapsed, nbytes, decode_seconds):
+    """OpenDigger 客户端的 on_response 回调：status_code 为 0 表示网络错误"""
+    UPSTREAM_SECONDS.observe(elapsed, upstream="opendigger", status=status_code)
+    if nbytes:
+        UPSTREAM_BYTES.observe(nbytes, upstream="opendigger")
+    if decode_seconds:
+        UPSTREAM_DECODE_SECONDS.observe(decode_seconds, upstream="opendigger")
+
+
+# =========================
+# 请求级分阶段计时（Server-Timing）
+# =========================
+
+# 当前请求的 [(阶段名, 耗时秒)]，None 表示不在请求中（如后台线程）
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+def start_request_timing():
+    """请求开始时调用，之后本请求内的 stage() 都会记入 Server-Timing"""
+    return _timings.set([])
+
+
+def stop_request_timing(token):
+    _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """计时一个处理阶段：总是计入 STAGE_SECONDS，在请求内时同时记入 Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(total=None):
+    """把当前请求记录的阶段耗时拼成 Server-Timing 头，如 "fetch;dur=123.4, compute;dur=0.8" """
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in _timings.get() or ()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# =========================
+# 抓取时采集：缓存、请求合并、熔断器
+# =========================
+
+def cache_collector(*caches):
+    """TTLCache.stats() -> 命中 / 未命中 / 条目数 / 命中率"""
+    def collect():
+        stats = [cache.stats() for cache in caches]
+        return [
+            ("potential_cache_hits_total", "counter", "缓存命中次数",
+             [({"cache": s["name"]}, s["hits"]) for s in stats]),
+            ("potential_cache_misses_total", "counter", "缓存未命中次数",
+             [({"cache": s["name"]}, s["misses"]) for s in stats]),
+            ("potential_cache_stale_hits_total", "counter", "返回过期值的次数",
+             [({"cache": s["name"]}, s.get("stale_hits", 0)) for s in stats]),
+            ("potential_cache_entries", "gauge", "缓存条目数",
+             [({"cache": s["name"]}, s["size"]) for s in stats]),
+            ("potential_cache_hit_ratio", "gauge", "缓存命中率",
+             [({"cache": s["name"]}, s["hit_ratio"]) for s in stats]),
+        ]
+    return collect
+
+
+def flight_collector(*flights):
+    """SingleFlight.stats() -> 在途计算数、被合并的调用次数"""
+    def collect():
+        stats = [flight.stats() for flight in flights]
+        return [
+            ("potential_singleflight_inflight", "gauge", "正在执行的合并计算数",
+             [({"flight": s["name"]}, s["inflight"]) for s in stats]),
+            ("potential_singleflight_waiting", "gauge", "正在等待他人结果的调用数",
+             [({"flight": s["name"]}, s["waiting"]) for s in stats]),
+            ("potential_singleflight_coalesced_total", "counter", "被合并的调用次数",
+             [({"flight": s["name"]}, s["coalesced"]) for s in stats]),
+        ]
+    return collect
+
+
+def breaker_collector(client, kind="sync"):
+    """
+    OpenDigger 熔断器状态（1 为打开）
+    :param kind: client 标签，区分同一进程中的同步客户端与异步客户端
+    """
+    def collect():
+        stats = client.breaker_stats()
+        return [
+            ("potential_upstream_breaker_open", "gauge", "熔断器是否打开",
+             [({"client": kind, "host": host}, int(s["state"] != "closed")) for host, s in stats.items()]),
+            ("potential_upstream_breaker_rejected_total", "counter", "熔断期间被拒绝的请求数",
+             [({"client": kind, "host": host}, s["rejected"]) for host, s in stats.items()]),
+        ]
+    return collect
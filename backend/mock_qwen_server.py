@@ -0,0 +1,92 @@
+# mock_qwen_server.py 本地模拟 OpenAI 兼容的千问接口，用于离线调试 /ai-suggest
+#
+# 用法：
+#   python mock_qwen_server.py --port 8001
+#   QWEN_BASE_URL=http://127.0.0.1:8001/v1 QWEN_API_KEY=test python app.py
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "## 数据解读\n该仓库潜力评分处于中等水平，活跃度保持增长。\n\n"
+    "## 全面评价\n- 社区活跃度：参与者稳定。\n- 项目维护性：响应及时。\n- 发展潜力：中等潜力。\n\n"
+    "## 优化建议\n1. 为新贡献者标记 good first issue。\n2. 固定发版节奏。\n3. 完善贡献指南。\n"
+)
+
+
+class MockQwenHandler(BaseHTTPRequestHandler):
+    # 每个 chunk 之间的间隔（秒），模拟逐 token 生成
+    chunk_delay = 0.05
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model = body.get("model", "qwen-turbo")
+
+        if body.get("stream"):
+            self._send_stream(model)
+        else:
+            self._send_json(model)
+
+    def _send_json(self, model):
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": REPLY},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # 按行切分，逐段推送
+        pieces = [line + "\n" for line in REPLY.split("\n")]
+        for i, piece in enumerate(pieces):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece},
+                    "finish_reason": "stop" if i == len(pieces) - 1 else None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟千问 OpenAI 兼容接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), MockQwenHandler)
+    print(f"✅ 模拟千问服务已启动: http://{args.host}:{args.port}/v1")
+    server.serve_forever()
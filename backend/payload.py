@@ -0,0 +1,176 @@
+# payload.py /analyze 结果的内容协商：响应格式（Accept）、压缩（Accept-Encoding）与 ETag
+# - application/json（默认）：与原接口完全相同的字段
+# - application/vnd.potential.columnar+json：列式紧凑 JSON，指标名只出现一次，序列为二维数组（逐月连续，从 first_month 开始）
+# - application/msgpack：与列式 JSON 相同的结构，数值数组编码为 float64 小端字节（JS 端 new Float64Array 直接读取）
+# - gzip / br 压缩（br 需安装 brotli），响应体小于 COMPRESS_MIN_SIZE 时不压缩；批量接口的流式结果逐块 gzip
+# Flask 与 Quart 的 request 都基于 werkzeug，两个后端共用这里的函数
+import gzip
+import hashlib
+import json
+import zlib
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # 未安装时不提供 msgpack 格式
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # 未安装时只用 gzip
+    brotli = None
+
+JSON_TYPE = "application/json"
+COLUMNAR_TYPE = "application/vnd.potential.columnar+json"
+MSGPACK_TYPE = "application/msgpack"
+
+# 太小的响应压缩后反而更大
+COMPRESS_MIN_SIZE = 1024
+
+# 响应内容随这两个请求头变化，缓存代理需要据此区分
+VARY = "Accept, Accept-Encoding"
+
+
+def available_formats():
+    """可提供的格式，第一个为默认（Accept 为 */* 或缺省时使用）"""
+    formats = [JSON_TYPE, COLUMNAR_TYPE]
+    if msgpack is not None:
+        formats += [MSGPACK_TYPE, "application/x-msgpack"]
+    return formats
+
+
+def available_encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_format(accept_mimetypes):
+    """
+    按 Accept 选择响应格式
+    :param accept_mimetypes: werkzeug 的 request.accept_mimetypes
+    :return: 格式的 MIME 类型；客户端只接受不支持的格式时返回 None（应答 406）
+    """
+    if not accept_mimetypes:
+        return JSON_TYPE
+    best = accept_mimetypes.best_match(available_formats())
+    return MSGPACK_TYPE if best == "application/x-msgpack" else best
+
+
+def negotiate_encoding(accept_encodings):
+    """按 Accept-Encoding 选择压缩方式，不压缩时返回 None"""
+    return accept_encodings.best_match(available_encodings())
+
+
+def to_columnar(payload, months):
+    """
+    /analyze 的 JSON 结果转为列式结构
+    :param months: 窗口内各月份 ["YYYY-MM", ...]，与序列一一对应（月份连续，只输出第一个）
+    """
+    detailed_data = payload["detailed_data"]
+    averaged_data = payload["averaged_data"]
+    return {
+        "repo": payload["repo"],
+        "window": payload["window"],
+        "as_of": payload["as_of"],
+        "first_month": months[0],
+        "metrics": list(detailed_data),
+        "series": [detailed_data[metric] for metric in detailed_data],
+        "features": list(averaged_data),
+        "averaged": [averaged_data[name] for name in averaged_data],
+        "potential": payload["potential"]
+    }
+
+
+def _float_bytes(values):
+    """数值数组 -> float64 小端字节，None 记为 NaN"""
+    return np.array([np.nan if v is None else v for v in values], dtype="<f8").tobytes()
+
+
+def _to_msgpack(columnar):
+    data = dict(columnar)
+    # series 按行展开为 len(metrics) × window 的一维数组
+    data["series"] = b"".join(_float_bytes(row) for row in columnar["series"])
+    data["averaged"] = _float_bytes(columnar["averaged"])
+    data["potential"] = _float_bytes(columnar["potential"])
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def encode_body(payload, fmt, months):
+    """按格式序列化（未压缩）"""
+    if fmt == JSON_TYPE:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    columnar = to_columnar(payload, months)
+    if fmt == COLUMNAR_TYPE:
+        return json.dumps(columnar, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return _to_msgpack(columnar)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    # mtime=0：gzip 头不写入当前时间，同一强 ETag 的响应逐字节相同
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def make_etag(digest, fmt, encoding=None):
+    """
+    强 ETag：结果摘要 + 格式 + 压缩方式，不同表示形式的 ETag 不同
+    :param digest: 结果内容的摘要
+    """
+    suffix = {JSON_TYPE: "json", COLUMNAR_TYPE: "columnar", MSGPACK_TYPE: "msgpack"}[fmt]
+    if encoding:
+        suffix += "-" + encoding
+    return f"{digest}-{suffix}"
+
+
+def result_digest(payload):
+    """结果内容的摘要（与格式、压缩无关），结果不变时 ETag 不变"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def build_response(response_class, request, payload, months, digest=None):
+    """
+    按请求头生成 /analyze 的响应：协商格式与压缩，带 ETag；If-None-Match 命中时返回 304
+    :param response_class: flask.Response 或 quart.Response
+    :param payload: 原 JSON 格式的结果字典
+    :param months: 窗口内各月份（列式格式使用）
+    :param digest: 结果摘要，默认由 payload 计算
+    """
+    fmt = negotiate_format(request.accept_mimetypes)
+    if fmt is None:
+        body = json.dumps({"error": "Not acceptable", "formats": available_formats()})
+        return response_class(body, status=406, content_type=JSON_TYPE, headers={"Vary": VARY})
+
+    body = encode_body(payload, fmt, months)
+    encoding = negotiate_encoding(request.accept_encodings) if len(body) >= COMPRESS_MIN_SIZE else None
+    etag = make_etag(digest or result_digest(payload), fmt, encoding)
+    headers = {"ETag": f'"{etag}"', "Vary": VARY}
+
+    # /analyze 虽是 POST，但只读且结果只取决于请求参数，因此同样支持条件请求（If-None-Match 按弱比较）
+    if request.if_none_match.contains_weak(etag):
+        return response_class(b"", status=304, headers=headers)
+
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    content_type = fmt if fmt == MSGPACK_TYPE else fmt + "; charset=utf-8"
+    return response_class(body, status=200, content_type=content_type, headers=headers)
+
+
+def gzip_stream(chunks):
+    """
+    流式响应逐块 gzip 压缩（NDJSON 批量结果），每块之后立即刷出，客户端仍能逐行读取
+    :param chunks: 产生 str 的可迭代对象
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16 + MAX_WBITS：gzip 格式
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def agzip_stream(chunks):
+    """gzip_stream 的异步版本（Quart 的流式响应）"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,238 @@
+# potential_common.py cal_potential（线程版）与 async_potential（asyncio 版）共用的纯逻辑
+# 窗口与月份、缓存键、旧数据能否退回、下载结果 -> MetricFetchError、批量分析的逐仓库记账
+# 两个版本只在 I/O 层（线程池 / 事件循环、同步 / 异步客户端）不同；
+# 本模块导入时不创建客户端、指标仓库、缓存或线程池，api_common 等只需要这些函数的模块可直接导入
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from config import METRICS, MAX_WINDOW, OPENDIGGER_PUBLISH_DAY
+from potential_model import get_model
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.opendigger_client import MetricNotFoundError, UpstreamUnavailableError
+from common.warehouse import latest_published_month
+
+
+class MetricFetchError(Exception):
+    """部分指标拉取失败或超时，failed 记录 {metric: 失败原因}，causes 记录 {metric: 异常}（超时的没有）"""
+
+    def __init__(self, repo, failed, causes=None):
+        self.repo = repo
+        self.failed = failed
+        self.causes = causes or {}
+        detail = "; ".join(f"{m}: {reason}" for m, reason in failed.items())
+        super().__init__(f"{repo} 指标拉取失败（{len(failed)}/{len(METRICS)}）: {detail}")
+
+    @property
+    def status_code(self):
+        """
+        对应的 HTTP 状态码：失败的指标全部是 404 时为 404（仓库没有数据）；
+        有指标超时、连接失败或上游熔断时为 503（稍后重试即可）；其余为 502
+        """
+        causes = [self.causes.get(metric) for metric in self.failed]
+        if all(isinstance(c, MetricNotFoundError) for c in causes):
+            return 404
+        if any(c is None or isinstance(c, UpstreamUnavailableError) for c in causes):
+            return 503
+        return 502
+
+
+# =========================
+# 窗口与月份
+# =========================
+
+def default_as_of(now=None):
+    """
+    默认的数据截止月 "YYYY-MM"：OpenDigger 已发布的最新月份
+    每月 OPENDIGGER_PUBLISH_DAY 日之前上个月还没有数据，取上上个月，与 next_publish_time 的缓存过期时间一致
+    """
+    return latest_published_month(now, publish_day=OPENDIGGER_PUBLISH_DAY)
+
+
+def parse_month(month):
+    """校验 "YYYY-MM" 格式的月份，返回该月 1 日的 datetime"""
+    try:
+        return datetime.strptime(month, "%Y-%m")
+    except (TypeError, ValueError):
+        raise ValueError(f"as_of 格式应为 YYYY-MM: {month!r}")
+
+
+def last_n_months(n=6, as_of=None):
+    """
+    截止到 as_of（含）的连续 n 个月
+    :param as_of: "YYYY-MM"，默认为 OpenDigger 已发布的最新月份
+    """
+    end = parse_month(as_of or default_as_of())
+    months = []
+    for i in range(n):
+        m = end - relativedelta(months=n - 1 - i)
+        months.append(m.strftime("%Y-%m"))
+    return months
+
+
+def resolve_window(window=6, as_of=None):
+    """
+    校验并规范化分析窗口参数
+    :return: (window, as_of)，as_of 为 None 时取默认截止月
+    :raises ValueError: window 不在 2 ~ MAX_WINDOW 之间，或 as_of 格式错误 / 晚于默认截止月
+    """
+    if isinstance(window, bool) or not isinstance(window, int):
+        try:
+            window = int(window)
+        except (TypeError, ValueError):
+            raise ValueError(f"window 必须是整数: {window!r}")
+    if not 2 <= window <= MAX_WINDOW:
+        raise ValueError(f"window 必须在 2 到 {MAX_WINDOW} 之间")
+
+    latest = default_as_of()
+    if as_of is None:
+        return window, latest
+    as_of = parse_month(as_of).strftime("%Y-%m")
+    if as_of > latest:
+        raise ValueError(f"as_of 不能晚于 {latest}（OpenDigger 尚无该月数据）")
+    return window, as_of
+
+
+def next_publish_time(now=None):
+    """
+    下一次 OpenDigger 月度数据发布的时间戳
+    每月 OPENDIGGER_PUBLISH_DAY 日发布上月数据，缓存在此之前一直有效
+    """
+    now = now or datetime.now()
+    publish = now.replace(day=OPENDIGGER_PUBLISH_DAY, hour=0, minute=0, second=0, microsecond=0)
+    if now >= publish:
+        publish += relativedelta(months=1)
+    return publish.timestamp()
+
+
+# =========================
+# 缓存键
+# =========================
+
+def result_key(repo, window, as_of, model=None):
+    """结果缓存的键：(repo, 截止月, window, 模型摘要)，模型热加载后旧结果自然不再命中"""
+    return repo, as_of, window, (model or get_model()).digest
+
+
+def input_digest(repo, window, as_of, detailed_data):
+    """
+    分析结果的摘要，用作强 ETag：结果完全由输入序列和模型决定，二者不变则摘要不变
+    """
+    raw = json.dumps([repo, window, as_of, detailed_data, get_model().digest], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+# =========================
+# 指标下载结果
+# =========================
+
+def stale_usable(stale, need_month=None):
+    """
+    旧序列能否代替最新序列使用：必须包含 need_month（窗口的最后一个月）
+    缺少时不能退回，否则缺的月份会被补 0，算出（并缓存）错误的潜力值
+    """
+    return bool(stale) and (need_month is None or need_month in stale)
+
+
+def series_values(time_series, months):
+    """完整月度序列按窗口取值，缺失的月份为 0"""
+    return [float(time_series.get(m, 0)) for m in months]
+
+
+def collect_fetch_results(repo, futures, deadline):
+    """
+    等待结束（或超过 deadline）后汇总各指标的下载结果
+    :param futures: {metric: concurrent.futures.Future 或 asyncio.Task}，未完成的在这里取消并记为超时
+    :return: {metric: values}，顺序与 futures 一致
+    :raises MetricFetchError: 任一指标失败或超时，异常中包含全部失败指标
+    """
+    results = {}
+    failed = {}
+    causes = {}
+    for metric, future in futures.items():
+        if not future.done():
+            # 还没开始的直接取消；已在下载中的最多 FETCH_DEADLINE 秒后结束（客户端 total_timeout）
+            future.cancel()
+            failed[metric] = f"超过 {deadline}s 未完成"
+        elif future.exception() is not None:
+            failed[metric] = str(future.exception())
+            causes[metric] = future.exception()
+        else:
+            results[metric] = future.result()
+
+    if failed:
+        raise MetricFetchError(repo, failed, causes)
+    return results
+
+
+class BatchProgress:
+    """
+    批量分析的逐仓库记账：每个 (repo, metric) 下载对应一个 future / task，
+    记录每个仓库还差几个指标、已下载的值与失败原因；超过总时限时剩余指标全部记为失败
+    用法：add() 提交完全部下载后 start()，之后循环 wait(pending, timeout=time_left()) -> collect(done)
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.pending = {}      # future -> (repo, metric)
+        self._remaining = {}   # repo -> 未完成的指标数
+        self._partial = {}     # repo -> ({metric: values}, {metric: 失败原因}, {metric: 异常})
+        self._stop_at = None
+
+    def add(self, repo, futures):
+        """:param futures: {metric: future}，需包含 METRICS 中的全部指标"""
+        self._remaining[repo] = len(futures)
+        self._partial[repo] = ({}, {}, {})
+        for metric, future in futures.items():
+            self.pending[future] = (repo, metric)
+
+    def start(self):
+        """全部下载提交完后开始计时"""
+        self._stop_at = time.monotonic() + self.deadline
+
+    def time_left(self):
+        return max(0, self._stop_at - time.monotonic())
+
+    def collect(self, done):
+        """
+        处理一轮 wait 返回的已完成下载；done 为空表示超过总时限，剩余下载全部取消
+        :return: (errors [(repo, MetricFetchError)], succeeded [(repo, detailed_data)])，本轮全部指标都有结果的仓库
+        """
+        if not done:
+            for future, (repo, metric) in self.pending.items():
+                future.cancel()
+                self._partial[repo][1][metric] = f"超过 {self.deadline}s 未完成"
+                self._remaining[repo] = 0
+            done_repos = list(dict.fromkeys(repo for repo, _ in self.pending.values()))
+            self.pending.clear()
+        else:
+            done_repos = []
+            for future in done:
+                repo, metric = self.pending.pop(future)
+                if future.exception() is not None:
+                    self._partial[repo][1][metric] = str(future.exception())
+                    self._partial[repo][2][metric] = future.exception()
+                else:
+                    self._partial[repo][0][metric] = future.result()
+                self._remaining[repo] -= 1
+                if self._remaining[repo] == 0:
+                    done_repos.append(repo)
+
+        errors = []
+        succeeded = []
+        for repo in done_repos:
+            results, failed, causes = self._partial.pop(repo)
+            if failed:
+                errors.append((repo, MetricFetchError(repo, failed, causes)))
+            else:
+                succeeded.append((repo, {metric: results[metric] for metric in METRICS}))
+        return errors, succeeded
+
+    def cancel(self):
+        """调用方提前停止迭代（如客户端断开）时，取消尚未完成的下载"""
+        for future in self.pending:
+            future.cancel()
@@ -0,0 +1,155 @@
+# potential_model.py 潜力模型：启动时加载 modeling/train.py 输出的模型文件，文件更新后自动热加载
+# 模型文件包含权重、训练时的标准化参数（mean / std）、特征顺序与版本号，加载时预先折算成评分向量：
+#   score = Σ coef_i · feature_i + offset，coef = weight / std，offset = intercept - Σ weight · mean / std
+# 没有模型文件时退回 config.POTENTIAL_WEIGHTS（mean 0、std 1、intercept 0），结果与之前完全一致
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from config import POTENTIAL_WEIGHTS, MODEL_PATH, MODEL_RELOAD_INTERVAL
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.features import FEATURE_NAMES
+
+
+class PotentialModel:
+    """加载后不再修改；热加载时整体替换为新对象"""
+
+    def __init__(self, weights, mean=None, std=None, intercept=0.0, version="config",
+                 feature_variant="backend", source=None):
+        unknown = set(weights) - set(FEATURE_NAMES)
+        if unknown:
+            raise ValueError(f"模型包含未知特征: {sorted(unknown)}")
+
+        self.weights = dict(weights)
+        self.features = list(weights)
+        self.mean = np.asarray(mean if mean is not None else [0.0] * len(self.features), dtype=float)
+        self.std = np.asarray(std if std is not None else [1.0] * len(self.features), dtype=float)
+        self.intercept = float(intercept)
+        self.version = version
+        self.feature_variant = feature_variant
+        self.source = source
+
+        # 预先折算的评分向量，按模型自己的特征顺序
+        w = np.array([self.weights[name] for name in self.features], dtype=float)
+        self.index = np.array([FEATURE_NAMES.index(name) for name in self.features], dtype=int)
+        self.coef = w / self.std
+        self.offset = self.intercept - float(np.sum(w * self.mean / self.std))
+
+        # 模型内容的摘要：结果缓存、ETag、建议缓存都据此区分模型
+        raw = json.dumps([self.weights, self.mean.tolist(), self.std.tolist(), self.intercept, feature_variant],
+                         sort_keys=True)
+        self.digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_config(cls):
+        return cls(POTENTIAL_WEIGHTS)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        features = data["features"]
+        return cls(
+            {name: data["weights"][name] for name in features},
+            mean=data["scaler"]["mean"],
+            std=data["scaler"]["std"],
+            intercept=data.get("intercept", 0.0),
+            version=data["version"],
+            feature_variant=data.get("feature_variant", "backend"),
+            source=path
+        )
+
+    def score(self, features):
+        """
+        :param features: (..., len(FEATURE_NAMES)) 特征数组，列顺序为 FEATURE_NAMES
+        :return: (...) 模型输出
+        """
+        # 按特征逐列累加（而非矩阵乘法），保证加法顺序固定，退回 config 权重时与原公式逐位一致
+        result = np.zeros(features.shape[:-1])
+        for j, c in zip(self.index, self.coef):
+            result = result + c * features[..., j]
+        return result + self.offset if self.offset else result
+
+    def formula(self, digits=2):
+        """提示词中展示的公式，由当前模型生成，避免与实际权重不一致"""
+        text = "PotentialScore ="
+        for i, name in enumerate(self.features):
+            w = round(self.weights[name], digits)
+            if i == 0:
+                text += f" {w} * {name}"
+            else:
+                text += f" {'-' if w < 0 else '+'} {abs(w)} * {name}"
+        if self.source is not None:
+            text += "（各特征先按训练集的均值、标准差标准化）"
+        return text
+
+    def info(self):
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "source": self.source,
+            "features": self.features,
+            "feature_variant": self.feature_variant
+        }
+
+
+class ModelStore:
+    """
+    持有当前模型，每 check_interval 秒检查一次模型文件的修改时间，变化时重新加载
+    加载失败（文件写了一半、格式错误等）时保留当前模型
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=MODEL_RELOAD_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._model = PotentialModel.from_config()
+        self._reload()
+        if self._model.source is None:
+            print(f"⚠️ 未找到模型文件 {self.path}，使用 config.POTENTIAL_WEIGHTS；"
+                  f"请提交 models/potential_model.json 或在部署时运行 modeling/train.py")
+
+    def get(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._reload()
+        return self._model
+
+    def _reload(self):
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+
+        if mtime is None:
+            if self._model.source is not None:
+                print(f"⚠️ 模型文件 {self.path} 已删除，改用 config.POTENTIAL_WEIGHTS")
+            self._model = PotentialModel.from_config()
+            return
+        try:
+            self._model = PotentialModel.from_file(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"❌ 模型文件加载失败，继续使用 v{self._model.version}: {e}")
+            return
+        self.reloads += 1
+        print(f"✅ 已加载潜力模型 v{self._model.version}（{self.path}）")
+
+
+# 进程共享的模型
+store = ModelStore()
+
+
+def get_model():
+    return store.get()
@@ -1,6 +1,98 @@
-from openai import OpenAI
-from config import QWEN_API_KEY, QWEN_BASE_URL
-def call_qwen_model(prompt: str, system_prompt: str = "You are a helpful assistant.") -> str:
+import asyncio
+import threading
+import weakref
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+try:
+    import httpx
+except ImportError:  # 新版 openai SDK 改为依赖 httpx2
+    import httpx2 as httpx
+from config import (
+    QWEN_API_KEY, QWEN_BASE_URL, QWEN_MODEL, QWEN_TEMPERATURE, QWEN_MAX_TOKENS,
+    QWEN_TIMEOUT, QWEN_CONNECT_TIMEOUT, QWEN_MAX_RETRIES,
+    QWEN_MAX_CONNECTIONS, QWEN_MAX_CONCURRENCY
+)
+
+# =========================
+# 客户端（进程内复用，保持长连接）
+# =========================
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+
+_client = None
+_client_lock = threading.Lock()
+# 同时在途的模型调用上限，超出的调用排队等待
+_call_slots = threading.BoundedSemaphore(QWEN_MAX_CONCURRENCY)
+
+# 异步客户端的连接绑定在事件循环上，每个循环各建一个
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _http_timeout():
+    return httpx.Timeout(QWEN_TIMEOUT, connect=QWEN_CONNECT_TIMEOUT)
+
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=QWEN_MAX_CONNECTIONS,
+        max_keepalive_connections=QWEN_MAX_CONNECTIONS,
+        keepalive_expiry=60
+    )
+
+
+def get_client() -> OpenAI:
+    """
+    获取进程共享的千问客户端（适配 OpenAI 兼容模式）
+    连接池复用 TCP/TLS 连接；失败按指数退避自动重试 QWEN_MAX_RETRIES 次（SDK 内置，含随机抖动）
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key = QWEN_API_KEY,
+                    base_url = QWEN_BASE_URL,
+                    timeout = _http_timeout(),
+                    max_retries = QWEN_MAX_RETRIES,
+                    http_client = DefaultHttpxClient(limits=_http_limits(), timeout=_http_timeout()),
+                )
+    return _client
+
+
+def get_async_client():
+    """获取当前事件循环的异步客户端及并发信号量"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        client = AsyncOpenAI(
+            api_key = QWEN_API_KEY,
+            base_url = QWEN_BASE_URL,
+            timeout = _http_timeout(),
+            max_retries = QWEN_MAX_RETRIES,
+            http_client = DefaultAsyncHttpxClient(limits=_http_limits(), timeout=_http_timeout()),
+        )
+        entry = (client, asyncio.Semaphore(QWEN_MAX_CONCURRENCY))
+        _async_clients[loop] = entry
+    return entry
+
+
+def _chat_kwargs(prompt, system_prompt, **extra):
+    kwargs = dict(
+        model=QWEN_MODEL,  # 可替换为qwen-turbo/qwen-max等模型
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=QWEN_TEMPERATURE,  # 随机性，0-1之间
+        max_tokens=QWEN_MAX_TOKENS,  # 最大生成token数
+    )
+    kwargs.update(extra)
+    return kwargs
+
+# =========================
+# 同步调用
+# =========================
+
+def call_qwen_model(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
     """
     调用千问大模型API，返回模型回复内容
     :param prompt: 用户输入的提示词
@@ -8,22 +100,11 @@ def call_qwen_model(prompt: str, system_prompt: str = "You are a helpful assista
     :return: 模型的回复文本（失败返回空字符串）
     """
     try:
-        # 初始化OpenAI客户端（适配千问兼容模式）
-        client = OpenAI(
-            api_key = QWEN_API_KEY,
-            base_url = QWEN_BASE_URL,
-        )
-
-        # 调用聊天接口
-        completion = client.chat.completions.create(
-            model="qwen-turbo",  # 可替换为qwen-turbo/qwen-max等模型
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,  # 随机性，0-1之间
-            max_tokens=1024,  # 最大生成token数
-        )
+        with _call_slots:
+            # 调用聊天接口
+            completion = get_client().chat.completions.create(
+                **_chat_kwargs(prompt, system_prompt)
+            )
 
         # 提取并返回模型回复
         response_content = completion.choices[0].message.content
@@ -33,8 +114,62 @@ def call_qwen_model(prompt: str, system_prompt: str = "You are a helpful assista
         print(f"调用千问模型失败：{str(e)}")
         return ""
 
+
+def stream_qwen_model(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
+    """
+    流式调用千问大模型，逐段产出回复文本
+    :param prompt: 用户输入的提示词
+    :param system_prompt: 系统角色提示词，默认是通用助手
+    :return: 生成器，每次 yield 一段新增文本；失败时直接抛出异常，由调用方通知前端
+    """
+    with _call_slots:
+        stream = get_client().chat.completions.create(
+            **_chat_kwargs(prompt, system_prompt, stream=True)
+        )
+        with stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+# =========================
+# 异步调用（大量并发调用时不占用工作线程）
+# =========================
+
+async def acall_qwen_model(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
+    """call_qwen_model 的异步版本，失败返回空字符串"""
+    client, slots = get_async_client()
+    try:
+        async with slots:
+            completion = await client.chat.completions.create(
+                **_chat_kwargs(prompt, system_prompt)
+            )
+        return completion.choices[0].message.content
+
+    except Exception as e:
+        print(f"调用千问模型失败：{str(e)}")
+        return ""
+
+
+async def astream_qwen_model(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
+    """stream_qwen_model 的异步版本，异步生成器逐段产出回复文本"""
+    client, slots = get_async_client()
+    async with slots:
+        stream = await client.chat.completions.create(
+            **_chat_kwargs(prompt, system_prompt, stream=True)
+        )
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
 # 测试代码（可选，运行该文件时执行）
 if __name__ == "__main__":
     # 注意：测试前需先设置环境变量 export DASHSCOPE_API_KEY="sk-xxx"
     result = call_qwen_model("分析一下这个开源仓库的潜力：owner/repo")
-    print("千问模型回复：", result)
\ No newline at end of file
+    print("千问模型回复：", result)
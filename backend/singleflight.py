@@ -0,0 +1,103 @@
+# singleflight.py 相同 key 的并发调用合并为一次执行
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    同一时刻对同一 key 只执行一次 fn，其余并发调用方等待并共享结果（或异常）
+    执行结束后立即移除，不做结果缓存，缓存由调用方负责
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._inflight = {}  # key -> [Future, 等待者数量]
+        self._lock = threading.Lock()
+        self.calls = 0        # 总调用次数
+        self.executions = 0   # 实际执行 fn 的次数
+        self.coalesced = 0    # 被合并、等待他人结果的调用次数
+        self.max_waiters = 0  # 单个 key 上同时等待的最大调用方数量
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            entry = self._inflight.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, entry[1])
+                future = entry[0]
+            else:
+                future = Future()
+                self._inflight[key] = [future, 0]
+                self.executions += 1
+
+        if entry is not None:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "inflight": len(self._inflight),
+                "waiting": sum(entry[1] for entry in self._inflight.values()),
+                "max_waiters": self.max_waiters
+            }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight 的 asyncio 版本：同一 key 的并发协程共享同一个任务
+    任务用 shield 保护，某个调用方被取消（如客户端断开）不会影响其他等待者
+    只在单个事件循环内使用
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._inflight = {}  # key -> [Task, 等待者数量]
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """fn 为协程函数"""
+        self.calls += 1
+        entry = self._inflight.get(key)
+        if entry is not None:
+            entry[1] += 1
+            self.coalesced += 1
+            self.max_waiters = max(self.max_waiters, entry[1])
+        else:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            entry = self._inflight[key] = [task, 0]
+            self.executions += 1
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(entry[0])
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "waiting": sum(entry[1] for entry in self._inflight.values()),
+            "max_waiters": self.max_waiters
+        }
@@ -0,0 +1,75 @@
+# suggestion_cache.py AI 建议缓存：相同的提示词输入 + 模型参数直接复用上次的回复
+import hashlib
+import json
+import time
+from cache import TTLCache
+from potential_common import next_publish_time
+from config import (
+    QWEN_MODEL, QWEN_TEMPERATURE, QWEN_MAX_TOKENS,
+    SUGGESTION_CACHE_SIZE, SUGGESTION_CACHE_TTL, SUGGESTION_CACHE_DIR
+)
+from qwen_api import DEFAULT_SYSTEM_PROMPT
+
+suggestion_cache = TTLCache(
+    maxsize=SUGGESTION_CACHE_SIZE,
+    disk_dir=SUGGESTION_CACHE_DIR,
+    name="suggestion"
+)
+
+# 前端要求强制重新生成（refresh=true）的次数
+bypass_count = 0
+
+
+def _normalize(value):
+    """浮点数统一保留 6 位小数，避免同一份数据因计算误差得到不同的 key"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def suggestion_key(prompt_version, repo, potential, detailed_data, averaged_data,
+                   system_prompt=DEFAULT_SYSTEM_PROMPT):
+    """
+    计算建议缓存的 key：规范化后的提示词输入 + 模型参数的 sha256
+    :param prompt_version: 提示词模板版本，模板修改后旧缓存自动失效
+    """
+    payload = {
+        "prompt_version": prompt_version,
+        "repo": repo,
+        "potential": _normalize(potential),
+        "detailed_data": _normalize(detailed_data),
+        "averaged_data": _normalize(averaged_data),
+        "model": QWEN_MODEL,
+        "temperature": QWEN_TEMPERATURE,
+        "max_tokens": QWEN_MAX_TOKENS,
+        "system_prompt": system_prompt
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_suggestion(key, refresh=False):
+    """读取缓存的建议；refresh=True 时跳过缓存（计入 bypass 次数）"""
+    global bypass_count
+    if refresh:
+        bypass_count += 1
+        return None
+    return suggestion_cache.get(key)
+
+
+def save_suggestion(key, suggestion):
+    """写入建议缓存，空回复（调用失败）不缓存"""
+    if not suggestion:
+        return
+    expires_at = min(time.time() + SUGGESTION_CACHE_TTL, next_publish_time())
+    suggestion_cache.set(key, suggestion, expires_at)
+
+
+def stats():
+    result = suggestion_cache.stats()
+    result["bypass"] = bypass_count
+    return result
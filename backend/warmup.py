@@ -0,0 +1,197 @@
+# warmup.py 后台预热：定期发现热门仓库，提前把指标序列和潜力值算进缓存
+# - 每 WARMUP_INTERVAL 秒重新爬取 GitHub Trending（可选再加 Search API）
+# - OpenDigger 发布新月份数据后（缓存随之过期）立即对同一批仓库重算
+# - 多进程部署时用 data/warmup.lock 保证只有一个进程在跑，结果经磁盘缓存共享
+#
+# 单独执行一轮预热：
+#   cd backend && python warmup.py
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from config import (
+    HEADERS, REQUEST_TIMEOUT, REQUEST_DELAY,
+    WARMUP_INTERVAL, WARMUP_MAX_REPOS, WARMUP_SEARCH_COUNT, WARMUP_SEARCH_QUERIES, WARMUP_TRENDING_URLS
+)
+from cal_potential import iter_repo_potentials, result_cache
+from potential_common import result_key, default_as_of, next_publish_time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import github_discovery
+
+try:
+    import fcntl
+except ImportError:  # Windows 上不做跨进程互斥
+    fcntl = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+LOCK_PATH = os.path.join(DATA_DIR, "warmup.lock")
+# 最近一轮预热的仓库列表，所有 worker 进程的 /trending 都从这里读取
+REPOS_PATH = os.path.join(DATA_DIR, "warmup_repos.json")
+
+# 发布时刻之后再等一会儿，给 OpenDigger 留出更新时间
+PUBLISH_DELAY = 600
+
+# 预热使用的分析窗口（与前端默认请求一致）
+WARMUP_WINDOW = 6
+
+
+class WarmupScheduler:
+    """后台预热线程，start() 启动、stop() 停止；同一时刻全机只有一个进程真正在跑"""
+
+    def __init__(self, interval=WARMUP_INTERVAL, max_repos=WARMUP_MAX_REPOS):
+        self.interval = interval
+        self.max_repos = max_repos
+        self.repos = []          # 最近一轮预热的仓库（按发现顺序）
+        self.rounds = 0
+        self.last_run = None     # 最近一轮完成的时间戳
+        self.last_warmed = 0
+        self.last_failed = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    # ---------- 单轮预热 ----------
+
+    def discover(self):
+        """发现热门仓库：Trending 页面 + 可选的 Search API，去重后最多 max_repos 个"""
+        repos = github_discovery.get_trending_repos(
+            WARMUP_TRENDING_URLS,
+            headers=HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            delay=REQUEST_DELAY
+        )
+        if WARMUP_SEARCH_COUNT:
+            since = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+            queries = [f"{q} pushed:>={since}" for q in WARMUP_SEARCH_QUERIES]
+            try:
+                repos += github_discovery.search_repos(
+                    WARMUP_SEARCH_COUNT, queries,
+                    headers=HEADERS, timeout=REQUEST_TIMEOUT, delay=REQUEST_DELAY
+                )
+            except Exception as e:
+                print(f"❌ GitHub Search API 调用失败: {e}")
+        return list(dict.fromkeys(repos))[:self.max_repos]
+
+    def warm(self, repos):
+        """批量计算并写入缓存（已缓存的仓库直接跳过）"""
+        warmed = failed = 0
+        for repo, result, error in iter_repo_potentials(repos, WARMUP_WINDOW):
+            if error is None:
+                warmed += 1
+            else:
+                failed += 1
+        self.last_warmed, self.last_failed = warmed, failed
+        print(f"🔥 预热完成：{warmed} 个仓库已缓存，{failed} 个失败")
+
+    def run_once(self, rediscover=True):
+        if rediscover or not self.repos:
+            found = self.discover()
+            if found:
+                self.repos = found
+                _save_repos(found)
+        if self.repos:
+            self.warm(self.repos)
+        self.rounds += 1
+        self.last_run = time.time()
+
+    # ---------- 后台线程 ----------
+
+    def _acquire_lock(self):
+        if fcntl is None:
+            return True
+        os.makedirs(DATA_DIR, exist_ok=True)
+        lock_file = open(LOCK_PATH, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # 进程退出时自动释放
+        return True
+
+    def _loop(self):
+        next_discover = 0
+        while not self._stop.is_set():
+            now = time.time()
+            rediscover = now >= next_discover
+            try:
+                self.run_once(rediscover)
+            except Exception as e:
+                print(f"❌ 预热失败: {e}")
+            if rediscover:
+                next_discover = now + self.interval
+            # 下次醒来：到了重新发现的时间，或 OpenDigger 发布了新月份数据
+            wake = min(next_discover, next_publish_time() + PUBLISH_DELAY)
+            self._stop.wait(max(60, wake - time.time()))
+
+    def start(self):
+        """启动后台预热；其他进程已在预热时返回 False"""
+        if self._thread is not None:
+            return True
+        if not self._acquire_lock():
+            print("ℹ️ 其他进程正在预热，本进程跳过")
+            return False
+        self._thread = threading.Thread(target=self._loop, name="warmup", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "rounds": self.rounds,
+            "repos": len(self.repos),
+            "last_run": self.last_run,
+            "last_warmed": self.last_warmed,
+            "last_failed": self.last_failed
+        }
+
+
+def _save_repos(repos):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"updated_at": time.time(), "repos": repos}, f, ensure_ascii=False)
+    os.replace(tmp_path, REPOS_PATH)
+
+
+def trending(top_k=None):
+    """
+    已预热仓库按最新潜力值降序排列，只读缓存、不触发计算（未命中的仓库跳过）
+    :return: {"as_of", "updated_at", "repos": [{"repo", "potential", "averaged_data"}]}
+    """
+    try:
+        with open(REPOS_PATH, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        snapshot = {"updated_at": None, "repos": []}
+
+    as_of = default_as_of()
+    ranked = []
+    for repo in snapshot["repos"]:
+        # 用 peek 读取，排行页的访问不计入结果缓存的命中率
+        result = result_cache.peek(result_key(repo, WARMUP_WINDOW, as_of))
+        if result is not None:
+            _, averaged_data, potential = result
+            ranked.append({"repo": repo, "potential": potential, "averaged_data": averaged_data})
+    ranked.sort(key=lambda item: item["potential"][-1], reverse=True)
+    return {"as_of": as_of, "updated_at": snapshot["updated_at"], "repos": ranked[:top_k]}
+
+
+# 进程共享的调度器
+scheduler = WarmupScheduler()
+
+
+if __name__ == "__main__":
+    scheduler.run_once()
@@ -0,0 +1,6 @@
+# wsgi.py 生产环境入口
+# 在 backend 目录下启动（配置见 gunicorn.conf.py）：
+#   gunicorn -c gunicorn.conf.py wsgi:app
+from app import app
+
+application = app
@@ -0,0 +1 @@
+# common 后端（backend）与建模脚本（modeling）共用的模块
@@ -0,0 +1,279 @@
+# features.py 趋势 / 跃迁特征的向量化计算（NumPy）
+# backend/cal_potential 与 modeling/1cal_metrics 共用，一次计算 N 个仓库
+#
+# 输入为 (仓库数 N, 指标数 M, 月份数 T) 的数组，缺失月份用 NaN 表示，
+# 每个指标取第一个、最后一个非 NaN 值作为区间首尾，有效值少于 2 个时特征为 0。
+#
+# 两种口径（variant）与原实现的对应关系：
+#
+#   特征                         "backend"（原 cal_potential）      "modeling"（原 1cal_metrics）
+#   *_trend                      (last-first)/(|first|+1e-6)        first==0 时为 0，否则 (last-first)/|first|，保留 4 位小数
+#   *_jump                       last > first                       first <= 1 且 last > 1
+#   issue_response_time_trend    上面 trend 取负                     上面 trend 取负
+#
+# 保留小数统一用 round_like_python，结果与内置 round() 逐位一致；
+# 单独用 np.round 时，先乘 10^n 再取整，在接近 .5 的值上可能差最后一位。
+# jump 以 0/1 浮点数返回，features_to_dict 会还原为 int。
+#
+# 基准测试（10 万仓库）：
+#   python -m common.features --repos 100000
+import argparse
+import time
+
+import numpy as np
+
+EPSILON = 1e-6
+
+# 特征名 -> (所用指标, 类型, 符号)
+FEATURE_SPECS = {
+    "activity_trend": ("activity", "trend", 1),
+    "participants_trend": ("participants", "trend", 1),
+    "contributors_jump": ("contributors", "jump", 1),
+    "bus_factor_jump": ("bus_factor", "jump", 1),
+    "issue_response_time_trend": ("issue_response_time", "trend", -1),
+    "openrank_trend": ("openrank", "trend", 1),
+}
+
+FEATURE_NAMES = list(FEATURE_SPECS)
+
+# modeling 口径 jump 的阈值
+JUMP_THRESHOLD = 1
+
+
+_py_round = np.frompyfunc(round, 2, 1)
+
+
+def round_like_python(values, ndigits):
+    """
+    与内置 round() 结果完全一致的向量化保留小数
+    np.round 只在 x·10^n 接近 .5 时可能与 round() 不同，这些元素单独用 round() 重算
+    """
+    values = np.array(values, dtype=np.float64, ndmin=1)
+    result = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    with np.errstate(invalid="ignore"):
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    if near_tie.any():
+        result[near_tie] = _py_round(values[near_tie], ndigits).astype(np.float64)
+    return result
+
+
+def series_to_array(repo_series, metrics, months=None, fill=np.nan):
+    """
+    把逐仓库的月度数据整理成 (N, M, T) 数组
+    :param repo_series: [{metric: {month: value}}]，每个仓库一个 dict
+    :param metrics: 指标顺序（数组第 2 维）
+    :param months: 指定月份轴时按月份对齐，缺失填 fill；为 None 时按各序列自身顺序左对齐，末尾补 NaN
+    """
+    n, m = len(repo_series), len(metrics)
+    if months is not None:
+        values = np.full((n, m, len(months)), fill, dtype=np.float64)
+        for i, series in enumerate(repo_series):
+            for j, metric in enumerate(metrics):
+                ts = series.get(metric, {})
+                for k, month in enumerate(months):
+                    if month in ts:
+                        values[i, j, k] = ts[month]
+        return values
+
+    t = max((len(series.get(metric, {})) for series in repo_series for metric in metrics), default=0)
+    values = np.full((n, m, t), np.nan, dtype=np.float64)
+    for i, series in enumerate(repo_series):
+        for j, metric in enumerate(metrics):
+            row = list(series.get(metric, {}).values())
+            values[i, j, :len(row)] = row
+    return values
+
+
+def endpoints(values):
+    """
+    每个 (仓库, 指标) 的首个、末个有效值及有效值个数
+    :param values: (..., T) 数组，NaN 为缺失
+    :return: first, last, count，形状均为 (...)
+    """
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=-1)
+    t = values.shape[-1]
+    if t == 0:
+        empty = np.zeros(values.shape[:-1])
+        return empty, empty, count
+    first_idx = valid.argmax(axis=-1)
+    last_idx = t - 1 - valid[..., ::-1].argmax(axis=-1)
+    first = np.take_along_axis(values, first_idx[..., None], axis=-1)[..., 0]
+    last = np.take_along_axis(values, last_idx[..., None], axis=-1)[..., 0]
+    return first, last, count
+
+
+def trend(first, last, count, variant="backend"):
+    """首尾相对变化率，有效值少于 2 个时为 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if variant == "backend":
+            result = (last - first) / (np.abs(first) + EPSILON)
+        elif variant == "modeling":
+            result = np.where(first == 0, 0.0, (last - first) / np.abs(first))
+            result = round_like_python(result, 4)
+        else:
+            raise ValueError(f"未知的特征口径: {variant}")
+    return np.where(count >= 2, result, 0.0)
+
+
+def jump(first, last, count, variant="backend"):
+    """首尾跃迁（0/1），有效值少于 2 个时为 0"""
+    if variant == "backend":
+        result = last > first
+    elif variant == "modeling":
+        result = (first <= JUMP_THRESHOLD) & (last > JUMP_THRESHOLD)
+    else:
+        raise ValueError(f"未知的特征口径: {variant}")
+    return np.where(count >= 2, result, False).astype(np.float64)
+
+
+def prefix_endpoints(values):
+    """
+    每个前缀 values[..., :L]（L = 1..T）的首个、末个有效值及有效值个数，一次算完
+    :param values: (..., T) 数组，NaN 为缺失
+    :return: first, last, count，形状均为 (..., T)，最后一维第 L-1 项对应长度为 L 的前缀
+    """
+    valid = ~np.isnan(values)
+    t = values.shape[-1]
+    count = np.cumsum(valid, axis=-1)
+    if t == 0:
+        return np.zeros(values.shape), np.zeros(values.shape), count
+
+    # 前缀的末个有效值：有效位置下标做前向累计最大值
+    idx = np.where(valid, np.arange(t), 0)
+    last_idx = np.maximum.accumulate(idx, axis=-1)
+    last = np.take_along_axis(values, last_idx, axis=-1)
+
+    # 前缀的首个有效值就是整条序列的首个有效值（前缀内尚无有效值时 count 为 0，结果不会被使用）
+    first_idx = valid.argmax(axis=-1)
+    first = np.take_along_axis(values, first_idx[..., None], axis=-1)
+    first = np.broadcast_to(first, values.shape)
+    return first, last, count
+
+
+def _features_from_endpoints(first, last, count, metrics, variant, feature_names):
+    # first/last/count 的第 2 维为指标，结果把特征放在最后一维
+    index = {metric: j for j, metric in enumerate(metrics)}
+    columns = []
+    for name in feature_names:
+        metric, kind, sign = FEATURE_SPECS[name]
+        j = index[metric]
+        func = trend if kind == "trend" else jump
+        columns.append(sign * func(first[:, j], last[:, j], count[:, j], variant))
+    if not columns:
+        return np.zeros(first.shape[:1] + first.shape[2:] + (0,))
+    return np.stack(columns, axis=-1)
+
+
+def compute_features(values, metrics, variant="backend", feature_names=FEATURE_NAMES):
+    """
+    一次计算 N 个仓库的全部特征
+    :param values: (N, M, T) 数组，第 2 维顺序与 metrics 一致，NaN 为缺失
+    :param metrics: 指标顺序
+    :param variant: "backend" 或 "modeling"，见文件头说明
+    :return: (N, len(feature_names)) 数组，列顺序与 feature_names 一致
+    """
+    values = np.asarray(values, dtype=np.float64)
+    first, last, count = endpoints(values)
+    return _features_from_endpoints(first, last, count, metrics, variant, feature_names)
+
+
+def compute_prefix_features(values, metrics, variant="backend", feature_names=FEATURE_NAMES):
+    """
+    计算每个前缀窗口（前 1..T 个月）的特征，等价于对每个 L 调用 compute_features(values[..., :L])，
+    但总计算量为 O(N·M·T)，适合 24~60 个月的长窗口历史曲线
+    :return: (N, T, len(feature_names)) 数组，[:, L-1] 为前 L 个月的特征
+    """
+    values = np.asarray(values, dtype=np.float64)
+    first, last, count = prefix_endpoints(values)
+    return _features_from_endpoints(first, last, count, metrics, variant, feature_names)
+
+
+def features_to_dict(row, feature_names=FEATURE_NAMES):
+    """把一行特征转回 {feature: value}，jump 类特征还原为 int，与原实现的 JSON 输出一致"""
+    result = {}
+    for name, value in zip(feature_names, row):
+        if FEATURE_SPECS[name][1] == "jump":
+            result[name] = int(value)
+        else:
+            result[name] = float(value)
+    return result
+
+
+# =========================
+# 基准测试 & 一致性校验
+# =========================
+
+def _reference_features(series, variant):
+    """逐仓库的原始 Python 实现（cal_potential / 1cal_metrics），仅用于校验"""
+    def calc_trend(values):
+        if len(values) < 2:
+            return 0.0
+        if variant == "backend":
+            return (values[-1] - values[0]) / (abs(values[0]) + EPSILON)
+        if values[0] == 0:
+            return 0.0
+        return round((values[-1] - values[0]) / abs(values[0]), 4)
+
+    def calc_jump(values):
+        if len(values) < 2:
+            return 0
+        if variant == "backend":
+            return int(values[-1] > values[0])
+        return int(values[0] <= JUMP_THRESHOLD and values[-1] > JUMP_THRESHOLD)
+
+    result = {}
+    for name, (metric, kind, sign) in FEATURE_SPECS.items():
+        values = series[metric]
+        result[name] = sign * (calc_trend(values) if kind == "trend" else calc_jump(values))
+    return result
+
+
+def benchmark(n_repos=100000, n_months=6, check=2000, seed=0):
+    metrics = [spec[0] for spec in FEATURE_SPECS.values()]
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(1.5, 3.0, size=(n_repos, len(metrics), n_months)).round(2)
+    values[rng.random(values.shape) < 0.05] = 0.0
+
+    for variant in ("backend", "modeling"):
+        start = time.perf_counter()
+        features = compute_features(values, metrics, variant)
+        vector_time = time.perf_counter() - start
+
+        sample = values[:check]
+        start = time.perf_counter()
+        reference = [
+            _reference_features({m: sample[i, j].tolist() for j, m in enumerate(metrics)}, variant)
+            for i in range(len(sample))
+        ]
+        loop_time = (time.perf_counter() - start) * n_repos / len(sample)
+
+        expected = np.array([[r[name] for name in FEATURE_NAMES] for r in reference])
+        max_diff = np.abs(features[:check] - expected).max()
+        print(
+            f"[{variant:8s}] {n_repos} 个仓库：向量化 {vector_time * 1000:.1f} ms，"
+            f"逐仓库循环（按 {len(sample)} 个外推）{loop_time * 1000:.1f} ms，"
+            f"加速 {loop_time / vector_time:.0f}x，最大偏差 {max_diff:.2e}"
+        )
+
+    # 历史曲线：60 个月窗口的逐前缀特征，一次计算 vs 每个前缀重算
+    history = rng.gamma(1.5, 3.0, size=(min(n_repos, 10000), len(metrics), 60)).round(2)
+    start = time.perf_counter()
+    prefix = compute_prefix_features(history, metrics)
+    prefix_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sliced = np.stack([compute_features(history[..., :L], metrics) for L in range(1, 61)], axis=1)
+    sliced_time = time.perf_counter() - start
+    print(
+        f"[history ] {len(history)} 个仓库 × 60 个月：逐前缀一次计算 {prefix_time * 1000:.1f} ms，"
+        f"每个前缀重算 {sliced_time * 1000:.1f} ms，结果一致: {np.array_equal(prefix, sliced)}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="特征计算基准测试")
+    parser.add_argument("--repos", type=int, default=100000)
+    parser.add_argument("--months", type=int, default=6)
+    args = parser.parse_args()
+    benchmark(args.repos, args.months)
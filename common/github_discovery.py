@@ -0,0 +1,89 @@
+# github_discovery.py 发现热门 GitHub 仓库（Trending 页面 + Search API）
+# modeling/github_api.py（构建数据集）与 backend/warmup.py（后台预热）共用
+# 请求头、超时等由调用方传入，这里不依赖 backend / modeling 各自的 config
+import random
+import time
+from typing import List
+
+import requests
+
+GITHUB_TRENDING_URL = "https://github.com/trending"
+GITHUB_SEARCH_API = "https://api.github.com/search/repositories"
+
+
+def get_trending_repos(urls, headers=None, timeout=20, delay=1, jitter=5) -> List[str]:
+    """
+    爬取 GitHub Trending（或搜索结果）页面的仓库地址
+    :param urls: 页面地址列表，trending 页面取前 30 个，其余页面取前 10 个
+    :param delay: 每个页面请求前的等待秒数，另加 0 ~ jitter 秒随机延时防止限流
+    :return: ["owner/repo", ...]，单个页面失败时跳过
+    """
+    from bs4 import BeautifulSoup  # 只有爬取页面时才需要
+
+    repo_list = []
+    for github_url in urls:
+        time.sleep(delay + random.uniform(0, jitter))
+        try:
+            response = requests.get(url=github_url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+
+            soup = BeautifulSoup(response.text, "html.parser")
+            repo_items = soup.select("article.Box-row")  # 匹配仓库卡片
+
+            num = 0
+            max_repos = 30 if "trending" in github_url else 10
+            for item in repo_items:
+                repo_a_tag = item.select_one("h2 a")
+                if repo_a_tag and num < max_repos:
+                    # 清洗地址：/owner/repo → owner/repo
+                    repo_list.append(repo_a_tag.get("href").strip("/"))
+                    num += 1
+
+            print(f"✅ 成功爬取到 {len(repo_list)} 个Trending仓库地址")
+
+        except Exception as e:
+            print(f"❌ 爬取GitHub失败: {github_url} {str(e)}")
+            continue
+
+    return repo_list
+
+
+def search_repos(n: int, queries, headers=None, timeout=20, delay=1, api=GITHUB_SEARCH_API) -> List[str]:
+    """
+    使用 GitHub Search API 按 star 数降序获取前 n 个仓库，n 平均分给各个查询条件
+    :return: ["owner/repo", ...]
+    """
+    repos = []
+    per_page = 100  # GitHub API 最大值
+    per_query_limit = n // len(queries)
+
+    for query in queries:
+        page = 1
+        query_repos = 0  # 该 query 已获取的仓库数量
+        while len(repos) < n and query_repos < per_query_limit:
+            params = {
+                "q": query,
+                "sort": "stars",
+                "order": "desc",
+                "per_page": per_page,
+                "page": page
+            }
+
+            time.sleep(delay)  # 控制请求频率
+
+            resp = requests.get(api, headers=headers, params=params, timeout=timeout)
+            resp.raise_for_status()
+
+            items = resp.json().get("items", [])
+            if not items:
+                break  # 没有更多结果了
+
+            for repo in items:
+                repos.append(repo["full_name"])
+                query_repos += 1
+                if len(repos) >= n or query_repos >= per_query_limit:
+                    break
+
+            page += 1
+
+    return repos
@@ -0,0 +1,466 @@
+# opendigger_client.py OpenDigger 指标接口的共享客户端
+# backend/cal_potential、modeling 下各脚本统一通过这里访问 oss.open-digger.cn
+# AsyncOpenDiggerClient 供 asyncio 服务（backend/async_app.py）使用，需要 httpx
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+try:
+    import httpx
+except ImportError:
+    try:
+        import httpx2 as httpx  # 新版 openai SDK 依赖的 httpx 分支，接口相同
+    except ImportError:  # 只用同步客户端时不需要
+        httpx = None
+
+# =========================
+# 默认配置
+# =========================
+
+BASE_URL = "https://oss.open-digger.cn/github"
+
+DEFAULT_TIMEOUT = 15
+
+# 需要退避重试的状态码，重试后仍失败计入熔断
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; OpenDigger-Analyzer/1.0)",
+    # 安装了 brotli 时 urllib3 会自动加上 br
+    **urllib3.util.make_headers(accept_encoding=True, keep_alive=True)
+}
+
+
+class OpenDiggerError(Exception):
+    """OpenDigger 请求失败或返回格式不正确"""
+
+
+class MetricNotFoundError(OpenDiggerError):
+    """仓库没有该指标的数据（HTTP 404）"""
+
+
+class UpstreamUnavailableError(OpenDiggerError):
+    """OpenDigger 暂时不可用（稍后重试即可）：熔断器打开期间直接拒绝请求"""
+
+
+class UpstreamConnectionError(UpstreamUnavailableError):
+    """超时或连接失败，重试次数或总时限用完后仍未成功"""
+
+
+def is_month_key(key) -> bool:
+    """OpenDigger 月度数据的 key 形如 "2025-06"，另有 "2025"、"2025Q2" 等汇总 key"""
+    return isinstance(key, str) and len(key) == 7 and "-" in key
+
+
+def parse_series(repo_full_name: str, metric: str, data) -> Dict[str, float]:
+    """
+    从指标原始 JSON 中取出月度时间序列 {"YYYY-MM": value}
+    有 avg 字段（如 issue_response_time）时取 avg，并去掉年度/季度汇总 key
+    """
+    if not isinstance(data, dict):
+        raise OpenDiggerError(f"{repo_full_name}/{metric} 数据格式不正确")
+
+    time_data = data.get("avg", data)
+    if not isinstance(time_data, dict):
+        raise OpenDiggerError(f"{repo_full_name}/{metric} 数据格式不正确")
+
+    return {k: v for k, v in time_data.items() if is_month_key(k)}
+
+
+class CircuitBreaker:
+    """
+    单个 host 的熔断器
+    - 连续 failure_threshold 次失败（网络错误、重试后仍为 429/5xx）后打开，reset_timeout 秒内直接拒绝请求
+    - 到期后放行一个试探请求（半开）：成功则关闭，失败则重新打开
+    - 404 等正常应答算作成功，说明上游可用
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"   # closed / open / half_open
+        self.failures = 0       # 连续失败次数
+        self.opened_at = 0.0    # 打开（或开始试探）的时间
+        self.opens = 0          # 累计打开次数
+        self.rejected = 0       # 被直接拒绝的请求数
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            # 打开状态到期，或上一个试探请求迟迟没有结果（如被取消），放行一个新的试探请求
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opens": self.opens,
+                "rejected": self.rejected
+            }
+
+
+def _check_response(breaker, repo_full_name, metric, status_code):
+    """按状态码更新熔断器并抛出对应异常（同步、异步客户端共用）"""
+    if status_code in RETRY_STATUS:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+    if status_code == 404:
+        raise MetricNotFoundError(f"{repo_full_name}/{metric} 无数据 (404)")
+    if status_code != 200:
+        raise OpenDiggerError(f"{repo_full_name}/{metric} 请求失败，状态码：{status_code}")
+
+
+def _parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _BreakerMixin:
+    """
+    按 host 维护熔断器，并向 on_response 回调上报每次请求的耗时与字节数；
+    同步、异步客户端共用的重试规则（退避时间、单次超时与总时限）
+    """
+
+    def _init_breakers(self, failure_threshold, reset_timeout):
+        self.breaker_threshold = failure_threshold
+        self.breaker_reset = reset_timeout
+        self._breakers = {}
+        self._breaker_lock = threading.Lock()
+
+    def _breaker(self, url) -> CircuitBreaker:
+        host = urlparse(url).netloc
+        with self._breaker_lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    def _admit(self, url):
+        """熔断器打开时直接抛出 UpstreamUnavailableError，不发请求"""
+        breaker = self._breaker(url)
+        if not breaker.allow():
+            raise UpstreamUnavailableError(
+                f"{urlparse(url).netloc} 连续请求失败，熔断中（{self.breaker_reset}s 后重试）"
+            )
+        return breaker
+
+    def _report(self, status_code, elapsed, nbytes, decode_seconds=0.0):
+        """调用 on_response(status_code, 耗时秒, 响应字节数, JSON 解析秒) 回调，status_code 为 0 表示网络错误"""
+        if self.on_response is None:
+            return
+        try:
+            self.on_response(status_code, elapsed, nbytes, decode_seconds)
+        except Exception as e:
+            print(f"⚠️ on_response 回调失败: {e}")
+
+    def _decode(self, breaker, repo_full_name, metric, resp, elapsed):
+        """检查状态码并解析 JSON（同步、异步响应对象接口相同），同时上报耗时"""
+        if resp.status_code != 200:
+            self._report(resp.status_code, elapsed, len(resp.content))
+        _check_response(breaker, repo_full_name, metric, resp.status_code)
+
+        decode_start = time.perf_counter()
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise OpenDiggerError(f"{repo_full_name}/{metric} JSON 解析失败: {e}") from e
+        finally:
+            self._report(200, elapsed, len(resp.content), time.perf_counter() - decode_start)
+
+    def _init_retry(self, timeout, max_retries, backoff_factor, backoff_jitter, total_timeout):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.total_timeout = total_timeout
+
+    def _backoff(self, attempt, retry_after=None):
+        """
+        第 attempt 次重试（从 0 开始）前的等待秒数，与 urllib3 Retry.get_backoff_time 一致：
+        连续失败 n = attempt + 1 次，n 为 1 时立即重试，之后为 backoff_factor * 2^(n-1) + 随机抖动，
+        不超过 Retry.DEFAULT_BACKOFF_MAX；响应带 Retry-After（秒数或 HTTP 日期）时以它为准
+        """
+        seconds = _parse_retry_after(retry_after)
+        if seconds is not None:
+            return seconds
+        if attempt == 0:
+            return 0.0
+        backoff = self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_jitter)
+        return min(Retry.DEFAULT_BACKOFF_MAX, backoff)
+
+    def _deadline(self):
+        """本次下载（含全部重试与退避）的截止时间，total_timeout 为 None 时不限"""
+        return None if self.total_timeout is None else time.monotonic() + self.total_timeout
+
+    def _attempt_timeout(self, timeout, deadline):
+        """单次请求的超时：不超过剩余的总时限"""
+        timeout = timeout or self.timeout
+        if deadline is None:
+            return timeout
+        return max(0.001, min(timeout, deadline - time.monotonic()))
+
+    def _retry_delay(self, attempt, deadline, resp=None):
+        """
+        第 attempt 次重试前应等待的秒数；重试次数用完，或等待后已到总时限时返回 None（不再重试）
+        :param resp: 可重试状态码的响应（网络错误时为 None）；urllib3 只对 413 / 429 / 503 遵守 Retry-After
+        """
+        if attempt >= self.max_retries:
+            return None
+        retry_after = None
+        if resp is not None and resp.status_code in Retry.RETRY_AFTER_STATUS_CODES:
+            retry_after = resp.headers.get("Retry-After")
+        delay = self._backoff(attempt, retry_after)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _connection_error(self, breaker, repo_full_name, metric, start, e):
+        """重试后仍超时 / 连接失败：计入熔断并上报，返回要抛出的 UpstreamConnectionError"""
+        breaker.record_failure()
+        self._report(0, time.perf_counter() - start, 0)
+        return UpstreamConnectionError(f"{repo_full_name}/{metric} 请求失败: {e}")
+
+    def breaker_stats(self):
+        with self._breaker_lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.stats() for host, breaker in breakers.items()}
+
+
+class OpenDiggerClient(_BreakerMixin):
+    """
+    带连接池的 OpenDigger 客户端
+    - 同一 Session 复用 TCP/TLS 长连接，gzip/deflate（及 brotli）自动解压
+    - 429/5xx/超时/连接错误按指数退避 + 随机抖动自动重试（规则同 urllib3 Retry），404 不重试
+    - total_timeout 限制一次下载（含全部重试与退避）的总耗时，超出后不再重试，避免长时间占用线程
+    - 重试后仍超时或连接失败时抛出 UpstreamConnectionError（UpstreamUnavailableError 的子类）
+    - 每个 host 同时在途的请求数不超过 per_host_limit
+    - 每个 host 一个熔断器，上游故障期间快速失败，不再逐个等待超时
+    """
+
+    def __init__(self, base_url=BASE_URL, timeout=DEFAULT_TIMEOUT, max_retries=3,
+                 backoff_factor=0.5, backoff_jitter=0.5, pool_size=32, per_host_limit=16,
+                 verify=False, headers=None, breaker_threshold=5, breaker_reset=30, on_response=None,
+                 total_timeout=None):
+        self.base_url = base_url.rstrip("/")
+        self.per_host_limit = per_host_limit
+        self.on_response = on_response
+        self._init_breakers(breaker_threshold, breaker_reset)
+        self._init_retry(timeout, max_retries, backoff_factor, backoff_jitter, total_timeout)
+
+        # 重试由 get_json 自己控制（需要受总时限约束），连接池不再重试
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        # 沿用原先各脚本关闭证书校验的做法（部分环境证书链不完整）
+        self.session.verify = verify
+        if not verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def metric_url(self, repo_full_name: str, metric: str) -> str:
+        owner, repo = repo_full_name.split("/")
+        return f"{self.base_url}/{owner}/{repo}/{metric}.json"
+
+    def _slots(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slots
+        return slots
+
+    def get_json(self, repo_full_name: str, metric: str, timeout=None):
+        """
+        下载单个指标的原始 JSON
+        :raises MetricNotFoundError: 仓库没有该指标（404）
+        :raises UpstreamConnectionError: 重试后仍超时或连接失败
+        :raises OpenDiggerError: 其他 HTTP 错误、网络错误或 JSON 解析失败
+        """
+        url = self.metric_url(repo_full_name, metric)
+        breaker = self._admit(url)
+        start = time.perf_counter()
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            try:
+                with self._slots(url):
+                    resp = self.session.get(url, timeout=self._attempt_timeout(timeout, deadline))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise self._connection_error(breaker, repo_full_name, metric, start, e) from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except requests.RequestException as e:
+                breaker.record_failure()
+                self._report(0, time.perf_counter() - start, 0)
+                raise OpenDiggerError(f"{repo_full_name}/{metric} 请求失败: {e}") from e
+
+            if resp.status_code in RETRY_STATUS:
+                delay = self._retry_delay(attempt, deadline, resp)
+                if delay is not None:
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+            break
+
+        return self._decode(breaker, repo_full_name, metric, resp, time.perf_counter() - start)
+
+    def get_series(self, repo_full_name: str, metric: str, timeout=None) -> Dict[str, float]:
+        """
+        下载单个指标的月度时间序列 {"YYYY-MM": value}
+        有 avg 字段（如 issue_response_time）时取 avg，并去掉年度/季度汇总 key
+        """
+        data = self.get_json(repo_full_name, metric, timeout=timeout)
+        return parse_series(repo_full_name, metric, data)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOpenDiggerClient(_BreakerMixin):
+    """
+    OpenDiggerClient 的 asyncio 版本（httpx.AsyncClient），重试、并发限制规则与同步版一致
+    连接池绑定在创建它的事件循环上，不能跨循环使用
+    """
+
+    def __init__(self, base_url=BASE_URL, timeout=DEFAULT_TIMEOUT, max_retries=3,
+                 backoff_factor=0.5, backoff_jitter=0.5, pool_size=32, per_host_limit=16,
+                 verify=False, headers=None, breaker_threshold=5, breaker_reset=30, on_response=None,
+                 total_timeout=None):
+        if httpx is None:
+            raise ImportError("AsyncOpenDiggerClient 需要安装 httpx")
+        self.base_url = base_url.rstrip("/")
+        self.on_response = on_response
+        self._init_breakers(breaker_threshold, breaker_reset)
+        self._init_retry(timeout, max_retries, backoff_factor, backoff_jitter, total_timeout)
+        self.per_host_limit = per_host_limit
+
+        self.client = httpx.AsyncClient(
+            headers={**DEFAULT_HEADERS, **(headers or {})},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            verify=verify
+        )
+        self._host_slots = {}
+
+    metric_url = OpenDiggerClient.metric_url
+
+    def _slots(self, url):
+        host = urlparse(url).netloc
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return slots
+
+    async def get_json(self, repo_full_name: str, metric: str, timeout=None):
+        """
+        下载单个指标的原始 JSON
+        :raises MetricNotFoundError: 仓库没有该指标（404）
+        :raises UpstreamConnectionError: 重试后仍超时或连接失败
+        :raises OpenDiggerError: 其他 HTTP 错误或 JSON 解析失败
+        """
+        url = self.metric_url(repo_full_name, metric)
+        breaker = self._admit(url)
+        start = time.perf_counter()
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            try:
+                async with self._slots(url):
+                    resp = await self.client.get(url, timeout=self._attempt_timeout(timeout, deadline))
+            except httpx.TransportError as e:
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise self._connection_error(breaker, repo_full_name, metric, start, e) from e
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if resp.status_code in RETRY_STATUS:
+                delay = self._retry_delay(attempt, deadline, resp)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            break
+
+        return self._decode(breaker, repo_full_name, metric, resp, time.perf_counter() - start)
+
+    async def get_series(self, repo_full_name: str, metric: str, timeout=None) -> Dict[str, float]:
+        """下载单个指标的月度时间序列 {"YYYY-MM": value}"""
+        data = await self.get_json(repo_full_name, metric, timeout=timeout)
+        return parse_series(repo_full_name, metric, data)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# =========================
+# 进程内共享实例
+# =========================
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> OpenDiggerClient:
+    """获取进程共享的 OpenDigger 客户端（首次调用时创建）"""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = OpenDiggerClient()
+    return _default_client
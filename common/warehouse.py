@@ -0,0 +1,271 @@
+# warehouse.py 本地指标仓库（SQLite）
+# 每个 (repo, metric, month) 只存一份，建模脚本和后端都从这里读取，按月增量刷新
+#
+# 增量刷新所有仓库：
+#   python -m common.warehouse modeling/dataset/repos_snapshot.json
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict
+
+from common.opendigger_client import MetricNotFoundError, get_client
+
+# 默认数据库位置：仓库根目录 data/opendigger.sqlite3，可用环境变量覆盖
+DEFAULT_PATH = os.getenv(
+    "OPENDIGGER_WAREHOUSE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "opendigger.sqlite3")
+)
+
+# OpenDigger 每月几号发布上月数据
+PUBLISH_DAY = 2
+
+# 404（missing）记录的有效期（秒），过期后重新请求一次，以便发现新收录的仓库
+MISSING_TTL = 6 * 3600
+
+# value 列不声明类型（无类型亲和性），整数、浮点数按 OpenDigger 返回的原样存取，
+# 读出的序列与直接下载的 JSON 一致（整数指标不会变成 1.0）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_values (
+    metric TEXT NOT NULL,
+    month  TEXT NOT NULL,
+    repo   TEXT NOT NULL,
+    value  NOT NULL,
+    PRIMARY KEY (repo, metric, month)
+) WITHOUT ROWID;
+
+-- 按指标、月份横向读取（建模时取某月所有仓库）
+CREATE INDEX IF NOT EXISTS idx_metric_month ON metric_values (metric, month);
+
+-- 每个 (repo, metric) 的同步状态
+CREATE TABLE IF NOT EXISTS series_state (
+    repo          TEXT NOT NULL,
+    metric        TEXT NOT NULL,
+    status        TEXT NOT NULL,   -- ok / missing(404)
+    last_month    TEXT,            -- 已入库的最新月份
+    synced_month  TEXT NOT NULL,   -- 同步时 OpenDigger 已发布到的月份
+    synced_at     REAL NOT NULL,
+    PRIMARY KEY (repo, metric)
+) WITHOUT ROWID;
+"""
+
+
+def latest_published_month(now=None, publish_day=PUBLISH_DAY) -> str:
+    """OpenDigger 当前已发布数据的最新月份，如 10 月 18 日为 "YYYY-09"，10 月 1 日为 "YYYY-08" """
+    now = now or datetime.now()
+    year, month = now.year, now.month - (1 if now.day >= publish_day else 2)
+    while month <= 0:
+        year, month = year - 1, month + 12
+    return f"{year:04d}-{month:02d}"
+
+
+def _number(value):
+    """整数、浮点数原样入库（bool 与字符串等按浮点数处理）"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return float(value)
+
+
+class MetricWarehouse:
+    """
+    SQLite 指标仓库
+    - get_series 优先读本地；本月发布后还没同步过的 (repo, metric) 才访问 OpenDigger
+    - 同步时只写入比已有数据更新的月份；404 记为 missing，MISSING_TTL 内不再请求
+    - 每个线程一个连接，WAL 模式下多进程（如多个后端 worker）可同时读
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, client=None, publish_day: int = PUBLISH_DAY,
+                 missing_ttl: float = MISSING_TTL):
+        self.path = path
+        self.client = client or get_client()
+        self.publish_day = publish_day
+        self.missing_ttl = missing_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate_value_column(conn)
+
+    @staticmethod
+    def _migrate_value_column(conn):
+        """
+        旧版数据库的 value 列为 REAL，整数已被存成浮点数：重建为无类型列，并把整数值的浮点数还原为整数
+        （OpenDigger 的计数类指标均为整数，浮点类指标恰好为整数的情况可忽略）
+        """
+        columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(metric_values)")}
+        if columns.get("value", "").upper() != "REAL":
+            return
+        print("🔄 升级指标仓库：value 列改为按原样存储数值")
+        conn.executescript("""
+            ALTER TABLE metric_values RENAME TO metric_values_old;
+            DROP INDEX IF EXISTS idx_metric_month;
+        """ + SCHEMA + """
+            INSERT INTO metric_values (metric, month, repo, value)
+            SELECT metric, month, repo,
+                   CASE WHEN value = CAST(value AS INTEGER) THEN CAST(value AS INTEGER) ELSE value END
+            FROM metric_values_old;
+            DROP TABLE metric_values_old;
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 读取 ----------
+
+    def _state(self, repo, metric):
+        return self._conn().execute(
+            "SELECT status, last_month, synced_month, synced_at FROM series_state WHERE repo = ? AND metric = ?",
+            (repo, metric)
+        ).fetchone()
+
+    def is_fresh(self, repo: str, metric: str) -> bool:
+        state = self._state(repo, metric)
+        if state is None:
+            return False
+        if state[0] == "missing" and time.time() - state[3] > self.missing_ttl:
+            return False
+        return state[2] >= latest_published_month(publish_day=self.publish_day)
+
+    def read_series(self, repo: str, metric: str) -> Dict[str, float]:
+        """只读本地数据，不访问网络"""
+        rows = self._conn().execute(
+            "SELECT month, value FROM metric_values WHERE repo = ? AND metric = ? ORDER BY month",
+            (repo, metric)
+        ).fetchall()
+        return dict(rows)
+
+    def get_series(self, repo: str, metric: str, refresh: bool = True) -> Dict[str, float]:
+        """
+        获取月度序列 {"YYYY-MM": value}
+        :param refresh: 数据过期时是否先从 OpenDigger 增量同步
+        :raises MetricNotFoundError: OpenDigger 上没有该指标
+        """
+        if refresh and not self.is_fresh(repo, metric):
+            self.sync(repo, metric)
+        state = self._state(repo, metric)
+        if state is not None and state[0] == "missing":
+            raise MetricNotFoundError(f"{repo}/{metric} 无数据 (404)")
+        return self.read_series(repo, metric)
+
+    def read_month(self, metric: str, month: str) -> Dict[str, float]:
+        """读取某指标某月所有仓库的值 {repo: value}"""
+        rows = self._conn().execute(
+            "SELECT repo, value FROM metric_values WHERE metric = ? AND month = ?",
+            (metric, month)
+        ).fetchall()
+        return dict(rows)
+
+    # ---------- 同步 ----------
+
+    def sync(self, repo: str, metric: str) -> int:
+        """
+        从 OpenDigger 同步一个 (repo, metric)，只写入比已有数据更新的月份
+        :return: 新写入的月份数
+        """
+        try:
+            series = self.client.get_series(repo, metric)
+        except MetricNotFoundError:
+            self.mark_missing(repo, metric)
+            raise
+        return self.store_series(repo, metric, series)
+
+    def mark_missing(self, repo: str, metric: str):
+        """记录 OpenDigger 上没有该指标（404），本发布周期内不再请求"""
+        synced_month = latest_published_month(publish_day=self.publish_day)
+        state = self._state(repo, metric)
+        last_month = state[1] if state else None
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO series_state VALUES (?, ?, 'missing', ?, ?, ?)",
+                (repo, metric, last_month, synced_month, time.time())
+            )
+
+    def store_series(self, repo: str, metric: str, series: Dict[str, float]) -> int:
+        """
+        写入一次下载得到的完整序列（同步、异步下载共用），只写入比已有数据更新的月份
+        :return: 新写入的月份数
+        """
+        synced_month = latest_published_month(publish_day=self.publish_day)
+        state = self._state(repo, metric)
+        last_month = state[1] if state else None
+
+        new_rows = [
+            (metric, month, repo, _number(value))
+            for month, value in series.items()
+            if (last_month is None or month > last_month) and value is not None
+        ]
+        newest = max([*series, *([last_month] if last_month else [])], default=None)
+
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO metric_values (metric, month, repo, value) VALUES (?, ?, ?, ?)",
+                new_rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO series_state VALUES (?, ?, 'ok', ?, ?, ?)",
+                (repo, metric, newest, synced_month, time.time())
+            )
+        return len(new_rows)
+
+    def refresh_all(self, repos, metrics, max_workers: int = 16):
+        """并发增量同步，已是最新的 (repo, metric) 直接跳过"""
+        todo = [(r, m) for r in repos for m in metrics if not self.is_fresh(r, m)]
+        print(f"🔄 需同步 {len(todo)} 个 (repo, metric)，其余已是最新")
+        inserted = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(self.sync, r, m): (r, m) for r, m in todo}
+            for future in as_completed(futures):
+                try:
+                    inserted += future.result()
+                except MetricNotFoundError:
+                    pass
+                except Exception as e:
+                    failed += 1
+                    repo, metric = futures[future]
+                    print(f"❌ 同步失败: {repo} / {metric} / {e}")
+        print(f"✅ 同步完成，新增 {inserted} 个月度值，失败 {failed} 个")
+        return inserted
+
+
+# =========================
+# 进程内共享实例
+# =========================
+
+_default_warehouse = None
+_default_lock = threading.Lock()
+
+
+def get_warehouse() -> MetricWarehouse:
+    """获取进程共享的指标仓库（默认路径，首次调用时创建）"""
+    global _default_warehouse
+    if _default_warehouse is None:
+        with _default_lock:
+            if _default_warehouse is None:
+                _default_warehouse = MetricWarehouse()
+    return _default_warehouse
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="增量同步 OpenDigger 指标到本地仓库")
+    parser.add_argument("repo_list", help="仓库列表 JSON 文件，如 repos_snapshot.json")
+    parser.add_argument("--metrics", nargs="+", default=[
+        "activity", "participants", "contributors", "bus_factor", "issue_response_time", "openrank"
+    ])
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.repo_list, "r", encoding="utf-8") as f:
+        repo_list = json.load(f)
+    get_warehouse().refresh_all(repo_list, args.metrics, max_workers=args.workers)
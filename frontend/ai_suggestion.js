@@ -4,6 +4,35 @@ const aiLoading = document.getElementById('aiLoading');
 const aiSuggestContainer = document.getElementById('aiSuggestContainer');
 const aiSuggestContent = document.getElementById('aiSuggestContent');
 
+// 已生成过建议的仓库；同一仓库再次点击视为要求重新生成（跳过后端缓存）
+const suggestedRepos = new Set();
+
+// 把当前累计的MD文本渲染到页面（每帧最多渲染一次，避免频繁重排）
+let pendingMarkdown = null;
+function renderSuggestion(mdContent) {
+    const shouldSchedule = pendingMarkdown === null;
+    pendingMarkdown = mdContent;
+    if (!shouldSchedule) return;
+    requestAnimationFrame(() => {
+        aiSuggestContent.innerHTML = marked.parse(pendingMarkdown || '暂无有效建议');
+        pendingMarkdown = null;
+    });
+}
+
+// 逐条解析SSE事件，返回 {event, data}
+function parseSseEvent(rawEvent) {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    }
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+}
+
 // AI建议按钮点击事件
 aiSuggestBtn.addEventListener('click', async () => {
     const repo = repoInput.value.trim();
@@ -15,29 +44,63 @@ aiSuggestBtn.addEventListener('click', async () => {
     // 重置AI建议区域状态
     errorMsg.textContent = '';
     aiSuggestContainer.style.display = 'none';
+    aiSuggestContent.innerHTML = '';
     aiLoading.style.display = 'block';
     aiSuggestBtn.disabled = true;
 
     try {
-        // 调用AI建议接口
-        const response = await fetch('http://localhost:5000/ai-suggest', {
+        // 调用流式AI建议接口，边生成边显示
+        const response = await fetch('http://localhost:5000/ai-suggest/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
             },
-            body: JSON.stringify({ repo: repo })
+            body: JSON.stringify({ repo: repo, refresh: suggestedRepos.has(repo) })
         });
 
-        const aiData = await response.json();
-
+        // 数据准备阶段出错时后端返回普通JSON
         if (!response.ok) {
-            throw new Error(aiData.error || 'AI建议生成失败，请重试');
+            const errData = await response.json().catch(() => ({}));
+            throw new Error(errData.error || 'AI建议生成失败，请重试');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let mdContent = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE事件以空行分隔，最后一段可能不完整，留到下次
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+
+            for (const rawEvent of events) {
+                if (!rawEvent.trim()) continue;
+                const { event, data } = parseSseEvent(rawEvent);
+                if (event === 'error') {
+                    throw new Error(data.error || 'AI建议生成失败，请重试');
+                }
+                if (event === 'done') continue;
+                if (data.delta) {
+                    // 收到首段内容后隐藏loading，展示建议区域
+                    if (!mdContent) {
+                        aiLoading.style.display = 'none';
+                        aiSuggestContainer.style.display = 'block';
+                    }
+                    mdContent += data.delta;
+                    renderSuggestion(mdContent);
+                }
+            }
         }
 
         // 核心修改：用marked()将MD格式转为HTML，再用innerHTML插入
-        const mdContent = aiData.suggestion || '暂无有效建议';
-        const htmlContent = marked.parse(mdContent); // MD转HTML
-        aiSuggestContent.innerHTML = htmlContent; // 替换原来的textContent
+        renderSuggestion(mdContent);
+        suggestedRepos.add(repo);
         aiSuggestContainer.style.display = 'block';
 
     } catch (err) {
@@ -46,4 +109,4 @@ aiSuggestBtn.addEventListener('click', async () => {
         aiLoading.style.display = 'none';
         aiSuggestBtn.disabled = false;
     }
-});
\ No newline at end of file
+});
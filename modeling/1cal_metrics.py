@@ -1,20 +1,29 @@
 import json
-import ssl
-import gzip
-import urllib.request
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.warehouse import get_warehouse
+from common.features import compute_features, features_to_dict, series_to_array
+
 # ======================
 # 基本配置
 # ======================
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (compatible; OpenDigger-Analyzer/1.0)"
-}
-
-REQUEST_TIMEOUT = 15
 END_MONTH = "2025-6"
 
+# 并发拉取的线程数（同时在途的 (repo, metric) 请求数）
+MAX_WORKERS = 16
+
+# 每完成多少个请求打印一次进度
+PROGRESS_EVERY = 100
+
+# 每个仓库最先拉取的指标，缺失则其余指标都不再请求
+PROBE_METRIC = "openrank"
+
 METRICS = [
     "contributors",
     "participants",
@@ -29,36 +38,9 @@ METRICS = [
 # ======================
 
 def get_repo_metric_timeseries(repo_full_name: str, metric: str) -> Dict[str, float]:
-    owner, repo = repo_full_name.split('/')
-    url = f"https://oss.open-digger.cn/github/{owner}/{repo}/{metric}.json"
-
-    ssl_context = ssl._create_unverified_context()
-
     try:
-        request = urllib.request.Request(url, headers=HEADERS)
-        with urllib.request.urlopen(
-            request,
-            context=ssl_context,
-            timeout=REQUEST_TIMEOUT
-        ) as response:
-
-            raw = response.read()
-            if response.headers.get("Content-Encoding") == "gzip":
-                raw = gzip.decompress(raw)
-
-            data = json.loads(raw.decode("utf-8"))
-
-            if not isinstance(data, dict):
-                return {}
-
-            time_data = data.get("avg", data)
-            if not isinstance(time_data, dict):
-                return {}
-
-            return {
-                k: v for k, v in time_data.items()
-                if isinstance(k, str) and len(k) == 7 and "-" in k
-            }
+        # 优先读本地指标仓库，本月未同步过才请求 OpenDigger
+        return get_warehouse().get_series(repo_full_name, metric)
 
     except Exception as e:
         print(f"❌ 获取失败: {repo_full_name} / {metric} / {e}")
@@ -77,50 +59,128 @@ def slice_last_n_months(timeseries: Dict[str, float], end_month: str, n=3):
 # Step 3: 计算趋势 / 跃迁指标
 # ======================
 
-def compute_trending_features(monthly_metrics: Dict[str, Dict[str, float]]):
-    def delta_percent(values):
-        if len(values) < 2:
-            return 0.0
-        start, end = values[0], values[-1]
-        if start == 0:
-            return 0.0
-        return round((end - start) / abs(start), 4)
-
-    def jump(values, threshold=1):
-        if len(values) < 2:
-            return 0
-        return int(values[0] <= threshold and values[-1] > threshold)
-
-    trending = {}
-
-    trending["activity_trend"] = delta_percent(
-        list(monthly_metrics["activity"].values())
-    )
+# trending_data.json 中的特征顺序（3model.py 按第一条记录的 key 顺序建 X）
+FEATURE_ORDER = [
+    "activity_trend",
+    "participants_trend",
+    "openrank_trend",
+    "contributors_jump",
+    "bus_factor_jump",
+    "issue_response_time_trend"
+]
 
-    trending["participants_trend"] = delta_percent(
-        list(monthly_metrics["participants"].values())
-    )
 
-    trending["openrank_trend"] = delta_percent(
-        list(monthly_metrics["openrank"].values())
-    )
+def compute_trending_features_batch(repo_metrics_list):
+    """
+    一次计算多个仓库的趋势特征（共享特征模块的 modeling 口径）
+    :param repo_metrics_list: [{metric: {month: value}}]
+    :return: [{feature: value}]，与输入顺序一致
+    """
+    values = series_to_array(repo_metrics_list, METRICS)
+    features = compute_features(values, METRICS, variant="modeling", feature_names=FEATURE_ORDER)
+    return [features_to_dict(row, FEATURE_ORDER) for row in features]
 
-    trending["contributors_jump"] = jump(
-        list(monthly_metrics["contributors"].values()), threshold=1
-    )
 
-    trending["bus_factor_jump"] = jump(
-        list(monthly_metrics["bus_factor"].values()), threshold=1
-    )
+def compute_trending_features(monthly_metrics: Dict[str, Dict[str, float]]):
+    return compute_trending_features_batch([monthly_metrics])[0]
 
-    trending["issue_response_time_trend"] = -delta_percent(
-        list(monthly_metrics["issue_response_time"].values())
-    )
+# ======================
+# Step 4: 并发拉取
+# ======================
 
-    return trending
+def fetch_repo_metric(repo: str, metric: str, discarded: set):
+    """
+    拉取并截取单个 (repo, metric)，不可用时返回 None
+    仓库已被其他指标判定丢弃时直接跳过，不再发请求
+    """
+    if repo in discarded:
+        return None
+
+    ts = get_repo_metric_timeseries(repo, metric)
+    if not ts:
+        return None
+
+    ts_3m = slice_last_n_months(ts, END_MONTH, n=6)
+
+    # 最近三个月数据不足，也丢弃
+    if len(ts_3m) < 2:
+        return None
+
+    return ts_3m
+
+
+def ingest_repos(repos, max_workers=MAX_WORKERS):
+    """
+    并发拉取所有 (repo, metric)，任一指标不可用即丢弃该仓库并取消其剩余请求
+    每个仓库先拉 PROBE_METRIC（缺失最常见），成功后再并发拉其余指标，减少无效请求
+    :return: {repo: {metric: {month: value}}}，只包含指标齐全的仓库
+    """
+    discarded = set()
+    repo_metrics = {repo: {} for repo in repos}
+    repo_futures = {repo: [] for repo in repos}
+    other_metrics = [m for m in METRICS if m != PROBE_METRIC]
+
+    total = len(repo_metrics) * len(METRICS)
+    finished = 0
+    fetched = 0
+    next_report = PROGRESS_EVERY
+    start = time.time()
+
+    def report():
+        elapsed = max(time.time() - start, 1e-6)
+        print(
+            f"⏳ 进度 {finished}/{total} "
+            f"（已请求 {fetched}，已丢弃仓库 {len(discarded)}）"
+            f"，{fetched / elapsed:.1f} 请求/秒"
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+
+        def submit(repo, metric):
+            future = pool.submit(fetch_repo_metric, repo, metric, discarded)
+            pending[future] = (repo, metric)
+            repo_futures[repo].append(future)
+
+        for repo in repo_metrics:
+            submit(repo, PROBE_METRIC)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                repo, metric = pending.pop(future)
+
+                if future.cancelled() or repo in discarded:
+                    continue
+
+                fetched += 1
+                ts = future.result()
+                if ts is None:
+                    # ---- 丢弃不完整仓库，取消还没开始的请求 ----
+                    discarded.add(repo)
+                    for other in repo_futures[repo]:
+                        other.cancel()
+                    # 被丢弃仓库未完成的指标直接计入进度
+                    finished += len(METRICS) - len(repo_metrics[repo])
+                else:
+                    repo_metrics[repo][metric] = ts
+                    finished += 1
+                    if metric == PROBE_METRIC:
+                        for other in other_metrics:
+                            submit(repo, other)
+
+                if finished >= next_report:
+                    report()
+                    next_report += PROGRESS_EVERY
+
+    report()
+    return {
+        repo: metrics for repo, metrics in repo_metrics.items()
+        if repo not in discarded
+    }
 
 # ======================
-# Step 4: 主流程
+# Step 5: 主流程
 # ======================
 
 def main():
@@ -130,38 +190,19 @@ def main():
     all_raw_data = []
     all_trending_data = []
 
-    for repo in repos:
-        # print("\n" + "=" * 60)
-        # print(f"📦 Processing repo: {repo}")
-
-        repo_raw_metrics = {}
-        discard_repo = False
-
-        # ---- 拉取所有指标 ----
-        for metric in METRICS:
-            ts = get_repo_metric_timeseries(repo, metric)
-
-            if not ts:
-                discard_repo = True
-                break
-
-            ts_3m = slice_last_n_months(ts, END_MONTH, n=6)
-
-            # 最近三个月数据不足，也丢弃
-            if len(ts_3m) < 2:
-                discard_repo = True
-                break
-
-            repo_raw_metrics[metric] = ts_3m
+    kept = ingest_repos(repos)
 
-        # ---- 丢弃不完整仓库 ----
-        if discard_repo:
-        #     print(f"⚠️ 丢弃仓库（指标不完整）: {repo}")
-            continue
+    # 按 repos_snapshot.json 中的顺序输出，与串行版本一致；指标按 METRICS 顺序排列
+    kept_repos = [repo for repo in repos if repo in kept]
+    raw_metrics_list = [
+        {metric: kept[repo][metric] for metric in METRICS}
+        for repo in kept_repos
+    ]
 
-        # ---- 计算趋势特征 ----
-        trending_features = compute_trending_features(repo_raw_metrics)
+    # ---- 计算趋势特征（所有仓库一次向量化计算） ----
+    trending_list = compute_trending_features_batch(raw_metrics_list)
 
+    for repo, repo_raw_metrics, trending_features in zip(kept_repos, raw_metrics_list, trending_list):
         # ---- 统一存储 ----
         all_raw_data.append({
             "repo": repo,
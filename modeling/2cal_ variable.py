@@ -1,19 +1,17 @@
 import json
-import ssl
-import urllib.request
-import gzip
 import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.warehouse import get_warehouse
+
 # ========================
 # 基本配置
 # ========================
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0"
-}
-
-REQUEST_TIMEOUT = 20
 EPSILON = 1e-6
 
 # 站在这个时间点做评估
@@ -24,7 +22,11 @@ FUTURE_MONTHS = ["2025-07", "2025-08", "2025-09"]
 
 # 输入 & 输出文件
 REPO_LIST_FILE = "repos_snapshot.json"                 # 你已有的仓库列表
-LABEL_OUTPUT_FILE = "label_openrank.json"    # y 的缓存文件
+LABEL_STORE_FILE = "label_openrank.jsonl"    # y 的追加式存储（每行一条，断点续跑）
+LABEL_OUTPUT_FILE = "label_openrank.json"    # 导出的 JSON 数组（3model.py 等读取）
+
+# 并发拉取 openrank 的线程数
+MAX_WORKERS = 16
 
 
 # ========================
@@ -39,39 +41,111 @@ def load_json(path: str, default):
 
 
 def save_json(path: str, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """先写临时文件再原子替换，写到一半崩溃也不会损坏原文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 
-def fetch_openrank(repo_full_name: str) -> Dict[str, float]:
+# ========================
+# label 存储（JSON Lines，只追加）
+# ========================
+
+class LabelStore:
     """
-    拉取一个仓库的 openrank 全时间序列
-    返回：{ "YYYY-MM": value }
+    追加式 label 存储：每条记录一行 JSON，写入后立即 flush + fsync
+    - 进程中途崩溃最多留下最后一行不完整，重新打开时截掉，已提交的记录不受影响
+    - 首次使用时从旧版 label_openrank.json 导入已有记录
     """
-    owner, repo = repo_full_name.split("/")
-    url = f"https://oss.open-digger.cn/github/{owner}/{repo}/openrank.json"
 
-    ssl_context = ssl._create_unverified_context()
-    request = urllib.request.Request(url, headers=HEADERS)
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        self.path = path
+        self.records = {}  # repo -> record，保持写入顺序
+        if not os.path.exists(path) and legacy_path and os.path.exists(legacy_path):
+            self._migrate(legacy_path)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _migrate(self, legacy_path):
+        legacy = load_json(legacy_path, [])
+        with open(self.path, "w", encoding="utf-8") as f:
+            for record in legacy:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"📦 已从 {legacy_path} 导入 {len(legacy)} 条 label")
+
+    def _load(self):
+        """
+        读取已提交的记录：只有最后一行可能是崩溃时写了一半的，不完整时截掉；
+        中间的空行、损坏行跳过并提示，不影响之后的记录
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+
+        offset = 0
+        skipped = 0
+        for i, line in enumerate(lines):
+            is_last = i == len(lines) - 1
+            record = None
+            if line.strip():
+                try:
+                    record = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    record = None
+            if is_last and (record is None or not line.endswith(b"\n")):
+                if line.strip():
+                    print(f"⚠️ {self.path} 末尾存在不完整记录，已截断")
+                    with open(self.path, "rb+") as f:
+                        f.truncate(offset)
+                break
+            offset += len(line)
+            if not isinstance(record, dict) or "repo" not in record:
+                if line.strip():
+                    skipped += 1
+                    print(f"⚠️ {self.path} 第 {i + 1} 行损坏，已跳过")
+                continue
+            self.records[record["repo"]] = record
+        if skipped:
+            print(f"⚠️ 共跳过 {skipped} 行损坏记录（保留在文件中，可手动检查）")
 
-    with urllib.request.urlopen(
-        request,
-        context=ssl_context,
-        timeout=REQUEST_TIMEOUT
-    ) as response:
-        raw_data = response.read()
-        if response.headers.get("Content-Encoding") == "gzip":
-            raw_data = gzip.decompress(raw_data)
+    def __contains__(self, repo):
+        return repo in self.records
 
-        data = json.loads(raw_data.decode("utf-8"))
+    def __len__(self):
+        return len(self.records)
 
-        if "avg" in data and isinstance(data["avg"], dict):
-            return data["avg"]
+    def append(self, record: dict):
+        """提交一条记录：写完整一行并落盘后才算成功"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records[record["repo"]] = record
 
-        if isinstance(data, dict):
-            return data
+    def export_json(self, path: str):
+        """导出为旧版 JSON 数组格式"""
+        save_json(path, list(self.records.values()))
 
-        raise ValueError("Invalid openrank data format")
+    def close(self):
+        self._file.close()
+
+
+def fetch_openrank(repo_full_name: str) -> Dict[str, float]:
+    """
+    拉取一个仓库的 openrank 全时间序列
+    返回：{ "YYYY-MM": value }
+    """
+    # 与 1cal_metrics 共用本地指标仓库，openrank 不再重复下载
+    return get_warehouse().get_series(repo_full_name, "openrank")
 
 
 def get_openrank_by_month(
@@ -85,49 +159,59 @@ def get_openrank_by_month(
 # 主流程
 # ========================
 
-def main():
-    repos = load_json(REPO_LIST_FILE, [])
-    label_cache = load_json(LABEL_OUTPUT_FILE, [])
-    # 已计算过的 repo 集合（避免重复）
-    computed_repos = {item["repo"] for item in label_cache}
+def compute_label(repo: str) -> Optional[dict]:
+    """拉取 openrank 并计算一个仓库的 y，缺少关键月份时返回 None"""
+    openrank_series = fetch_openrank(repo)
 
-    # print(f"📦 已缓存 {len(computed_repos)} 个 repo 的 y")
+    openrank_t = get_openrank_by_month(openrank_series, EVAL_MONTH)
+    openrank_t3 = get_openrank_by_month(openrank_series, FUTURE_MONTHS[-1])
 
-    for repo in repos:
-        if repo in computed_repos:
-            continue
+    if openrank_t is None or openrank_t3 is None:
+        # print(f"⚠️ 缺少关键月份 openrank，跳过 {repo}")
+        return None
 
-        # print(f"🔍 处理 {repo}")
+    y_growth = (openrank_t3 - openrank_t) / max(openrank_t, EPSILON)
 
-        try:
-            openrank_series = fetch_openrank(repo)
+    return {
+        "repo": repo,
+        "t": EVAL_MONTH,
+        "openrank_t": round(openrank_t, 4),
+        "openrank_t_plus_3": round(openrank_t3, 4),
+        "y_growth": round(y_growth, 6)
+    }
 
-            openrank_t = get_openrank_by_month(openrank_series, EVAL_MONTH)
-            openrank_t3 = get_openrank_by_month(openrank_series, FUTURE_MONTHS[-1])
 
-            if openrank_t is None or openrank_t3 is None:
-                # print(f"⚠️ 缺少关键月份 openrank，跳过 {repo}")
-                continue
+def main():
+    repos = load_json(REPO_LIST_FILE, [])
+    store = LabelStore(LABEL_STORE_FILE, legacy_path=LABEL_OUTPUT_FILE)
+
+    # print(f"📦 已缓存 {len(store)} 个 repo 的 y")
 
-            y_growth = (openrank_t3 - openrank_t) / max(openrank_t, EPSILON)
+    # 已计算过的 repo 跳过（断点续跑）
+    todo = list(dict.fromkeys(repo for repo in repos if repo not in store))
 
-            record = {
-                "repo": repo,
-                "t": EVAL_MONTH,
-                "openrank_t": round(openrank_t, 4),
-                "openrank_t_plus_3": round(openrank_t3, 4),
-                "y_growth": round(y_growth, 6)
-            }
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {pool.submit(compute_label, repo): repo for repo in todo}
 
-            label_cache.append(record)
-            save_json(LABEL_OUTPUT_FILE, label_cache)
+            # 只在主线程写入，保证每行记录完整
+            for future in as_completed(futures):
+                repo = futures[future]
+                try:
+                    record = future.result()
+                    if record is None:
+                        continue
 
-            print(f"✅ y = {record['y_growth']}")
+                    store.append(record)
+                    print(f"✅ y = {record['y_growth']}")
 
-        except Exception as e:
-            print(f"❌ {repo} 处理失败: {e}")
+                except Exception as e:
+                    print(f"❌ {repo} 处理失败: {e}")
+    finally:
+        store.close()
+        store.export_json(LABEL_OUTPUT_FILE)
 
-    print(f"\n🎉 完成，共生成 {len(label_cache)} 条 label")
+    print(f"\n🎉 完成，共生成 {len(store)} 条 label")
 
 
 if __name__ == "__main__":
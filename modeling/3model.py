@@ -1,8 +1,6 @@
-import json
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from scipy.stats import pearsonr
+# 3model.py 单模型训练报告：标准化参数、单特征相关性、线性模型权重与交叉验证 R²
+# 训练逻辑在 train.py，这里只负责打印；写出模型文件请用 python train.py
+from train import load_dataset, feature_correlations, fit, kfold_splits, time_splits, cross_validate
 
 # =========================
 # 文件路径
@@ -15,52 +13,23 @@ LABEL_FILE = "label_openrank.json"
 # Step 0: 读取并按 repo 匹配
 # =========================
 
-with open(TRENDING_FILE, "r", encoding="utf-8") as f:
-    trending_data = json.load(f)
+dataset = load_dataset(TRENDING_FILE, LABEL_FILE)
+feature_names = dataset.feature_names
 
-with open(LABEL_FILE, "r", encoding="utf-8") as f:
-    label_data = json.load(f)
+print(f"✅ 可用样本数: {len(dataset.y)}")
 
-# repo -> features
-feature_map = {
-    item["repo"]: item["features"]
-    for item in trending_data
-}
-
-# repo -> y
-label_map = {
-    item["repo"]: item["y_growth"]
-    for item in label_data
-}
-
-# 只保留同时存在 X 和 y 的 repo
-common_repos = sorted(set(feature_map) & set(label_map))
-
-print(f"✅ 可用样本数: {len(common_repos)}")
-
-if len(common_repos) < 5:
+if len(dataset.y) < 5:
     print("⚠️ 样本过少，结果不具统计意义")
 
-# 构建 X, y
-feature_names = list(feature_map[common_repos[0]].keys())
-
-X = np.array([
-    [feature_map[repo][fname] for fname in feature_names]
-    for repo in common_repos
-])
-
-y = np.array([label_map[repo] for repo in common_repos])
-
 # =========================
 # Stage 1: 特征标准化
 # =========================
 
-scaler = StandardScaler()
-X_std = scaler.fit_transform(X)
+scaler, model = fit(dataset.X, dataset.y)
 
 print("\n📌 Stage 1: 特征标准化完成")
 for i, fname in enumerate(feature_names):
-    print(f"{fname:30s} mean={scaler.mean_[i]: .4f}, std={np.sqrt(scaler.var_[i]): .4f}")
+    print(f"{fname:30s} mean={scaler.mean_[i]: .4f}, std={scaler.scale_[i]: .4f}")
 
 # =========================
 # Stage 2: 单特征有效性筛查
@@ -68,13 +37,7 @@ for i, fname in enumerate(feature_names):
 
 print("\n📌 Stage 2: 单特征与 y 的相关性")
 
-feature_scores = []
-
-for i, fname in enumerate(feature_names):
-    xi = X_std[:, i]
-    corr, p_value = pearsonr(xi, y)
-    feature_scores.append((fname, corr, p_value))
-
+for fname, (corr, p_value) in feature_correlations(dataset).items():
     print(
         f"{fname:30s} "
         f"corr={corr: .4f} "
@@ -88,21 +51,32 @@ for i, fname in enumerate(feature_names):
 # Stage 3: 多特征线性建模
 # =========================
 
-model = LinearRegression()
-model.fit(X_std, y)
-
-weights = model.coef_
-intercept = model.intercept_
-r2 = model.score(X_std, y)
+r2 = model.score(scaler.transform(dataset.X), dataset.y)
 
 print("\n📌 Stage 3: 线性模型结果（标准化特征）")
 
 print(f"R² = {r2:.4f}")
-print(f"Intercept = {intercept:.4f}\n")
+print(f"Intercept = {model.intercept_:.4f}\n")
 
 for fname, w in sorted(
-    zip(feature_names, weights),
+    zip(feature_names, model.coef_),
     key=lambda x: abs(x[1]),
     reverse=True
 ):
     print(f"{fname:30s} weight = {w: .4f}")
+
+# =========================
+# Stage 4: 交叉验证（训练集 R² 偏乐观）
+# =========================
+
+print("\n📌 Stage 4: 交叉验证")
+
+scores = cross_validate(dataset.X, dataset.y, kfold_splits(len(dataset.y)))
+print(f"{len(scores)} 折 CV R² = {scores.mean():.4f} ± {scores.std():.4f}")
+
+splits = time_splits(dataset.months)
+if splits:
+    scores = cross_validate(dataset.X, dataset.y, splits)
+    print(f"时间切分 CV R² = {scores.mean():.4f} ± {scores.std():.4f}")
+else:
+    print("label 只有一个评估月份，跳过时间切分")
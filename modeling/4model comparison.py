@@ -1,8 +1,7 @@
-import json
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from scipy.stats import pearsonr
+# 4model comparison.py 含 / 去 openrank_trend 两个模型的对比
+# 两个特征子集由 train.compare_subsets 并行评估（同一设计矩阵按列切片），这里只负责打印
+# 更多子集的对比与模型文件输出请用 python train.py
+from train import load_dataset, compare_subsets, feature_correlations, fit
 
 # =========================
 # 文件路径
@@ -17,42 +16,24 @@ REMOVED_FEATURE = "openrank_trend"
 # Step 0: 读取并按 repo 匹配
 # =========================
 
-with open(TRENDING_FILE, "r", encoding="utf-8") as f:
-    trending_data = json.load(f)
+dataset = load_dataset(TRENDING_FILE, LABEL_FILE)
 
-with open(LABEL_FILE, "r", encoding="utf-8") as f:
-    label_data = json.load(f)
-
-feature_map = {
-    item["repo"]: item["features"]
-    for item in trending_data
-}
-
-label_map = {
-    item["repo"]: item["y_growth"]
-    for item in label_data
-}
-
-common_repos = sorted(set(feature_map) & set(label_map))
-
-print(f"✅ 可用样本数: {len(common_repos)}")
+print(f"✅ 可用样本数: {len(dataset.y)}")
 
 # =========================
 # 构建完整特征集
 # =========================
 
-all_feature_names = list(feature_map[common_repos[0]].keys())
+all_feature_names = dataset.feature_names
 reduced_feature_names = [
     f for f in all_feature_names if f != REMOVED_FEATURE
 ]
 
-def build_xy(feature_names):
-    X = np.array([
-        [feature_map[repo][f] for f in feature_names]
-        for repo in common_repos
-    ])
-    y = np.array([label_map[repo] for repo in common_repos])
-    return X, y
+correlations = feature_correlations(dataset)
+results = {
+    tuple(r["features"]): r
+    for r in compare_subsets(dataset, [all_feature_names, reduced_feature_names])
+}
 
 # =========================
 # 训练 + 输出结果
@@ -64,23 +45,19 @@ def train_and_report(feature_names, title):
     print(f"特征数: {len(feature_names)}")
     print("-" * 60)
 
-    X, y = build_xy(feature_names)
-
-    scaler = StandardScaler()
-    X_std = scaler.fit_transform(X)
-
     # 单特征相关性（仅输出）
     print("\n🔍 单特征相关性：")
-    for i, fname in enumerate(feature_names):
-        corr, _ = pearsonr(X_std[:, i], y)
-        print(f"{fname:30s} corr={corr: .4f}")
+    for fname in feature_names:
+        print(f"{fname:30s} corr={correlations[fname][0]: .4f}")
 
-    model = LinearRegression()
-    model.fit(X_std, y)
+    result = results[tuple(feature_names)]
+    _, model = fit(dataset.select(feature_names), dataset.y)
 
-    r2 = model.score(X_std, y)
+    r2 = result["train_r2"]
+    kfold = result["cv"]["kfold"]
 
     print(f"\n📈 R² = {r2:.4f}")
+    print(f"📈 {kfold['folds']} 折 CV R² = {kfold['r2_mean']:.4f} ± {kfold['r2_std']:.4f}")
     print("\n⚖️ 权重（按绝对值排序）：")
 
     weights = model.coef_
@@ -92,13 +69,13 @@ def train_and_report(feature_names, title):
     ):
         print(f"{fname:30s} weight={w: .4f}")
 
-    return r2, dict(zip(feature_names, weights))
+    return r2, kfold["r2_mean"], dict(zip(feature_names, weights))
 
 # =========================
 # Model A: 含 openrank_trend
 # =========================
 
-r2_full, weights_full = train_and_report(
+r2_full, cv_full, weights_full = train_and_report(
     all_feature_names,
     "Model A: 含 openrank_trend（趋势延续模型）"
 )
@@ -107,7 +84,7 @@ r2_full, weights_full = train_and_report(
 # Model B: 去 openrank_trend
 # =========================
 
-r2_reduced, weights_reduced = train_and_report(
+r2_reduced, cv_reduced, weights_reduced = train_and_report(
     reduced_feature_names,
     "Model B: 去 openrank_trend（潜力解释模型）"
 )
@@ -120,9 +97,9 @@ print("\n" + "="*60)
 print("📊 模型对比总结")
 print("="*60)
 
-print(f"含 openrank_trend    R² = {r2_full:.4f}")
-print(f"去 openrank_trend    R² = {r2_reduced:.4f}")
-print(f"R² 损失             Δ = {r2_full - r2_reduced:.4f}")
+print(f"含 openrank_trend    R² = {r2_full:.4f}    CV R² = {cv_full:.4f}")
+print(f"去 openrank_trend    R² = {r2_reduced:.4f}    CV R² = {cv_reduced:.4f}")
+print(f"R² 损失             Δ = {r2_full - r2_reduced:.4f}    CV Δ = {cv_full - cv_reduced:.4f}")
 
 print("\n🔁 权重变化（去掉 openrank_trend 后）：")
 for fname in reduced_feature_names:
@@ -6,6 +6,12 @@ from datetime import datetime, timedelta
 GITHUB_SEARCH_API = "https://api.github.com/search/repositories"
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_TRENDING_URL = "https://github.com/trending"
+# get_github_trending_repos 爬取的页面（日 / 周 / 月榜）
+GITHUB_URLS = [
+    GITHUB_TRENDING_URL,
+    f"{GITHUB_TRENDING_URL}?since=weekly",
+    f"{GITHUB_TRENDING_URL}?since=monthly",
+]
 SEARCH_QUEARYS = [
                     "stars:50..100 pushed:>2025-12-01",
                     "stars:100..200 pushed:>2025-12-01",
@@ -1,101 +1,39 @@
 # github_spider.py 爬取github trending仓库
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
+# 实际的爬取逻辑在 common/github_discovery.py（与后端预热共用），这里按建模配置调用
 import json
+import os
+import sys
 from config import GITHUB_URLS, HEADERS, REQUEST_TIMEOUT, REQUEST_DELAY, GITHUB_SEARCH_API, SEARCH_QUEARYS
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import github_discovery
+
+
 def get_github_trending_repos():
     """
     爬取GitHub Trending页面的仓库地址
     :return: list[str] 仓库地址列表，格式：["owner/repo", ...]
     """
-    repo_list = []
-    for github_url in GITHUB_URLS:
-        # 添加延时防止限流，随机增加0-5秒
-        time.sleep(REQUEST_DELAY + random.uniform(0, 5))
-        try:
-            # 发送请求
-            response = requests.get(
-                url=github_url,
-                headers=HEADERS,
-                timeout=REQUEST_TIMEOUT
-            )
-            response.raise_for_status()  # 抛出请求异常
-
-            # 解析页面
-            soup = BeautifulSoup(response.text, "html.parser")
-            repo_items = soup.select("article.Box-row")  # 匹配仓库卡片
-
-            num = 0
-            max_repos = 30 if "trending" in github_url else 10  # trending 取30，search 取10
-            # 提取仓库地址
-            for item in repo_items:
-                repo_a_tag = item.select_one("h2 a")
-                if repo_a_tag and num < max_repos:
-                    # 清洗地址：/owner/repo → owner/repo
-                    repo_path = repo_a_tag.get("href").strip("/")
-                    repo_list.append(repo_path)
-                    num += 1
-
-            print(f"✅ 成功爬取到 {len(repo_list)} 个Trending仓库地址")
-            
-
-        except Exception as e:
-            print(f"❌ 爬取GitHub失败: {github_url} {str(e)}")
-            continue
-    
-    return repo_list
+    return github_discovery.get_trending_repos(
+        GITHUB_URLS,
+        headers=HEADERS,
+        timeout=REQUEST_TIMEOUT,
+        delay=REQUEST_DELAY
+    )
 
 def get_github_repos(n: int) -> list[str]:
     """
     使用 GitHub Search API 获取前 n 个仓库地址
     返回格式：["owner/repo", ...]
     """
-    repos = []
-    
-    per_page = 100  # GitHub API 最大值
-
-    # 计算每个 query 应获取的仓库数量
-    per_query_limit = n // len(SEARCH_QUEARYS)
-
-    for query in SEARCH_QUEARYS:
-        page = 1
-        query_repos = 0  # 该 query 已获取的仓库数量
-        while len(repos) < n and query_repos < per_query_limit:
-            params = {
-                "q": query,
-                "sort": "stars",
-                "order": "desc",
-                "per_page": per_page,
-                "page": page
-            }
-
-            time.sleep(REQUEST_DELAY)  # 控制请求频率
-
-            resp = requests.get(
-                GITHUB_SEARCH_API,
-                headers=HEADERS,
-                params=params,
-                timeout=20
-            )
-            resp.raise_for_status()
-
-            data = resp.json()
-            items = data.get("items", [])
-
-            if not items:
-                break  # 没有更多结果了
-
-            for repo in items:
-                repos.append(repo["full_name"])
-                # print(f"✅ 获取仓库：{repo['full_name']}")
-                query_repos += 1
-                if len(repos) >= n or query_repos >= per_query_limit:
-                    break
-
-            page += 1
+    repos = github_discovery.search_repos(
+        n,
+        SEARCH_QUEARYS,
+        headers=HEADERS,
+        timeout=20,
+        delay=REQUEST_DELAY,
+        api=GITHUB_SEARCH_API
+    )
 
     with open("repos_snapshot.json", "w") as f:
         json.dump(repos, f, indent=2)
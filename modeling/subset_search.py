@@ -0,0 +1,229 @@
+# subset_search.py 潜力模型的穷举特征子集搜索：评估候选特征的全部 2^k - 1 个非空子集，输出交叉验证 R²
+# - 候选特征：trending_data.json 中的趋势特征；--extra 时再加入 main.py 指标列表中的其他 OpenDigger 指标
+#   （从本地指标仓库读取，按 modeling 口径计算 <metric>_trend）
+# - 每折只算一次训练集 / 测试集的 Gram 矩阵（XᵀX、Xᵀy），之后每个子集只需解一个 |S|×|S| 的方程组，
+#   测试集残差平方和也由 Gram 矩阵直接得到，不再逐个子集重新拟合，计算量与样本数无关
+# - 同样大小的子集分批一次求解（np.linalg.solve 支持批量），各批用 joblib 在多核上并行
+# - 带截距的最小二乘对特征的平移、缩放不变，结果与 train.py（StandardScaler + LinearRegression）的交叉验证 R² 一致
+#
+# 用法（在 modeling 目录下）：
+#   python subset_search.py                          # 6 个趋势特征，共 63 个子集
+#   python subset_search.py --extra --max-size 5     # 加入其他指标，只看不超过 5 个特征的子集
+#   python subset_search.py --csv subsets.csv        # 全部结果写入 CSV
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import combinations
+from math import comb
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from joblib import Parallel, delayed
+
+from train import load_dataset, kfold_splits, time_splits, TRENDING_FILE, LABEL_FILE, DEFAULT_FOLDS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.warehouse import get_warehouse
+from common.features import endpoints, series_to_array, trend
+
+# main.py 分析的指标中，趋势特征还没有用到的部分
+EXTRA_METRICS = [
+    "inactive_contributors",
+    "issue_resolution_duration",
+    "change_request_resolution_duration",
+    "change_request_response_time",
+]
+
+# 额外特征的取数窗口：截至 label 评估月份 t 的最近 N 个月（与 1cal_metrics 一致）
+EXTRA_WINDOW = 6
+
+# 每批求解的子集数
+CHUNK_SIZE = 20000
+
+# 子集总数上限，超出时需用 --max-size 限制子集大小
+MAX_SUBSETS = 5_000_000
+
+
+# =========================
+# 额外候选特征
+# =========================
+
+def _months_until(end_month, n):
+    end = datetime.strptime(end_month, "%Y-%m")
+    return [(end - relativedelta(months=i)).strftime("%Y-%m") for i in range(n - 1, -1, -1)]
+
+
+def _read_series(repo, metric, refresh):
+    warehouse = get_warehouse()
+    try:
+        return warehouse.get_series(repo, metric) if refresh else warehouse.read_series(repo, metric)
+    except Exception as e:
+        print(f"❌ 获取失败: {repo} / {metric} / {e}")
+        return {}
+
+
+def extra_features(dataset, metrics=EXTRA_METRICS, window=EXTRA_WINDOW, refresh=False):
+    """
+    从本地指标仓库读取额外指标，计算 <metric>_trend 特征（缺数据时为 0，与 common.features 约定一致）
+    :param refresh: 本地没有或已过期时是否从 OpenDigger 下载
+    :return: (特征名列表, (样本数, len(metrics)) 数组)
+    """
+    X = np.zeros((len(dataset.repos), len(metrics)))
+    # 各样本的评估月份可能不同，按月份分组取窗口
+    for month in sorted(set(dataset.months)):
+        rows = np.flatnonzero(dataset.months == month)
+        repo_series = [
+            {metric: _read_series(dataset.repos[i], metric, refresh) for metric in metrics}
+            for i in rows
+        ]
+        values = series_to_array(repo_series, metrics, _months_until(month, window))
+        X[rows] = trend(*endpoints(values), variant="modeling")
+    return [f"{metric}_trend" for metric in metrics], X
+
+
+# =========================
+# 基于 Gram 矩阵的交叉验证
+# =========================
+
+def fold_grams(X, y, splits):
+    """
+    每折预先计算（均以训练集均值中心化）：
+    训练集 XᵀX、Xᵀy，测试集 XᵀX、Xᵀy、yᵀy，以及测试集的总平方和（R² 的分母）
+    """
+    grams = []
+    for train_idx, test_idx in splits:
+        x_mean = X[train_idx].mean(axis=0)
+        y_mean = y[train_idx].mean()
+        xc, yc = X[train_idx] - x_mean, y[train_idx] - y_mean
+        xt, yt = X[test_idx] - x_mean, y[test_idx] - y_mean
+        grams.append({
+            "g_train": xc.T @ xc,
+            "b_train": xc.T @ yc,
+            "g_test": xt.T @ xt,
+            "b_test": xt.T @ yt,
+            "yy_test": yt @ yt,
+            "sst_test": np.sum((y[test_idx] - y[test_idx].mean()) ** 2)
+        })
+    return grams
+
+
+def _solve(a, b):
+    """批量求解 a·x = b；训练折上某列为常数（矩阵奇异）时退回伪逆，与 LinearRegression 的最小范数解一致"""
+    try:
+        return np.linalg.solve(a, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return (np.linalg.pinv(a) @ b[..., None])[..., 0]
+
+
+def evaluate_chunk(subsets, grams):
+    """
+    :param subsets: (n, s) 整数数组，每行为一个大小为 s 的子集的列下标
+    :return: (n, 折数) 各子集在各折测试集上的 R²
+    """
+    rows, cols = subsets[:, :, None], subsets[:, None, :]
+    scores = np.empty((len(subsets), len(grams)))
+    for k, g in enumerate(grams):
+        beta = _solve(g["g_train"][rows, cols], g["b_train"][subsets])
+        # 测试集残差平方和 = yᵀy - 2βᵀXᵀy + βᵀXᵀXβ
+        sse = (
+            g["yy_test"]
+            - 2 * np.einsum("ns,ns->n", beta, g["b_test"][subsets])
+            + np.einsum("ns,nst,nt->n", beta, g["g_test"][rows, cols], beta)
+        )
+        scores[:, k] = 1 - sse / g["sst_test"]
+    return scores
+
+
+def search(X, y, splits, max_size=None, n_jobs=-1, chunk_size=CHUNK_SIZE):
+    """
+    评估全部非空子集（或大小不超过 max_size 的子集）
+    :return: (子集列表 [(列下标, ...)], (子集数, 折数) 的 R² 数组)
+    """
+    n_features = X.shape[1]
+    max_size = min(max_size or n_features, n_features)
+    grams = fold_grams(X, y, splits)
+
+    chunks = []
+    for size in range(1, max_size + 1):
+        all_subsets = np.array(list(combinations(range(n_features), size)), dtype=int)
+        chunks += [all_subsets[i:i + chunk_size] for i in range(0, len(all_subsets), chunk_size)]
+
+    results = Parallel(n_jobs=n_jobs)(delayed(evaluate_chunk)(chunk, grams) for chunk in chunks)
+    subsets = [tuple(row) for chunk in chunks for row in chunk]
+    return subsets, np.concatenate(results)
+
+
+def count_subsets(n_features, max_size=None):
+    max_size = min(max_size or n_features, n_features)
+    return sum(comb(n_features, size) for size in range(1, max_size + 1))
+
+
+# =========================
+# 命令行
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="穷举特征子集，输出交叉验证 R²")
+    parser.add_argument("--trending", default=TRENDING_FILE, help="特征文件（1cal_metrics.py 输出）")
+    parser.add_argument("--labels", default=LABEL_FILE, help="label 文件（2cal_ variable.py 输出）")
+    parser.add_argument("--extra", nargs="*", metavar="METRIC",
+                        help=f"加入额外指标的趋势特征，不写指标名时为 {', '.join(EXTRA_METRICS)}")
+    parser.add_argument("--refresh", action="store_true", help="额外指标本地没有时从 OpenDigger 下载")
+    parser.add_argument("--split", choices=["kfold", "time"], default="kfold", help="交叉验证切分方式")
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS, help="k 折交叉验证的折数")
+    parser.add_argument("--max-size", type=int, help="只评估不超过该大小的子集")
+    parser.add_argument("--top", type=int, default=20, help="输出前多少个子集")
+    parser.add_argument("--jobs", type=int, default=-1, help="并行进程数，-1 为全部核")
+    parser.add_argument("--csv", help="全部子集的结果写入该 CSV 文件")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.trending, args.labels)
+    names, X = list(dataset.feature_names), dataset.X
+    if args.extra is not None:
+        extra_names, extra_X = extra_features(dataset, args.extra or EXTRA_METRICS, refresh=args.refresh)
+        for name, column in zip(extra_names, extra_X.T):
+            if not column.any():
+                print(f"⚠️ {name} 全部为 0（本地没有数据？可加 --refresh 下载）")
+        names += extra_names
+        X = np.hstack([X, extra_X])
+    print(f"✅ 可用样本数: {len(dataset.y)}，候选特征 {len(names)} 个")
+
+    total = count_subsets(len(names), args.max_size)
+    if total > MAX_SUBSETS:
+        sys.exit(f"❌ 共 {total} 个子集，超过上限 {MAX_SUBSETS}，请用 --max-size 限制子集大小")
+
+    splits = kfold_splits(len(dataset.y), args.folds) if args.split == "kfold" else time_splits(dataset.months)
+    if not splits:
+        sys.exit("❌ label 只有一个评估月份，无法按时间切分")
+
+    start = time.time()
+    subsets, scores = search(X, dataset.y, splits, args.max_size, args.jobs)
+    mean, std = scores.mean(axis=1), scores.std(axis=1)
+    order = np.argsort(-mean)
+    print(f"⏱️ {len(subsets)} 个子集 × {len(splits)} 折，用时 {time.time() - start:.2f}s")
+
+    print(f"\n{'CV R²':>16s} {'大小':>4s}  特征")
+    for i in order[:args.top]:
+        print(f"{mean[i]: .4f} ± {std[i]:.4f} {len(subsets[i]):>4d}  {', '.join(names[j] for j in subsets[i])}")
+
+    print("\n📌 各大小的最优子集：")
+    best = {}
+    for i in order:
+        best.setdefault(len(subsets[i]), i)
+    for size, i in sorted(best.items()):
+        print(f"{size:>3d}  {mean[i]: .4f}  {', '.join(names[j] for j in subsets[i])}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["features", "size", "cv_r2_mean", "cv_r2_std"])
+            for i in order:
+                writer.writerow([";".join(names[j] for j in subsets[i]), len(subsets[i]), mean[i], std[i]])
+        print(f"\n💾 结果已保存到 {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# train.py 潜力模型训练：交叉验证 + 特征子集对比，输出带版本号的模型文件
+# 3model.py / "4model comparison.py" 只是在这里的函数外面包了一层打印
+#
+# - 设计矩阵只构建一次，特征子集对比时按列切片
+# - k 折交叉验证（打乱后切分），以及按 label 月份 t 的时间切分（用更早月份训练、预测之后的月份）
+# - 标准化只在训练折上拟合，避免测试折信息泄漏
+# - 多个特征子集用 joblib 在多核上并行评估
+# - 交叉验证 R² 最高的子集在全部样本上重新拟合，权重按 backend/config.POTENTIAL_WEIGHTS 的格式写出
+#
+# 用法（在 modeling 目录下）：
+#   python train.py                                  # 全部特征 + 逐个去掉一个特征，选最优
+#   python train.py --subset activity_trend,participants_trend,openrank_trend
+#   python train.py --folds 10 --jobs 4 --out ../models
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import pearsonr
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import StandardScaler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TRENDING_FILE = os.path.join(BASE_DIR, "dataset", "trending_data.json")
+LABEL_FILE = os.path.join(BASE_DIR, "dataset", "label_openrank.json")
+
+# 模型文件目录：每次训练写一个 potential_model_v<N>.json，并更新 potential_model.json 指向最新版本
+MODEL_DIR = os.path.join(BASE_DIR, "..", "models")
+MODEL_NAME = "potential_model"
+
+# 特征由 1cal_metrics（common.features 的 modeling 口径）计算
+FEATURE_VARIANT = "modeling"
+
+DEFAULT_FOLDS = 5
+RANDOM_STATE = 42
+
+
+# =========================
+# 数据集
+# =========================
+
+class Dataset:
+    """按 repo 对齐好的训练数据"""
+
+    def __init__(self, repos: List[str], feature_names: List[str], X: np.ndarray, y: np.ndarray,
+                 months: np.ndarray):
+        self.repos = repos
+        self.feature_names = feature_names
+        self.X = X              # (样本数, 特征数)
+        self.y = y              # (样本数,)
+        self.months = months    # 每个样本的评估月份 t（时间切分用）
+
+    def select(self, feature_names):
+        """按列切片出特征子集，不重新读取文件"""
+        idx = [self.feature_names.index(name) for name in feature_names]
+        return self.X[:, idx]
+
+
+def _load_records(path):
+    """读取 JSON 数组，或 2cal_ variable.py 的 JSON Lines 追加存储（.jsonl）"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def load_dataset(trending_file=TRENDING_FILE, label_file=LABEL_FILE, label_key="y_growth") -> Dataset:
+    """
+    读取特征与 label，按 repo 匹配（只保留两边都有的仓库），构建设计矩阵
+    特征顺序与 trending_data.json 第一条记录一致
+    """
+    feature_map = {item["repo"]: item["features"] for item in _load_records(trending_file)}
+    label_map = {item["repo"]: item for item in _load_records(label_file)}
+
+    repos = sorted(set(feature_map) & set(label_map))
+    if not repos:
+        raise ValueError("特征与 label 没有共同的仓库")
+
+    feature_names = list(feature_map[repos[0]])
+    X = np.array([[feature_map[repo][name] for name in feature_names] for repo in repos], dtype=float)
+    y = np.array([label_map[repo][label_key] for repo in repos], dtype=float)
+    months = np.array([label_map[repo].get("t", "") for repo in repos])
+    return Dataset(repos, feature_names, X, y, months)
+
+
+# =========================
+# 切分方式
+# =========================
+
+def kfold_splits(n_samples, n_splits=DEFAULT_FOLDS, random_state=RANDOM_STATE):
+    """打乱后的 k 折切分，返回 [(训练索引, 测试索引)]"""
+    kfold = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    return list(kfold.split(np.zeros(n_samples)))
+
+
+def time_splits(months):
+    """
+    按评估月份前向切分：第 i 个月份的样本作测试集，更早月份的全部样本作训练集
+    只有一个月份时无法切分，返回空列表
+    """
+    distinct = sorted(set(months))
+    return [
+        (np.flatnonzero(months < month), np.flatnonzero(months == month))
+        for month in distinct[1:]
+    ]
+
+
+# =========================
+# 拟合与评估
+# =========================
+
+def fit(X, y):
+    """
+    标准化 + 线性回归
+    :return: (scaler, model)
+    """
+    scaler = StandardScaler()
+    model = LinearRegression()
+    model.fit(scaler.fit_transform(X), y)
+    return scaler, model
+
+
+def cross_validate(X, y, splits):
+    """
+    :param splits: [(训练索引, 测试索引)]
+    :return: 各折测试集上的 R²
+    """
+    scores = []
+    for train_idx, test_idx in splits:
+        scaler, model = fit(X[train_idx], y[train_idx])
+        scores.append(model.score(scaler.transform(X[test_idx]), y[test_idx]))
+    return np.array(scores)
+
+
+def evaluate_subset(dataset: Dataset, feature_names, splits: Dict[str, list]):
+    """
+    评估一个特征子集：各切分方式下的交叉验证 R²，以及全部样本上的训练 R²
+    :param splits: {切分方式名: [(训练索引, 测试索引)]}
+    """
+    X = dataset.select(feature_names)
+    scaler, model = fit(X, dataset.y)
+    result = {
+        "features": list(feature_names),
+        "train_r2": float(model.score(scaler.transform(X), dataset.y)),
+        "cv": {}
+    }
+    for name, folds in splits.items():
+        if not folds:
+            continue
+        scores = cross_validate(X, dataset.y, folds)
+        result["cv"][name] = {
+            "r2_mean": float(scores.mean()),
+            "r2_std": float(scores.std()),
+            "folds": len(folds)
+        }
+    return result
+
+
+def default_subsets(feature_names):
+    """全部特征，以及每次去掉一个特征（"4model comparison.py" 中去掉 openrank_trend 的推广）"""
+    subsets = [list(feature_names)]
+    for name in feature_names:
+        subsets.append([f for f in feature_names if f != name])
+    return subsets
+
+
+def compare_subsets(dataset: Dataset, subsets=None, n_splits=DEFAULT_FOLDS, n_jobs=-1):
+    """
+    并行评估多个特征子集
+    :return: 评估结果列表，按主要指标（k 折 CV R² 均值）降序
+    """
+    subsets = subsets or default_subsets(dataset.feature_names)
+    splits = {
+        "kfold": kfold_splits(len(dataset.y), n_splits),
+        "time": time_splits(dataset.months)
+    }
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_subset)(dataset, subset, splits) for subset in subsets
+    )
+    results.sort(key=lambda r: r["cv"]["kfold"]["r2_mean"], reverse=True)
+    return results
+
+
+def feature_correlations(dataset: Dataset):
+    """单特征与 y 的 Pearson 相关系数：{feature: (corr, p_value)}"""
+    result = {}
+    for i, name in enumerate(dataset.feature_names):
+        corr, p_value = pearsonr(dataset.X[:, i], dataset.y)
+        result[name] = (float(corr), float(p_value))
+    return result
+
+
+# =========================
+# 模型文件
+# =========================
+
+def build_artifact(dataset: Dataset, evaluation: dict, version: int):
+    """
+    在全部样本上用选定的特征重新拟合，生成模型文件内容
+    weights 为标准化特征上的权重，格式与 backend/config.POTENTIAL_WEIGHTS 相同
+    """
+    features = evaluation["features"]
+    scaler, model = fit(dataset.select(features), dataset.y)
+    return {
+        "version": version,
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "features": features,
+        "feature_variant": FEATURE_VARIANT,
+        "weights": {name: round(float(w), 4) for name, w in zip(features, model.coef_)},
+        "intercept": float(model.intercept_),
+        "scaler": {
+            "mean": [float(v) for v in scaler.mean_],
+            "std": [float(v) for v in scaler.scale_]
+        },
+        "n_samples": len(dataset.y),
+        "train_r2": evaluation["train_r2"],
+        "cv": evaluation["cv"]
+    }
+
+
+def next_version(model_dir=MODEL_DIR):
+    """目录中已有 potential_model_v<N>.json 的最大 N + 1"""
+    versions = [0]
+    if os.path.isdir(model_dir):
+        prefix = MODEL_NAME + "_v"
+        for filename in os.listdir(model_dir):
+            if filename.startswith(prefix) and filename.endswith(".json"):
+                number = filename[len(prefix):-len(".json")]
+                if number.isdigit():
+                    versions.append(int(number))
+    return max(versions) + 1
+
+
+def _write_json(path, data):
+    """先写临时文件再原子替换，后端热加载时不会读到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    # mkstemp 创建的文件只有本用户可读，后端可能以其他用户运行
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def save_artifact(artifact, model_dir=MODEL_DIR):
+    """
+    写出 potential_model_v<N>.json，并更新 potential_model.json 为该版本
+    :return: 带版本号的文件路径
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, f"{MODEL_NAME}_v{artifact['version']}.json")
+    _write_json(path, artifact)
+    _write_json(os.path.join(model_dir, MODEL_NAME + ".json"), artifact)
+    return path
+
+
+def train(dataset: Dataset, subsets=None, n_splits=DEFAULT_FOLDS, n_jobs=-1,
+          model_dir: Optional[str] = MODEL_DIR):
+    """
+    对比特征子集，选交叉验证 R² 最高的一个在全部样本上拟合
+    :param model_dir: 模型文件目录，None 时不写文件
+    :return: (模型内容, 全部子集的评估结果)
+    """
+    results = compare_subsets(dataset, subsets, n_splits, n_jobs)
+    version = next_version(model_dir) if model_dir else 0
+    artifact = build_artifact(dataset, results[0], version)
+    if model_dir:
+        save_artifact(artifact, model_dir)
+    return artifact, results
+
+
+# =========================
+# 命令行
+# =========================
+
+def print_results(results):
+    print(f"\n{'k 折 R²':>16s} {'时间切分 R²':>14s} {'训练 R²':>9s}  特征")
+    for r in results:
+        kfold = r["cv"]["kfold"]
+        time_cv = r["cv"].get("time")
+        time_text = f"{time_cv['r2_mean']: .4f}" if time_cv else "-"
+        print(
+            f"{kfold['r2_mean']: .4f} ± {kfold['r2_std']:.4f} "
+            f"{time_text:>14s} {r['train_r2']: .4f}  {', '.join(r['features'])}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练潜力模型（交叉验证 + 特征子集对比）")
+    parser.add_argument("--trending", default=TRENDING_FILE, help="特征文件（1cal_metrics.py 输出）")
+    parser.add_argument("--labels", default=LABEL_FILE, help="label 文件（2cal_ variable.py 输出）")
+    parser.add_argument("--subset", action="append",
+                        help="逗号分隔的特征子集，可重复；缺省时对比全部特征与逐个去掉一个特征")
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS, help="k 折交叉验证的折数")
+    parser.add_argument("--jobs", type=int, default=-1, help="并行进程数，-1 为全部核")
+    parser.add_argument("--out", default=MODEL_DIR, help="模型文件目录")
+    parser.add_argument("--dry-run", action="store_true", help="只输出评估结果，不写模型文件")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.trending, args.labels)
+    print(f"✅ 可用样本数: {len(dataset.y)}")
+    if len(dataset.y) < 5:
+        print("⚠️ 样本过少，结果不具统计意义")
+
+    subsets = [s.split(",") for s in args.subset] if args.subset else None
+    if subsets:
+        unknown = sorted({f for s in subsets for f in s} - set(dataset.feature_names))
+        if unknown:
+            sys.exit(f"❌ 未知特征: {', '.join(unknown)}（可选: {', '.join(dataset.feature_names)}）")
+
+    artifact, results = train(dataset, subsets, args.folds, args.jobs, None if args.dry_run else args.out)
+    print_results(results)
+
+    print(f"\n🏆 最优特征子集（k 折 CV R² = {results[0]['cv']['kfold']['r2_mean']:.4f}）")
+    for name, w in artifact["weights"].items():
+        print(f'    "{name}": {w},')
+    if not args.dry_run:
+        print(f"\n💾 已保存模型 v{artifact['version']} 到 {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()